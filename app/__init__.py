@@ -1,6 +1,9 @@
 import logging
 from logging.handlers import SMTPHandler, RotatingFileHandler
 import os
+import sqlite3
+from functools import cached_property
+import sqlalchemy as sa
 from flask import Flask, request, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -8,19 +11,49 @@ from flask_login import LoginManager
 from flask_mail import Mail
 from flask_moment import Moment
 from flask_babel import Babel, lazy_gettext as _l
-from elasticsearch import Elasticsearch
-from redis import Redis
-import rq
 from config import Config
+from app.cache import make_cache, TwoLevelCache, FragmentCacheExtension
+from app import assets, instrumentation, replicas
 
 # Grösstenteils von miguelgrinberg übernommen und leicht verändert 
 
 
+class DbweFlask(Flask):
+    """Selbsterstellt: Elasticsearch, Redis und die RQ-Queue werden erst bei
+    der ersten Verwendung importiert und erzeugt, damit Worker und CLI-Befehle
+    schneller starten."""
+
+    @cached_property
+    def elasticsearch(self):
+        if not self.config['ELASTICSEARCH_URL']:
+            return None
+        from elasticsearch import Elasticsearch
+        return Elasticsearch([self.config['ELASTICSEARCH_URL']])
+
+    @cached_property
+    def redis(self):
+        from redis import Redis
+        return Redis.from_url(self.config['REDIS_URL'])
+
+    @cached_property
+    def task_queue(self):
+        import rq
+        return rq.Queue('dbwe-app-tasks', connection=self.redis)
+
+
 def get_locale():
     return request.accept_languages.best_match(current_app.config['LANGUAGES'])
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': replicas.RoutingSession})
+
+
+#Selbsterstellt: SQLite prüft Fremdschlüssel (und ON DELETE CASCADE) nur mit diesem Pragma
+@sa.event.listens_for(sa.engine.Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
 migrate = Migrate()
 login = LoginManager()
 login.login_view = 'auth.login'
@@ -31,19 +64,29 @@ babel = Babel()
 
 
 def create_app(config_class=Config):
-    app = Flask(__name__)
+    app = DbweFlask(__name__)
     app.config.from_object(config_class)
 
+    replicas.init_app(app)
     db.init_app(app)
     migrate.init_app(app, db)
     login.init_app(app)
     mail.init_app(app)
     moment.init_app(app)
     babel.init_app(app, locale_selector=get_locale)
-    app.elasticsearch = Elasticsearch([app.config['ELASTICSEARCH_URL']]) \
-        if app.config['ELASTICSEARCH_URL'] else None
-    app.redis = Redis.from_url(app.config['REDIS_URL'])
-    app.task_queue = rq.Queue('dbwe-app-tasks', connection=app.redis)
+    instrumentation.init_app(app)
+    assets.init_app(app)
+    app.cache = make_cache(app)
+    app.identity_cache = TwoLevelCache(app.cache, app.config['IDENTITY_LOCAL_TIMEOUT'])
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.add_extension('jinja2.ext.do')
+
+    from app import serializers
+    serializers.init_app(app)
+
+    if app.config['METRICS_ENABLED']:
+        from app import metrics
+        metrics.init_app(app)
 
     from app.errors import bp as errors_bp
     app.register_blueprint(errors_bp)
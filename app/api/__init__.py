@@ -2,4 +2,4 @@ from flask import Blueprint
 
 bp = Blueprint('api', __name__)
 
-from app.api import users, errors, tokens, dinner_events
+from app.api import users, errors, tokens, dinner_events, messages, feed
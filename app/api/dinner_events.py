@@ -1,7 +1,15 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+import json
 import sqlalchemy as sa
-from flask import request, url_for, abort, jsonify
-from app import db
-from app.models import DinnerEvent, User
+from flask import request, url_for, abort, jsonify, current_app, Response, stream_with_context
+from app import db, purge
+from app.cache import invalidate
+from app.replicas import read_engine
+from app.serializers import dinner_events_to_dicts
+from app.models import DinnerEvent, DinnerEventRsvp, DinnerEventTombstone, User, \
+    dinner_event_invites
 from app.api import bp
 from app.api.auth import token_auth
 from app.api.errors import bad_request
@@ -9,9 +17,26 @@ from app.api.errors import bad_request
 # API Documentation
 # 
 # GET /api/dinner_events/<id> - Retrieve details of a specific Dinner Event (only if the user is invited or it's public)
+# GET /api/dinner_events/<id>/comments?before=<comment_id> - Newest comments of a Dinner Event older than the given comment
 # GET /api/dinner_events - Retrieve a paginated list of Dinner Events the user is invited to or are public
 # POST /api/dinner_events - Create a new Dinner Event
 # DELETE /api/dinner_events/<id> - Delete an existing Dinner Event (only if the user is the creator)
+# GET /api/dinner_events/changes?since=<token> - Dinner Events changed and ids of events deleted or no longer visible since the token,
+#     paginated with ?cursor=<next_cursor>; next_since is only set on the last page
+# GET /api/dinner_events/export - Stream all visible Dinner Events as NDJSON (one event per line)
+# POST /api/dinner_events/batch - Create many Dinner Events in one transaction
+# POST /api/dinner_events/<id>/invites - Invite many users at once (only if the user is the creator)
+# POST /api/dinner_events/rsvps - Record many RSVPs of the current user at once
+
+def visible_dinner_events(user):
+    """Events, die der User sehen darf: öffentliche, eingeladene und selbst erstellte"""
+    return sa.select(DinnerEvent).where(
+        sa.or_(
+            DinnerEvent.is_public == True,
+            DinnerEvent.invited.any(User.id == user.id),
+            DinnerEvent.creator_id == user.id
+        )
+    )
 
 @bp.route('/dinner_events/<int:id>', methods=['GET'])
 @token_auth.login_required
@@ -25,22 +50,141 @@ def get_dinner_event(id):
     
     return event.to_dict()
 
+@bp.route('/dinner_events/<int:id>/comments', methods=['GET'])
+@token_auth.login_required
+def get_dinner_event_comments(id):
+    """Comments of a Dinner Event, newest first, paginated with ?before=<comment_id>"""
+    event = db.get_or_404(DinnerEvent, id)
+    if not event.is_visible_to(token_auth.current_user()):
+        abort(403)
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', current_app.config['COMMENTS_PER_PAGE'], type=int), 100))
+    return event.comments_to_dict(before, limit, 'api.get_dinner_event_comments', id=id)
+
 @bp.route('/dinner_events', methods=['GET'])
 @token_auth.login_required
 def get_dinner_events():
     """Retrieve a paginated list of Dinner Events the user is invited to or are public"""
-    user = token_auth.current_user()
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 10, type=int), 100)
-    query = sa.select(DinnerEvent).where(
-        sa.or_(
-            DinnerEvent.is_public == True,
-            DinnerEvent.invited.any(User.id == user.id),
-            DinnerEvent.creator_id == user.id
-        )
-    )
+    # Gäste, RSVPs und Kommentare lädt DinnerEvent.to_dict_many für die ganze Seite
+    query = visible_dinner_events(token_auth.current_user())
     return DinnerEvent.to_collection_dict(query, page, per_page, 'api.get_dinner_events')
 
+@bp.route('/dinner_events/export', methods=['GET'])
+@token_auth.login_required
+def export_dinner_events():
+    """Stream all Dinner Events visible to the user as NDJSON"""
+    # Core-Abfrage ausserhalb der Session: vorgemerkte Events selbst ausfiltern
+    query = sa.select(DinnerEvent.__table__).where(
+        visible_dinner_events(token_auth.current_user()).whereclause,
+        DinnerEvent.pending_deletion == False
+    ).order_by(DinnerEvent.id)
+    chunk_size = current_app.config['EXPORT_CHUNK_SIZE']
+
+    @stream_with_context
+    def generate():
+        # Eigene Verbindung für den serverseitigen Cursor; die Listen pro
+        # Chunk werden über die Session mit je einer Abfrage nachgeladen
+        with read_engine().connect() as conn:
+            result = conn.execution_options(yield_per=chunk_size).execute(query)
+            for rows in result.partitions():
+                for data in dinner_events_to_dicts(rows):
+                    yield json.dumps(data) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def _encode_changes_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def _decode_changes_cursor(cursor):
+    """(started, since, letztes Event, letzter Tombstone) aus einem Cursor, sonst None."""
+    try:
+        started, since, event_after, tombstone_after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        after = [(datetime.fromisoformat(position[0]), int(position[1])) if position else None
+                 for position in (event_after, tombstone_after)]
+        return float(started), float(since), after[0], after[1]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+
+
+def _position(timestamp, item_id):
+    return [timestamp.isoformat(), item_id]
+
+
+@bp.route('/dinner_events/changes', methods=['GET'])
+@token_auth.login_required
+def get_dinner_event_changes():
+    """Events created or updated and ids of events to drop since the `since` token"""
+    user = token_auth.current_user()
+    limit = max(1, min(request.args.get('limit', current_app.config['CHANGES_PER_PAGE'], type=int), 500))
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = _decode_changes_cursor(cursor)
+        if position is None:
+            return bad_request('invalid cursor')
+        started, since, event_after, tombstone_after = position
+    else:
+        started = datetime.now(timezone.utc).timestamp()
+        since = request.args.get('since', 0.0, type=float)
+        event_after = tombstone_after = None
+    try:
+        since_dt = datetime.fromtimestamp(since, timezone.utc).replace(tzinfo=None)
+    except (OverflowError, ValueError, OSError):
+        return bad_request('since must be a valid timestamp')
+
+    query = visible_dinner_events(user).where(DinnerEvent.updated_at > since_dt)
+    if event_after:
+        query = query.where(sa.tuple_(DinnerEvent.updated_at, DinnerEvent.id) > event_after)
+    events = db.session.scalars(query.order_by(DinnerEvent.updated_at, DinnerEvent.id)
+                                .limit(limit + 1)).all()
+
+    # Gelöscht, archiviert, privat geworden oder ausgeladen; Tombstones anderer
+    # User (private Events) werden nicht herausgegeben
+    tombstones = []
+    if since:
+        query = sa.select(DinnerEventTombstone).where(
+            DinnerEventTombstone.deleted_at > since_dt,
+            sa.or_(DinnerEventTombstone.user_id == None, DinnerEventTombstone.user_id == user.id))
+        if tombstone_after:
+            query = query.where(sa.tuple_(DinnerEventTombstone.deleted_at,
+                                          DinnerEventTombstone.id) > tombstone_after)
+        tombstones = db.session.scalars(query.order_by(
+            DinnerEventTombstone.deleted_at, DinnerEventTombstone.id).limit(limit + 1)).all()
+    has_more = len(events) > limit or len(tombstones) > limit
+    events, tombstones = events[:limit], tombstones[:limit]
+    # Events, die der User weiterhin sieht (z.B. privat geworden, aber eingeladen)
+    still_visible = set(db.session.scalars(sa.select(DinnerEvent.id).where(
+        visible_dinner_events(user).whereclause,
+        DinnerEvent.id.in_({tombstone.event_id for tombstone in tombstones})))) if tombstones else set()
+    deleted = list(dict.fromkeys(tombstone.event_id for tombstone in tombstones
+                                 if tombstone.event_id not in still_visible))
+
+    next_cursor = None
+    next_since = None
+    if has_more:
+        next_cursor = _encode_changes_cursor([
+            started, since,
+            _position(events[-1].updated_at, events[-1].id) if events else
+            (_position(*event_after) if event_after else None),
+            _position(tombstones[-1].deleted_at, tombstones[-1].id) if tombstones else
+            (_position(*tombstone_after) if tombstone_after else None)])
+    else:
+        # Leichte Überlappung, damit gleichzeitig committete Änderungen nicht verloren gehen
+        next_since = max(started - current_app.config['CHANGES_OVERLAP_SECONDS'], since)
+    return {
+        'events': DinnerEvent.to_dict_many(events),
+        'deleted': deleted,
+        'next_since': next_since,
+        '_meta': {'limit': limit, 'next_cursor': next_cursor},
+        '_links': {
+            'next': url_for('api.get_dinner_event_changes', cursor=next_cursor,
+                            limit=limit) if next_cursor else None
+        }
+    }
+
 @bp.route('/dinner_events', methods=['POST'])
 @token_auth.login_required
 def create_dinner_event():
@@ -72,6 +216,190 @@ def delete_dinner_event(id):
     event = db.get_or_404(DinnerEvent, id)
     if token_auth.current_user().id != event.creator_id:
         abort(403)
-    db.session.delete(event)
-    db.session.commit()
+    if not purge.delete_dinner_event(event):
+        return jsonify({'message': 'Event is being deleted'}), 202
     return jsonify({'message': 'Event deleted successfully'}), 200
+
+
+# --- Batch-Endpunkte (Selbsterstellt) ---
+
+EVENT_FIELDS = ['title', 'description', 'external_event_url', 'event_date', 'is_public']
+RSVP_STATUSES = ['accepted', 'declined']
+
+
+def _get_batch(data, key):
+    """Akzeptiert entweder eine JSON-Liste oder {key: [...]}."""
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list) or not data:
+        return None
+    return data
+
+
+def _touch_dinner_events(ids):
+    """Bulk-Statements umgehen die Session-Events, daher updated_at explizit setzen"""
+    db.session.execute(sa.update(DinnerEvent).where(DinnerEvent.id.in_(ids))
+                       .values(updated_at=datetime.now(timezone.utc)))
+
+
+def _validate_event(item):
+    if not isinstance(item, dict):
+        return 'item must be an object'
+    missing = [key for key in EVENT_FIELDS if key not in item]
+    if missing:
+        return 'missing fields: ' + ', '.join(missing)
+    # Längen aus dem Model, damit ungültige Werte nicht erst an der Datenbank scheitern
+    for field in ('title', 'external_event_url'):
+        length = getattr(DinnerEvent, field).type.length
+        if not isinstance(item[field], str) or not 1 <= len(item[field]) <= length:
+            return f'{field} must be a string of 1 to {length} characters'
+    if item['description'] is not None and not isinstance(item['description'], str):
+        return 'description must be a string'
+    if not isinstance(item['is_public'], bool):
+        return 'is_public must be a boolean'
+    try:
+        datetime.fromisoformat(item['event_date'])
+    except (TypeError, ValueError):
+        return 'event_date must be an ISO 8601 date'
+    invitees = item.get('invitees', [])
+    if not isinstance(invitees, list) or not all(isinstance(name, str) for name in invitees):
+        return 'invitees must be a list of usernames'
+    return None
+
+
+@bp.route('/dinner_events/batch', methods=['POST'])
+@token_auth.login_required
+def create_dinner_events_batch():
+    """Create many Dinner Events in one transaction, all or nothing"""
+    items = _get_batch(request.get_json(silent=True), 'events')
+    if items is None:
+        return bad_request('Must include a non-empty list of events')
+    if len(items) > current_app.config['API_BATCH_MAX_ITEMS']:
+        return bad_request('At most {} events per batch'.format(
+            current_app.config['API_BATCH_MAX_ITEMS']))
+    errors = [{'index': i, 'status': 400, 'message': message}
+              for i, message in enumerate(map(_validate_event, items)) if message]
+    if errors:
+        return {'error': 'Bad Request', 'results': errors}, 400
+
+    # Alle Eingeladenen mit einer einzigen Abfrage auflösen
+    usernames = {name for item in items if not item['is_public']
+                 for name in item.get('invitees', [])}
+    users = dict(db.session.execute(
+        sa.select(User.username, User.id).where(User.username.in_(usernames)))
+        .all()) if usernames else {}
+
+    creator_id = token_auth.current_user().id
+    events = [DinnerEvent(
+        title=item['title'], description=item['description'],
+        external_event_url=item['external_event_url'],
+        event_date=datetime.fromisoformat(item['event_date']),
+        is_public=item['is_public'], creator_id=creator_id) for item in items]
+    db.session.add_all(events)
+    db.session.flush()
+    invites = [{'dinner_event_id': event.id, 'user_id': users[name]}
+               for event, item in zip(events, items) if not item['is_public']
+               for name in dict.fromkeys(item.get('invitees', [])) if name in users]
+    if invites:
+        db.session.execute(sa.insert(dinner_event_invites), invites)
+    db.session.commit()
+
+    results = []
+    for i, (event, item) in enumerate(zip(events, items)):
+        result = {'index': i, 'status': 201, 'id': event.id,
+                  'location': url_for('api.get_dinner_event', id=event.id)}
+        unknown = [name for name in item.get('invitees', []) if name not in users]
+        if unknown and not item['is_public']:
+            result['unknown_invitees'] = unknown
+        results.append(result)
+    return {'results': results}, 201
+
+
+@bp.route('/dinner_events/<int:id>/invites', methods=['POST'])
+@token_auth.login_required
+def invite_to_dinner_event(id):
+    """Invite many users (by username) to a Dinner Event"""
+    event = db.get_or_404(DinnerEvent, id)
+    if token_auth.current_user().id != event.creator_id:
+        abort(403)
+    usernames = _get_batch(request.get_json(silent=True), 'invitees')
+    if usernames is None or not all(isinstance(name, str) for name in usernames):
+        return bad_request('Must include a non-empty list of usernames')
+    if len(usernames) > current_app.config['API_BATCH_MAX_ITEMS']:
+        return bad_request('At most {} invitees per batch'.format(
+            current_app.config['API_BATCH_MAX_ITEMS']))
+    usernames = list(dict.fromkeys(usernames))
+    users = dict(db.session.execute(
+        sa.select(User.username, User.id).where(User.username.in_(usernames))).all())
+    already_invited = set(db.session.scalars(
+        sa.select(dinner_event_invites.c.user_id).where(
+            dinner_event_invites.c.dinner_event_id == event.id,
+            dinner_event_invites.c.user_id.in_(users.values()))))
+
+    results = []
+    invites = []
+    for name in usernames:
+        if name not in users:
+            results.append({'username': name, 'status': 'not_found'})
+        elif users[name] in already_invited:
+            results.append({'username': name, 'status': 'already_invited'})
+        else:
+            invites.append({'dinner_event_id': event.id, 'user_id': users[name]})
+            results.append({'username': name, 'status': 'invited'})
+    if invites:
+        db.session.execute(sa.insert(dinner_event_invites), invites)
+        _touch_dinner_events([event.id])
+        db.session.commit()
+        invalidate(f'dinner_event:{event.id}')
+    return {'results': results}
+
+
+@bp.route('/dinner_events/rsvps', methods=['POST'])
+@token_auth.login_required
+def rsvp_dinner_events():
+    """Record RSVPs of the current user for many Dinner Events"""
+    user = token_auth.current_user()
+    items = _get_batch(request.get_json(silent=True), 'rsvps')
+    if items is None or not all(isinstance(item, dict) for item in items):
+        return bad_request('Must include a non-empty list of RSVPs')
+    if len(items) > current_app.config['API_BATCH_MAX_ITEMS']:
+        return bad_request('At most {} RSVPs per batch'.format(
+            current_app.config['API_BATCH_MAX_ITEMS']))
+
+    event_ids = {item.get('event_id') for item in items
+                 if isinstance(item.get('event_id'), int)}
+    # Events, zu denen der User eingeladen ist oder die er erstellt hat
+    allowed = set(db.session.scalars(sa.select(DinnerEvent.id).where(
+        DinnerEvent.id.in_(event_ids),
+        sa.or_(DinnerEvent.creator_id == user.id,
+               DinnerEvent.invited.any(User.id == user.id)))))
+    errors = []
+    for i, item in enumerate(items):
+        if item.get('status') not in RSVP_STATUSES:
+            errors.append({'index': i, 'status': 400,
+                           'message': 'status must be one of ' + ', '.join(RSVP_STATUSES)})
+        elif item.get('event_id') not in allowed:
+            errors.append({'index': i, 'status': 403,
+                           'message': 'not invited to this dinner event'})
+    if errors:
+        return {'error': 'Bad Request', 'results': errors}, 400
+
+    # Letzte Angabe pro Event gewinnt
+    statuses = {item['event_id']: item['status'] for item in items}
+    existing = set(db.session.scalars(sa.select(DinnerEventRsvp.dinner_event_id).where(
+        DinnerEventRsvp.user_id == user.id,
+        DinnerEventRsvp.dinner_event_id.in_(statuses))))
+    rows = [{'dinner_event_id': event_id, 'user_id': user.id, 'status': status}
+            for event_id, status in statuses.items()]
+    updates = [row for row in rows if row['dinner_event_id'] in existing]
+    inserts = [row for row in rows if row['dinner_event_id'] not in existing]
+    if updates:
+        db.session.execute(sa.update(DinnerEventRsvp), updates)
+    if inserts:
+        db.session.execute(sa.insert(DinnerEventRsvp), inserts)
+    _touch_dinner_events(statuses)
+    db.session.commit()
+    for event_id in statuses:
+        invalidate(f'dinner_event:{event_id}')
+    return {'results': [{'event_id': event_id, 'status': status}
+                        for event_id, status in statuses.items()]}
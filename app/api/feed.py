@@ -0,0 +1,16 @@
+from flask import request
+from app.api import bp
+from app.api.auth import token_auth
+from app.feed import feed_to_dict
+
+# API Documentation
+#
+# GET /api/feed?before=<event_id>&limit=<n> - Public events of followed users, newest first
+
+
+@bp.route('/feed', methods=['GET'])
+@token_auth.login_required
+def get_feed():
+    return feed_to_dict(token_auth.current_user(),
+                        before=request.args.get('before', type=int),
+                        limit=request.args.get('limit', type=int))
@@ -0,0 +1,163 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+import sqlalchemy as sa
+from flask import request, url_for, current_app
+from app import db
+from app.models import User, Message, ConversationRead
+from app.api import bp
+from app.api.auth import token_auth
+from app.api.errors import bad_request
+
+# API Documentation
+#
+# GET /api/messages?cursor=<cursor> - Received messages, newest first
+# POST /api/messages - Send a message ({"recipient_id": 2, "body": "..."})
+# GET /api/conversations?before=<message_id> - Conversations of the user with the last message and unread count
+# GET /api/conversations/<user_id>/messages?cursor=<cursor> - Messages with one user, newest first
+# POST /api/conversations/<user_id>/read - Mark the conversation with one user as read
+
+MAX_MESSAGE_LENGTH = 140
+
+
+def _encode_cursor(message):
+    value = f'{message.timestamp.isoformat()}|{message.id}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def _message_page(query, endpoint, **kwargs):
+    """Keyset-Pagination über (timestamp, id), neueste Nachrichten zuerst."""
+    limit = max(1, min(request.args.get('limit', current_app.config['MESSAGES_PER_PAGE'], type=int), 100))
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = _decode_cursor(cursor)
+        if position is None:
+            return bad_request('invalid cursor')
+        query = query.where(sa.tuple_(Message.timestamp, Message.id) < position)
+    messages = db.session.scalars(query.order_by(
+        Message.timestamp.desc(), Message.id.desc()).limit(limit + 1)).all()
+    next_cursor = _encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+    return {
+        'items': [message.to_dict() for message in messages[:limit]],
+        '_meta': {'limit': limit, 'next_cursor': next_cursor},
+        '_links': {
+            'self': url_for(endpoint, cursor=cursor, limit=limit, **kwargs),
+            'next': url_for(endpoint, cursor=next_cursor, limit=limit,
+                            **kwargs) if next_cursor else None
+        }
+    }
+
+
+@bp.route('/messages', methods=['GET'])
+@token_auth.login_required
+def get_messages():
+    user = token_auth.current_user()
+    return _message_page(sa.select(Message).where(Message.recipient_id == user.id),
+                         'api.get_messages')
+
+
+@bp.route('/messages', methods=['POST'])
+@token_auth.login_required
+def send_message():
+    user = token_auth.current_user()
+    data = request.get_json(silent=True) or {}
+    body = data.get('body')
+    if not isinstance(body, str) or not 0 < len(body.strip()) <= MAX_MESSAGE_LENGTH:
+        return bad_request(f'body must be between 1 and {MAX_MESSAGE_LENGTH} characters')
+    recipient = db.session.get(User, data['recipient_id']) \
+        if isinstance(data.get('recipient_id'), int) else None
+    if recipient is None:
+        return bad_request('unknown recipient_id')
+    message = Message(author=user, recipient=recipient, body=body)
+    db.session.add(message)
+    db.session.flush()
+    recipient.add_notification('unread_message_count', recipient.unread_message_count())
+    db.session.commit()
+    return message.to_dict(), 201, {
+        'Location': url_for('api.get_conversation_messages', user_id=recipient.id)}
+
+
+def _other_user_id(message, user_id):
+    first, second = (int(part) for part in message.conversation_key.split(':'))
+    return second if first == user_id else first
+
+
+@bp.route('/conversations', methods=['GET'])
+@token_auth.login_required
+def get_conversations():
+    user = token_auth.current_user()
+    limit = max(1, min(request.args.get('limit', current_app.config['MESSAGES_PER_PAGE'], type=int), 100))
+    before = request.args.get('before', type=int)
+    latest = sa.select(Message.conversation_key, sa.func.max(Message.id).label('last_id')).where(
+        sa.or_(Message.sender_id == user.id, Message.recipient_id == user.id),
+        Message.conversation_key.is_not(None)
+    ).group_by(Message.conversation_key).subquery()
+    query = sa.select(Message).join(latest, Message.id == latest.c.last_id)
+    if before is not None:
+        query = query.where(Message.id < before)
+    messages = db.session.scalars(query.order_by(Message.id.desc()).limit(limit + 1)).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    # Gesprächspartner und ungelesene Nachrichten mit je einer Abfrage. Ist der
+    # Partner gelöscht (sender_id/recipient_id NULL), bleibt seine ID im conversation_key.
+    other_ids = [_other_user_id(message, user.id) for message in messages]
+    others = {other.id: other for other in db.session.scalars(
+        sa.select(User).where(User.id.in_(other_ids)))}
+    unread = user.unread_counts_by_conversation([m.conversation_key for m in messages])
+    next_before = messages[-1].id if has_more else None
+    return {
+        'items': [{
+            'conversation_key': message.conversation_key,
+            'user': {'id': other_id, 'username': others[other_id].username,
+                     '_links': {'self': url_for('api.get_user', id=other_id)}}
+                    if other_id in others else None,
+            'last_message': message.to_dict(),
+            'unread_count': unread.get(message.conversation_key, 0),
+            '_links': {
+                'messages': url_for('api.get_conversation_messages', user_id=other_id),
+                'read': url_for('api.mark_conversation_read', user_id=other_id)
+            } if other_id in others else {'messages': None, 'read': None}
+        } for message, other_id in zip(messages, other_ids)],
+        '_meta': {'limit': limit, 'next_before': next_before},
+        '_links': {
+            'self': url_for('api.get_conversations', before=before, limit=limit),
+            'next': url_for('api.get_conversations', before=next_before,
+                            limit=limit) if has_more else None
+        }
+    }
+
+
+@bp.route('/conversations/<int:user_id>/messages', methods=['GET'])
+@token_auth.login_required
+def get_conversation_messages(user_id):
+    user = token_auth.current_user()
+    db.get_or_404(User, user_id)
+    key = Message.make_conversation_key(user.id, user_id)
+    return _message_page(sa.select(Message).where(Message.conversation_key == key),
+                         'api.get_conversation_messages', user_id=user_id)
+
+
+@bp.route('/conversations/<int:user_id>/read', methods=['POST'])
+@token_auth.login_required
+def mark_conversation_read(user_id):
+    user = token_auth.current_user()
+    db.get_or_404(User, user_id)
+    key = Message.make_conversation_key(user.id, user_id)
+    read = db.session.get(ConversationRead, (user.id, key))
+    if read is None:
+        read = ConversationRead(user_id=user.id, conversation_key=key)
+        db.session.add(read)
+    read.last_read_at = datetime.now(timezone.utc)
+    db.session.flush()
+    user.add_notification('unread_message_count', user.unread_message_count())
+    db.session.commit()
+    return {'conversation_key': key, 'last_read_at': read.last_read_at.isoformat()}
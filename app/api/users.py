@@ -2,6 +2,8 @@ import sqlalchemy as sa
 from sqlalchemy import select, or_, and_
 from flask import request, url_for, abort
 from app import db
+from app.autocomplete import suggest
+from app.serializers import url_template
 from app.models import User, DinnerEvent
 from app.api import bp
 from app.api.auth import token_auth
@@ -14,6 +16,7 @@ from app.api.errors import bad_request
 # GET /api/users/<id>/followers - Retrieve a list of a user's followers  (von miguelgrinberg übernommen)
 # GET /api/users/<id>/following - Retrieve a list of users the user is following  (von miguelgrinberg übernommen)
 # GET /api/users/<id>/dinner_events - Retrieve dinner events the user can see (public or shared with them)
+# GET /api/users/autocomplete?q=<prefix>&limit=<n> - Usernames starting with the prefix, followed users and co-guests first
 # POST /api/users - Create a new user  (von miguelgrinberg übernommen)
 # PUT /api/users/<id> - Update user details (only the user themselves)  (von miguelgrinberg übernommen)
 
@@ -29,6 +32,17 @@ def get_users():
     per_page = min(request.args.get('per_page', 10, type=int), 100)
     return User.to_collection_dict(sa.select(User), page, per_page, 'api.get_users')
 
+#Selbsterstellt
+@bp.route('/users/autocomplete', methods=['GET'])
+@token_auth.login_required
+def autocomplete_users():
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    user_url = url_template('api.get_user', 'id')
+    return {'items': [
+        {'id': user_id, 'username': username, '_links': {'self': user_url.format(id=user_id)}}
+        for user_id, username in suggest(token_auth.current_user(), request.args.get('q', ''), limit)
+    ]}
+
 @bp.route('/users/<int:id>/followers', methods=['GET'])
 @token_auth.login_required
 def get_followers(id):
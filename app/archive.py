@@ -0,0 +1,106 @@
+import heapq
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from flask import current_app
+from app import db
+from app.cache import invalidate
+from app.models import DinnerEvent, DinnerEventRsvp, Comment, EventReminder, ArchivedDinnerEvent, \
+    DinnerEventTombstone, dinner_event_invites, dinner_event_pending, archived_dinner_event_invites, \
+    archived_dinner_event_rsvps, archived_comments
+
+# Selbsterstellt: Events, die länger als ARCHIVE_AFTER_DAYS vorbei sind, werden
+# mit Einladungen, RSVPs und Kommentaren in die Archivtabellen verschoben. Die
+# aktiven Tabellen und ihre Indizes bleiben so klein; das Archiv wird nur für
+# Verlaufsansichten (?history=1) zusätzlich gelesen, seitenweise per Keyset auf
+# (event_date, id). Für die Delta-Synchronisation gelten archivierte Events als
+# gelöscht und erhalten Tombstones.
+
+EVENT_COLUMNS = ['id', 'title', 'description', 'external_event_url', 'event_date',
+                 'creator_id', 'is_public', 'created_at', 'updated_at']
+
+
+def _archive_batch(event_ids, now):
+    """Verschiebt die Events event_ids in einer Transaktion ins Archiv."""
+    event_table = DinnerEvent.__table__
+    db.session.execute(sa.insert(ArchivedDinnerEvent).from_select(
+        EVENT_COLUMNS + ['archived_at'],
+        sa.select(*[event_table.c[name] for name in EVENT_COLUMNS], sa.literal(now, sa.DateTime))
+          .where(event_table.c.id.in_(event_ids))))
+    db.session.execute(sa.insert(archived_dinner_event_invites).from_select(
+        ['dinner_event_id', 'user_id'],
+        sa.select(dinner_event_invites.c.dinner_event_id, dinner_event_invites.c.user_id)
+          .where(dinner_event_invites.c.dinner_event_id.in_(event_ids))))
+    db.session.execute(sa.insert(archived_dinner_event_rsvps).from_select(
+        ['dinner_event_id', 'user_id', 'status'],
+        sa.select(DinnerEventRsvp.dinner_event_id, DinnerEventRsvp.user_id, DinnerEventRsvp.status)
+          .where(DinnerEventRsvp.dinner_event_id.in_(event_ids))))
+    db.session.execute(sa.insert(archived_comments).from_select(
+        ['id', 'body', 'timestamp', 'user_id', 'event_id'],
+        sa.select(Comment.id, Comment.body, Comment.timestamp, Comment.user_id, Comment.event_id)
+          .where(Comment.event_id.in_(event_ids))))
+    DinnerEventTombstone.add_for_events(db.session, event_ids, now)
+    for table, column in ((dinner_event_invites, dinner_event_invites.c.dinner_event_id),
+                          (dinner_event_pending, dinner_event_pending.c.dinner_event_id),
+                          (DinnerEventRsvp.__table__, DinnerEventRsvp.dinner_event_id),
+                          (Comment.__table__, Comment.event_id),
+                          (EventReminder.__table__, EventReminder.event_id),
+                          (DinnerEvent.__table__, DinnerEvent.id)):
+        db.session.execute(sa.delete(table).where(column.in_(event_ids)))
+    db.session.commit()
+
+
+def archive_events(days=None, batch_size=None, progress=None):
+    """Moves events older than days into the archive and returns their number."""
+    days = days or current_app.config['ARCHIVE_AFTER_DAYS']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    # event_date ist lokale Zeit ohne Zeitzone
+    cutoff = datetime.now() - timedelta(days=days)
+    archived = 0
+    while True:
+        event_ids = db.session.scalars(
+            sa.select(DinnerEvent.id).where(DinnerEvent.event_date < cutoff)
+              .order_by(DinnerEvent.id).limit(batch_size)).all()
+        if not event_ids:
+            break
+        _archive_batch(event_ids, datetime.now(timezone.utc))
+        archived += len(event_ids)
+        # Bulk-Statements umgehen die Session-Events, daher manuell invalidieren
+        for event_id in event_ids:
+            invalidate(f'dinner_event:{event_id}')
+        if progress:
+            progress(archived)
+    if archived:
+        invalidate('explore')
+    return archived
+
+
+def _keyset_page(query, before, limit):
+    model = query.column_descriptions[0]['entity']
+    query = query.order_by(None).order_by(model.event_date.desc(), model.id.desc())
+    if before:
+        query = query.where(sa.tuple_(model.event_date, model.id) < sa.tuple_(*before))
+    return db.session.scalars(query.limit(limit)).all()
+
+
+def with_archive(query, archive_query, before=None, limit=None):
+    """Returns (events, next_before): one page of the active and archived
+    events of both queries, newest first. before and next_before are
+    (event_date, id) keys as built by parse_history_key()."""
+    limit = max(1, limit or current_app.config['HISTORY_PER_PAGE'])
+    events = list(heapq.merge(_keyset_page(query, before, limit + 1),
+                              _keyset_page(archive_query, before, limit + 1),
+                              key=lambda event: (event.event_date, event.id), reverse=True))
+    next_before = None
+    if len(events) > limit:
+        last = events[limit - 1]
+        next_before = f'{last.event_date.isoformat()}_{last.id}'
+    return events[:limit], next_before
+
+
+def parse_history_key(value):
+    """(event_date, id) aus dem Wert von ?before=, None wenn ungültig."""
+    event_date, _, event_id = (value or '').rpartition('_')
+    try:
+        return datetime.fromisoformat(event_date), int(event_id)
+    except ValueError:
+        return None
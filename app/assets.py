@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from flask import current_app, request, send_from_directory
+
+# Selbsterstellt: "flask assets build" kopiert jede Datei aus app/static mit dem
+# Inhalts-Hash im Namen nach app/static/dist und legt daneben .gz- (und mit dem
+# optionalen Paket brotli .br-)Varianten ab. url_for('static', ...) liefert
+# danach den gehashten Namen, der ein Jahr lang als immutable gecacht werden
+# darf. Ohne Manifest (z.B. in der Entwicklung) bleibt alles wie bisher.
+# Dynamische Antworten werden ab COMPRESS_MIN_SIZE Bytes komprimiert.
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 31536000
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'image/svg+xml')
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _fingerprinted_name(filename, content):
+    digest = hashlib.md5(content).hexdigest()[:12]
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+def build(static_folder):
+    """Writes the fingerprinted and compressed files and the manifest,
+    returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                content = f.read()
+            hashed = _fingerprinted_name(filename, content)
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            compressed = gzip.compress(content, 9, mtime=0)
+            # Bereits komprimierte Formate (z.B. Bilder) werden nicht kleiner
+            if len(compressed) < len(content):
+                with open(target + '.gz', 'wb') as f:
+                    f.write(compressed)
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as f:
+                        f.write(brotli.compress(content))
+            manifest[filename] = f'{DIST_DIR}/{hashed}'
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _rewrite_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = current_app.extensions['asset_manifest'].get(
+            values['filename'], values['filename'])
+
+
+def dist_file(filename):
+    """Serves a fingerprinted file, precompressed if the client accepts it."""
+    directory = os.path.join(current_app.static_folder, DIST_DIR)
+    encoding = None
+    for name, suffix in PRECOMPRESSED:
+        if name in request.accept_encodings and \
+                os.path.isfile(os.path.join(directory, filename + suffix)):
+            encoding = name
+            break
+    if encoding:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(directory, filename + dict(PRECOMPRESSED)[encoding],
+                                       mimetype=mimetype)
+        response.content_encoding = encoding
+    else:
+        response = send_from_directory(directory, filename)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+def _compress_response(response):
+    config = current_app.config
+    if response.direct_passthrough or response.is_streamed \
+            or response.status_code != 200 \
+            or 'Content-Encoding' in response.headers \
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES) \
+            or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+    accepted = request.accept_encodings
+    encoding = 'br' if brotli is not None and 'br' in accepted else \
+        'gzip' if 'gzip' in accepted else None
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    if encoding == 'br':
+        data = brotli.compress(data, quality=config['COMPRESS_LEVEL'])
+    else:
+        data = gzip.compress(data, config['COMPRESS_LEVEL'])
+    response.set_data(data)
+    response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    # Die komprimierte Darstellung ist nicht mehr byte-gleich
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    path = os.path.join(app.static_folder, DIST_DIR, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            app.extensions['asset_manifest'] = json.load(f)
+        app.url_defaults(_rewrite_static_url)
+        # Spezifischer als /static/<path:filename>, daher hat diese Regel Vorrang
+        app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>',
+                         'dist_file', dist_file)
+    if app.config['COMPRESS_MIN_SIZE']:
+        app.after_request(_compress_response)
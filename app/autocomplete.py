@@ -0,0 +1,119 @@
+import sqlalchemy as sa
+from flask import current_app
+from redis.exceptions import RedisError
+from app import db
+from app.models import User, DinnerEvent, followers, dinner_event_invites
+
+# Selbsterstellt: Autovervollständigung von Usernamen für Einladungen. Alle
+# Usernamen liegen in einem Redis Sorted Set mit Score 0 als
+# "<kleingeschrieben>\0<username>\0<id>", ZRANGEBYLEX findet damit die Treffer
+# eines Präfixes in O(log n + Treffer). Neue und umbenannte User werden nach dem
+# Commit in einem vorhandenen Index nachgeführt (siehe _collect_cache_changes in
+# app/models.py), aufgebaut wird der Index mit "flask autocomplete rebuild".
+# Fehlt er, sucht SQL per LIKE.
+# Die Treffer werden nach gefolgten Usern und gemeinsam besuchten Events sortiert.
+
+KEY = 'autocomplete:users'
+SEPARATOR = '\x00'
+# Kandidaten aus dem Präfix-Index, aus denen die besten ausgewählt werden
+CANDIDATES_PER_RESULT = 5
+
+
+def _member(user_id, username):
+    return f'{username.lower()}{SEPARATOR}{username}{SEPARATOR}{user_id}'
+
+
+def update_index(changes):
+    """Wendet [(user_id, old_username, new_username), ...] auf den Index an.
+
+    Ohne Index passiert nichts: ein neu angelegter Key enthielte nur diese
+    User und würde den SQL-Fallback in _candidates abschalten."""
+    try:
+        if not current_app.redis.exists(KEY):
+            return
+        pipe = current_app.redis.pipeline(transaction=False)
+        for user_id, old_username, new_username in changes:
+            if old_username:
+                pipe.zrem(KEY, _member(user_id, old_username))
+            if new_username:
+                pipe.zadd(KEY, {_member(user_id, new_username): 0})
+        pipe.execute()
+    except RedisError as e:
+        current_app.logger.warning('Updating the autocomplete index failed: %s', e)
+
+
+def rebuild_index(chunk_size=10000):
+    """Builds the index from the user table and returns the number of users."""
+    redis = current_app.redis
+    building = f'{KEY}:building'
+    redis.delete(building)
+    count = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(sa.select(User.id, User.username).where(
+            User.id > last_id).order_by(User.id).limit(chunk_size)).all()
+        if not rows:
+            break
+        redis.zadd(building, {_member(user_id, username): 0 for user_id, username in rows})
+        count += len(rows)
+        last_id = rows[-1][0]
+    if count:
+        redis.rename(building, KEY)
+    else:
+        redis.delete(KEY)
+    return count
+
+
+def _candidates(prefix, count):
+    """(id, username) der Treffer aus Redis, None falls der Index fehlt."""
+    try:
+        prefix = prefix.lower().replace(SEPARATOR, '').encode()
+        members = current_app.redis.zrangebylex(
+            KEY, b'[' + prefix, b'[' + prefix + b'\xff', start=0, num=count)
+        if not members and not current_app.redis.exists(KEY):
+            return None
+    except RedisError:
+        return None
+    candidates = []
+    for member in members:
+        _, username, user_id = member.decode().split(SEPARATOR)
+        candidates.append((int(user_id), username))
+    return candidates
+
+
+def _sql_candidates(prefix, count):
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return db.session.execute(sa.select(User.id, User.username).where(
+        User.username.like(f'{escaped}%', escape='\\')
+    ).order_by(User.username).limit(count)).all()
+
+
+def suggest(user, prefix, limit=10):
+    """Returns up to limit (id, username) pairs starting with prefix, users
+    that user follows or has been to events with first."""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    count = limit * CANDIDATES_PER_RESULT
+    candidates = _candidates(prefix, count)
+    if candidates is None:
+        candidates = _sql_candidates(prefix, count)
+    candidates = [(user_id, username) for user_id, username in candidates if user_id != user.id]
+    if not candidates:
+        return []
+    ids = [user_id for user_id, _ in candidates]
+    followed = set(db.session.scalars(sa.select(followers.c.followed_id).where(
+        followers.c.follower_id == user.id, followers.c.followed_id.in_(ids))))
+    my_events = sa.union(
+        sa.select(dinner_event_invites.c.dinner_event_id).where(
+            dinner_event_invites.c.user_id == user.id),
+        sa.select(DinnerEvent.id).where(DinnerEvent.creator_id == user.id)).subquery()
+    shared_events = dict(db.session.execute(
+        sa.select(dinner_event_invites.c.user_id, sa.func.count())
+          .where(dinner_event_invites.c.user_id.in_(ids),
+                 dinner_event_invites.c.dinner_event_id.in_(sa.select(my_events.c[0])))
+          .group_by(dinner_event_invites.c.user_id)).all())
+    ranked = sorted(candidates, key=lambda c: (c[0] not in followed,
+                                               -shared_events.get(c[0], 0),
+                                               c[1].lower()))
+    return ranked[:limit]
@@ -0,0 +1,65 @@
+import struct
+import zlib
+from functools import lru_cache
+from hashlib import md5
+from flask import current_app
+
+# Selbsterstellt: lokal erzeugte Identicons als Ersatz für Gravatar
+
+GRID = 5
+MIN_SIZE = 16
+MAX_SIZE = 512
+
+
+@lru_cache(maxsize=4096)
+def avatar_digest(email):
+    return md5(email.lower().encode('utf-8')).hexdigest()
+
+
+def clamp_size(size):
+    return max(MIN_SIZE, min(MAX_SIZE, size))
+
+
+def _png_chunk(tag, data):
+    chunk = tag + data
+    return struct.pack('>I', len(data)) + chunk + \
+        struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+
+
+def render_identicon(digest, size):
+    """Renders a symmetric 5x5 identicon for an md5 hex digest as PNG."""
+    data = bytes.fromhex(digest)
+    color = bytes((data[13], data[14], data[15]))
+    background = b'\xf0\xf0\xf0'
+    # Die linken drei Spalten werden aus dem Digest bestimmt und gespiegelt
+    cells = []
+    for row in range(GRID):
+        left = [data[row * 3 + col] % 2 == 0 for col in range(3)]
+        cells.append(left + left[1::-1])
+
+    margin = size // 10
+    cell_size = (size - 2 * margin) // GRID
+    margin = (size - cell_size * GRID) // 2
+    blank_line = b'\x00' + background * size
+    lines = [blank_line] * margin
+    for row in cells:
+        line = background * margin + b''.join(
+            (color if filled else background) * cell_size for filled in row)
+        line = b'\x00' + line + background * (size - margin - cell_size * GRID)
+        lines.extend([line] * cell_size)
+    lines.extend([blank_line] * (size - len(lines)))
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header) +
+            _png_chunk(b'IDAT', zlib.compress(b''.join(lines), 9)) +
+            _png_chunk(b'IEND', b''))
+
+
+def get_identicon(digest, size):
+    key = f'avatar:{digest}:{size}'
+    png = current_app.cache.get(key)
+    if png is None:
+        png = render_identicon(digest, size)
+        current_app.cache.set(key, png,
+                              timeout=current_app.config['AVATAR_CACHE_TIMEOUT'])
+    return png
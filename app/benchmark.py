@@ -0,0 +1,212 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import sqlalchemy as sa
+from app import create_app, db
+from app.instrumentation import count_queries
+from app.models import User, DinnerEvent, Notification, dinner_event_invites
+from app.seed import seed_database
+from config import Config
+
+# Selbsterstellt: reproduzierbare Benchmarks der wichtigsten Routen und
+# Model-Methoden gegen eine SQLite-Datenbank mit generierten Daten.
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Startzeiten werden in einem frischen Interpreter gemessen
+STARTUP_SNIPPETS = {
+    'startup_create_app': 'from app import create_app; create_app()',
+    'startup_worker': 'import app.tasks',
+}
+
+
+class BenchConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    ELASTICSEARCH_URL = None
+    CACHE_TYPE = 'null'
+    SQL_INSTRUMENTATION = False
+    METRICS_ENABLED = False
+
+
+def _seed(users, events, guests, comments, seed):
+    """Generiert Testdaten; der Benchmark-User (id 1) ist zu allen Events eingeladen."""
+    seed_database(users=users, events=events, follows=10, guests=guests,
+                  comments=comments, messages=users * 5, notifications=users * 5,
+                  seed=seed)
+    invited = sa.select(dinner_event_invites.c.dinner_event_id).where(
+        dinner_event_invites.c.user_id == 1)
+    db.session.execute(sa.insert(dinner_event_invites).from_select(
+        ['dinner_event_id', 'user_id'],
+        sa.select(DinnerEvent.id, sa.literal(1)).where(
+            DinnerEvent.creator_id != 1, DinnerEvent.id.not_in(invited))))
+    db.session.execute(sa.insert(Notification), [
+        {'name': 'dinner_event_invite', 'user_id': 1, 'event_id': event_id, 'timestamp': time.time(),
+         'payload_json': json.dumps({'event_id': event_id})}
+        for event_id in range(1, min(events, 50) + 1)])
+    db.session.commit()
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = (len(values) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def _summary(timings, queries=None):
+    result = {
+        'iterations': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p90_ms': round(_percentile(timings, 90), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+    }
+    if queries is not None:
+        result['queries'] = max(queries)
+    return result
+
+
+def _measure(func, iterations):
+    func()  # Aufwärmen
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with count_queries() as stats:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(stats.count)
+    return _summary(timings, queries)
+
+
+def _startup_time(code):
+    """Runs code in a new interpreter and returns the time it took in ms."""
+    script = f'import time\nstart = time.perf_counter()\n{code}\n' \
+             'print((time.perf_counter() - start) * 1000)'
+    output = subprocess.run([sys.executable, '-c', script], cwd=BASEDIR, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+def _cli_time():
+    """Wall time of a flask CLI invocation including interpreter start in ms."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'dbwe-app.py', 'bench', '--help'],
+                   cwd=BASEDIR, check=True, capture_output=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_startup(iterations=5, only=None, progress=None):
+    benchmarks = {name: (lambda code=code: _startup_time(code))
+                  for name, code in STARTUP_SNIPPETS.items()}
+    benchmarks['startup_cli'] = _cli_time
+    results = {}
+    for name, func in benchmarks.items():
+        if only and name not in only:
+            continue
+        if progress:
+            progress(name)
+        results[name] = _summary([func() for _ in range(iterations)])
+    return results
+
+
+def run_benchmarks(users=200, events=500, guests=20, comments=10,
+                   iterations=20, seed=42, only=None, progress=None,
+                   startup_iterations=5):
+    """Seeds a temporary SQLite database and times the hot paths.
+
+    Returns a dict suitable for writing to a JSON file.
+    """
+    from app.main.routes import process_invites
+
+    fd, path = tempfile.mkstemp(suffix='.db', prefix='dbwe-bench-')
+    os.close(fd)
+
+    class Config(BenchConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+
+    app = create_app(Config)
+    try:
+        with app.app_context():
+            db.create_all()
+            _seed(users, events, guests, comments, seed)
+            token = db.session.get(User, 1).get_token()
+            db.session.commit()
+            busiest_event = db.session.scalar(
+                sa.select(dinner_event_invites.c.dinner_event_id)
+                .group_by(dinner_event_invites.c.dinner_event_id)
+                .order_by(sa.func.count().desc()).limit(1))
+            invite_names = ', '.join(f'user{i}' for i in range(2, min(users, 50) + 1))
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '1'
+            sess['_fresh'] = True
+        anonymous = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        def get(test_client, url, **kwargs):
+            def call():
+                response = test_client.get(url, **kwargs)
+                assert response.status_code == 200, (url, response.status_code)
+            return call
+
+        def to_dict():
+            with app.app_context():
+                event = db.session.get(DinnerEvent, busiest_event)
+                event.to_dict()
+
+        def invites():
+            with app.test_request_context():
+                event = db.session.get(DinnerEvent, busiest_event)
+                process_invites(event, invite_names)
+                db.session.rollback()
+
+        benchmarks = {
+            'index': get(client, '/index'),
+            'explore': get(anonymous, '/explore'),
+            'event_calendar': get(client, '/calendar'),
+            'dinner_event_detail': get(client, f'/dinner_event/{busiest_event}'),
+            'api_dinner_events': get(client, '/api/dinner_events?per_page=100', headers=headers),
+            'api_users': get(client, '/api/users?per_page=100', headers=headers),
+            'notifications': get(client, '/notifications'),
+            'dinner_event_to_dict': to_dict,
+            'process_invites': invites,
+        }
+        results = {}
+        for name, func in benchmarks.items():
+            if only and name not in only:
+                continue
+            if progress:
+                progress(name)
+            results[name] = _measure(func, iterations)
+    finally:
+        os.remove(path)
+
+    results.update(measure_startup(startup_iterations, only, progress))
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'parameters': {'users': users, 'events': events, 'guests': guests,
+                       'comments': comments, 'iterations': iterations, 'seed': seed,
+                       'startup_iterations': startup_iterations},
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    """Yields (name, previous p50, current p50, change in %, previous queries, current queries)."""
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if before is None:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 \
+            if before['p50_ms'] else 0.0
+        yield name, before['p50_ms'], result['p50_ms'], change, \
+            before.get('queries'), result.get('queries')
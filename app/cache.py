@@ -0,0 +1,234 @@
+import pickle
+import threading
+from collections import OrderedDict
+from time import time
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+import redis
+
+# Selbsterstellt: kleine Cache-Schicht für Seiten- und Fragment-Caching.
+# CACHE_TYPE wählt das Backend: 'redis' (Standard), 'simple' (LRU pro
+# Worker-Prozess) oder 'null' (Caching deaktiviert).
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_version(self, name):
+        return 0
+
+    def bump_version(self, name):
+        pass
+
+
+class SimpleCache(NullCache):
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries=1000, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires and expires < time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time() + timeout if timeout else 0, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_version(self, name):
+        return self.get('version:' + name) or 0
+
+    def bump_version(self, name):
+        with self._lock:
+            expires, value = self._data.get('version:' + name, (0, 0))
+            self._data['version:' + name] = (0, value + 1)
+
+
+class RedisCache(NullCache):
+    """Cache stored in the app's Redis instance.
+
+    Redis errors are treated as cache misses, so the app keeps working
+    (uncached) when Redis is not reachable.
+    """
+
+    def __init__(self, app, key_prefix='cache:', default_timeout=300):
+        self.app = app
+        self.key_prefix = key_prefix
+        self.default_timeout = default_timeout
+
+    @property
+    def connection(self):
+        return self.app.redis
+
+    def get(self, key):
+        try:
+            value = self.connection.get(self.key_prefix + key)
+        except redis.exceptions.RedisError:
+            return None
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        try:
+            self.connection.set(self.key_prefix + key, pickle.dumps(value),
+                                ex=timeout or None)
+        except redis.exceptions.RedisError:
+            pass
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self.connection.delete(*[self.key_prefix + key for key in keys])
+        except redis.exceptions.RedisError:
+            pass
+
+    def clear(self):
+        try:
+            keys = list(self.connection.scan_iter(self.key_prefix + '*'))
+            if keys:
+                self.connection.delete(*keys)
+        except redis.exceptions.RedisError:
+            pass
+
+    def get_version(self, name):
+        try:
+            value = self.connection.get(self.key_prefix + 'version:' + name)
+        except redis.exceptions.RedisError:
+            return None
+        return int(value) if value is not None else 0
+
+    def bump_version(self, name):
+        try:
+            self.connection.incr(self.key_prefix + 'version:' + name)
+        except redis.exceptions.RedisError:
+            pass
+
+
+class TwoLevelCache(NullCache):
+    """Short-lived per-worker LRU in front of a shared cache.
+
+    Deletes only reach the local level of the current worker, so entries
+    in other workers can be stale for up to local_timeout seconds.
+    """
+
+    def __init__(self, shared, local_timeout=5, max_entries=10000):
+        self.shared = shared
+        self.local = SimpleCache(max_entries=max_entries, default_timeout=local_timeout)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value, timeout=None):
+        self.local.set(key, value)
+        self.shared.set(key, value, timeout)
+
+    def delete(self, *keys):
+        self.local.delete(*keys)
+        self.shared.delete(*keys)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+def make_cache(app):
+    cache_type = app.config['CACHE_TYPE']
+    timeout = app.config['CACHE_DEFAULT_TIMEOUT']
+    if cache_type == 'redis':
+        return RedisCache(app, default_timeout=timeout)
+    if cache_type == 'simple':
+        return SimpleCache(default_timeout=timeout)
+    return NullCache()
+
+
+def versioned_key(name, *parts):
+    """Builds a cache key that changes whenever `name` is invalidated.
+
+    Returns None if the current version cannot be determined (e.g. Redis
+    is down), in which case the caller should not cache at all.
+    """
+    version = current_app.cache.get_version(name)
+    if version is None:
+        return None
+    return ':'.join([name, str(version)] + [str(part) for part in parts])
+
+
+def invalidate(name):
+    current_app.cache.bump_version(name)
+
+
+class FragmentCacheExtension(Extension):
+    """Jinja tag for caching rendered template fragments.
+
+    Usage::
+
+        {% cache 'dinner_event_guests', event.id, event_version %}
+          ...
+        {% endcache %}
+
+    All arguments are joined into the cache key, so any value the fragment
+    depends on (usually a version from get_version()) belongs in there.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_fragment', [nodes.List(parts)]),
+            [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, parts, caller):
+        key = 'fragment:' + ':'.join(str(part) for part in parts)
+        html = current_app.cache.get(key)
+        if html is None:
+            html = caller()
+            current_app.cache.set(
+                key, str(html),
+                timeout=current_app.config['FRAGMENT_CACHE_TIMEOUT'])
+        return Markup(html)
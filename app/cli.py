@@ -38,3 +38,218 @@ def compile():
     """Compile all languages."""
     if os.system('pybabel compile -d app/translations'):
         raise RuntimeError('compile command failed')
+
+
+#Selbsterstellt
+@bp.cli.command('backfill-conversations')
+def backfill_conversations():
+    """Set the conversation key of messages created before it existed."""
+    import sqlalchemy as sa
+    from app import db
+    from app.models import Message
+
+    low = sa.func.min(Message.sender_id, Message.recipient_id) \
+        if db.engine.name == 'sqlite' else sa.func.least(Message.sender_id, Message.recipient_id)
+    high = sa.func.max(Message.sender_id, Message.recipient_id) \
+        if db.engine.name == 'sqlite' else sa.func.greatest(Message.sender_id, Message.recipient_id)
+    result = db.session.execute(
+        sa.update(Message).where(Message.conversation_key.is_(None)).values(
+            conversation_key=sa.cast(low, sa.String) + ':' + sa.cast(high, sa.String)))
+    db.session.commit()
+    click.echo(f'{result.rowcount} messages updated')
+
+
+#Selbsterstellt
+@bp.cli.command()
+@click.option('--users', default=1000, help='Number of users.')
+@click.option('--events', default=2000, help='Number of dinner events.')
+@click.option('--follows', default=20, help='Average follows per user.')
+@click.option('--guests', default=15, help='Average invited users per event.')
+@click.option('--comments', default=5, help='Average comments per event.')
+@click.option('--messages', default=5000, help='Number of private messages.')
+@click.option('--notifications', default=5000, help='Number of notifications.')
+@click.option('--seed', default=42, help='Random seed, the same seed generates the same data.')
+@click.option('--chunk-size', default=5000, help='Rows per INSERT batch.')
+def seed(users, events, follows, guests, comments, messages, notifications, seed, chunk_size):
+    """Fill the database with synthetic data."""
+    import time
+    from app.seed import seed_database, DEFAULT_PASSWORD
+
+    start = time.perf_counter()
+
+    inserted = {}
+
+    def progress(table, count):
+        inserted[table] = count
+        click.echo(f'\r{sum(inserted.values())} rows inserted', nl=False)
+
+    counts = seed_database(users=users, events=events, follows=follows, guests=guests,
+                           comments=comments, messages=messages,
+                           notifications=notifications, seed=seed,
+                           chunk_size=chunk_size, progress=progress)
+    click.echo()
+    for table, count in counts.items():
+        click.echo(f'{table:<14}{count:>10}')
+    click.echo(f'{sum(counts.values())} rows in {time.perf_counter() - start:.1f}s, '
+               f'password for all users: {DEFAULT_PASSWORD}')
+
+
+#Selbsterstellt
+@bp.cli.group()
+def bench():
+    """Benchmark commands."""
+    pass
+
+
+@bench.command()
+@click.option('--users', default=200, help='Number of users to seed.')
+@click.option('--events', default=500, help='Number of dinner events to seed.')
+@click.option('--guests', default=20, help='Invited users per event.')
+@click.option('--comments', default=10, help='Comments per event.')
+@click.option('--iterations', default=20, help='Timed runs per benchmark.')
+@click.option('--startup-iterations', default=5, help='Timed app, worker and CLI starts.')
+@click.option('--seed', default=42, help='Random seed for the generated data.')
+@click.option('--only', multiple=True, help='Run only the named benchmark(s).')
+@click.option('--output', default='bench_results.json', help='JSON file for the results.')
+@click.option('--compare', 'compare_with', type=click.Path(exists=True),
+              help='Previous results file to compare against.')
+def run(users, events, guests, comments, iterations, startup_iterations, seed, only, output,
+        compare_with):
+    """Time the hot endpoints and model methods."""
+    import json
+    from app.benchmark import run_benchmarks, compare
+
+    results = run_benchmarks(users=users, events=events, guests=guests,
+                             comments=comments, iterations=iterations, seed=seed,
+                             startup_iterations=startup_iterations, only=only,
+                             progress=lambda name: click.echo(f'{name} ...'))
+    click.echo(f'{"benchmark":<24}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"queries":>9}')
+    for name, result in results['results'].items():
+        click.echo(f'{name:<24}{result["p50_ms"]:>10.2f}{result["p90_ms"]:>10.2f}'
+                   f'{result["p99_ms"]:>10.2f}{result.get("queries", "-"):>9}')
+    if compare_with:
+        with open(compare_with) as f:
+            previous = json.load(f)
+        click.echo(f'\nCompared with {compare_with}:')
+        for name, before, after, change, queries_before, queries_after in compare(previous, results):
+            line = f'{name:<24}{before:>10.2f} -> {after:<10.2f}{change:+7.1f}%'
+            if queries_after is not None:
+                line += f'   queries {queries_before} -> {queries_after}'
+            click.echo(line)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    click.echo(f'Results written to {output}')
+
+
+#Selbsterstellt
+@bp.cli.group()
+def reminders():
+    """Event reminder commands."""
+    pass
+
+
+@reminders.command('run')
+@click.option('--hours', type=int, help='Remind of events starting within this many hours.')
+@click.option('--batch-size', type=int, help='Reminders per batch.')
+@click.option('--interval', default=0, help='Repeat every INTERVAL seconds (0 runs once).')
+def run_reminders(hours, batch_size, interval):
+    """Send reminders for upcoming dinner events."""
+    import time
+    from app import db
+    from app.reminders import send_reminders
+
+    while True:
+        sent = send_reminders(hours=hours, batch_size=batch_size)
+        click.echo(f'{sent} reminders sent')
+        db.session.remove()
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+#Selbsterstellt
+@bp.cli.group()
+def archive():
+    """Event archive commands."""
+    pass
+
+
+@archive.command('run')
+@click.option('--days', type=int, help='Archive events that ended more than DAYS days ago.')
+@click.option('--batch-size', type=int, help='Events moved per transaction.')
+def run_archive(days, batch_size):
+    """Move past dinner events into the archive tables."""
+    from app.archive import archive_events
+
+    archived = archive_events(days=days, batch_size=batch_size,
+                              progress=lambda count: click.echo(f'\r{count} events archived', nl=False))
+    click.echo(f'\r{archived} events archived')
+
+
+#Selbsterstellt
+@bp.cli.group()
+def autocomplete():
+    """Username autocomplete commands."""
+    pass
+
+
+@autocomplete.command()
+def rebuild():
+    """Rebuild the username prefix index in Redis."""
+    from app.autocomplete import rebuild_index
+
+    click.echo(f'{rebuild_index()} users indexed')
+
+
+#Selbsterstellt
+@bp.cli.group()
+def search():
+    """Search index commands."""
+    pass
+
+
+@search.command('reindex')
+@click.argument('models', nargs=-1)
+@click.option('--workers', default=4, help='Parallel bulk workers.')
+@click.option('--chunk-size', default=1000, help='Ids per bulk request.')
+@click.option('--keep-old', is_flag=True, help='Keep the previous index after the alias swap.')
+def search_reindex(models, workers, chunk_size, keep_old):
+    """Rebuild the search index of MODELS (default: all) without downtime."""
+    import time
+    from flask import current_app
+    from app.models import SearchableMixin
+
+    if not current_app.elasticsearch:
+        raise click.ClickException('ELASTICSEARCH_URL is not configured')
+    searchable = {cls.__tablename__: cls for cls in SearchableMixin.__subclasses__()}
+    unknown = set(models) - set(searchable)
+    if unknown:
+        raise click.BadParameter(f'not searchable: {", ".join(sorted(unknown))}', param_hint='MODELS')
+    if not searchable:
+        click.echo('No searchable models')
+    for name in models or searchable:
+        start = time.perf_counter()
+        index, count = searchable[name].reindex(
+            workers=workers, chunk_size=chunk_size, keep_old=keep_old,
+            progress=lambda done, rate: click.echo(f'\r{name}: {done} documents, {rate:.0f}/s', nl=False))
+        elapsed = time.perf_counter() - start
+        click.echo(f'\r{name}: {count} documents in {elapsed:.1f}s '
+                   f'({count / elapsed if elapsed else 0:.0f}/s), alias now points to {index}')
+
+
+#Selbsterstellt
+@bp.cli.group()
+def assets():
+    """Static asset commands."""
+    pass
+
+
+@assets.command('build')
+def build_assets():
+    """Fingerprint and precompress the static files into static/dist."""
+    from flask import current_app
+    from app.assets import build
+
+    manifest = build(current_app.static_folder)
+    for filename, hashed in sorted(manifest.items()):
+        click.echo(f'{filename} -> {hashed}')
@@ -0,0 +1,188 @@
+import sqlalchemy as sa
+from flask import current_app, url_for
+from redis.exceptions import RedisError
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models import DinnerEvent, followers
+from app.serializers import url_template
+
+# Selbsterstellt: Feed der öffentlichen Events gefolgter User (Fan-out on write).
+# Jeder User hat ein Redis Sorted Set feed:<user_id> mit den Event-IDs (Score =
+# Event-ID, also neueste zuerst), gekürzt auf FEED_MAX_LENGTH. Neue Events
+# werden nach dem Commit in die bereits aufgebauten Feeds der Follower
+# geschrieben (ab FEED_ASYNC_THRESHOLD Einträgen per RQ-Job), eine Seite lesen
+# kostet damit nur O(Seitengrösse). Fehlt der Key, wird er beim Lesen aus der
+# Datenbank neu aufgebaut; ist Redis nicht erreichbar, liefert SQL den Feed.
+
+PIPELINE_CHUNK_SIZE = 500
+
+
+def _key(user_id):
+    return f'feed:{user_id}'
+
+
+def _feed_query(user_id):
+    return sa.select(DinnerEvent.id).join(
+        followers, followers.c.followed_id == DinnerEvent.creator_id
+    ).where(followers.c.follower_id == user_id, DinnerEvent.is_public == True)
+
+
+def _add(pipe, user_id, event_ids):
+    if event_ids:
+        pipe.zadd(_key(user_id), {event_id: event_id for event_id in event_ids})
+        pipe.zremrangebyrank(_key(user_id), 0, -current_app.config['FEED_MAX_LENGTH'] - 1)
+
+
+def _existing_feeds(user_ids):
+    """Die User aus user_ids, deren Feed bereits in Redis liegt."""
+    user_ids = list(user_ids)
+    existing = set()
+    for start in range(0, len(user_ids), PIPELINE_CHUNK_SIZE):
+        chunk = user_ids[start:start + PIPELINE_CHUNK_SIZE]
+        pipe = current_app.redis.pipeline(transaction=False)
+        for user_id in chunk:
+            pipe.exists(_key(user_id))
+        existing.update(user_id for user_id, found in zip(chunk, pipe.execute()) if found)
+    return existing
+
+
+def push_events(pushes, sync=False):
+    """Schreibt [(event_id, follower_ids), ...] in die Feeds der Follower.
+
+    Nur vorhandene Feeds werden ergänzt: ein neu angelegter Key enthielte nur
+    dieses Event und würde beim Lesen nie mehr neu aufgebaut. Grosse Fan-outs
+    übernimmt ein RQ-Job."""
+    if not sync and sum(len(follower_ids) for _, follower_ids in pushes) >= \
+            current_app.config['FEED_ASYNC_THRESHOLD']:
+        try:
+            current_app.task_queue.enqueue('app.tasks.push_feed_events', pushes)
+            return
+        except RedisError as e:
+            current_app.logger.warning('Queueing feed fan-out failed, pushing inline: %s', e)
+    try:
+        existing = _existing_feeds({follower_id for _, follower_ids in pushes
+                                    for follower_id in follower_ids})
+        pipe = current_app.redis.pipeline(transaction=False)
+        pending = 0
+        for event_id, follower_ids in pushes:
+            for follower_id in follower_ids:
+                if follower_id not in existing:
+                    continue
+                _add(pipe, follower_id, [event_id])
+                pending += 1
+                if pending >= PIPELINE_CHUNK_SIZE:
+                    pipe.execute()
+                    pending = 0
+        pipe.execute()
+    except RedisError as e:
+        # Fehlende Einträge holt der SQL-Fallback bzw. der nächste Neuaufbau nach
+        current_app.logger.warning('Feed fan-out failed: %s', e)
+
+
+def _creator_events(creator_id):
+    return db.session.scalars(
+        sa.select(DinnerEvent.id)
+          .where(DinnerEvent.creator_id == creator_id, DinnerEvent.is_public == True)
+          .order_by(DinnerEvent.id.desc())
+          .limit(current_app.config['FEED_MAX_LENGTH'])).all()
+
+
+def follow_creator(user, creator):
+    """Übernimmt die Events eines neu gefolgten Users in den Feed (nach dem Commit)."""
+    try:
+        if current_app.redis.exists(_key(user.id)):
+            pipe = current_app.redis.pipeline(transaction=False)
+            _add(pipe, user.id, _creator_events(creator.id))
+            pipe.execute()
+    except RedisError as e:
+        current_app.logger.warning('Feed update failed: %s', e)
+
+
+def unfollow_creator(user, creator):
+    """Entfernt die Events eines nicht mehr gefolgten Users aus dem Feed."""
+    event_ids = db.session.scalars(
+        sa.select(DinnerEvent.id).where(DinnerEvent.creator_id == creator.id)).all()
+    try:
+        if event_ids:
+            current_app.redis.zrem(_key(user.id), *event_ids)
+    except RedisError as e:
+        current_app.logger.warning('Feed update failed: %s', e)
+
+
+def delete_feed(user_id):
+    try:
+        current_app.redis.delete(_key(user_id))
+    except RedisError as e:
+        current_app.logger.warning('Feed update failed: %s', e)
+
+
+def _rebuild(user_id):
+    event_ids = db.session.scalars(_feed_query(user_id).order_by(
+        DinnerEvent.id.desc()).limit(current_app.config['FEED_MAX_LENGTH'])).all()
+    pipe = current_app.redis.pipeline()
+    pipe.delete(_key(user_id))
+    _add(pipe, user_id, event_ids)
+    pipe.execute()
+    return event_ids
+
+
+def _page_ids(user_id, before, count):
+    """IDs einer Seite aus Redis, None falls Redis nicht verfügbar ist."""
+    try:
+        key = _key(user_id)
+        ids = current_app.redis.zrevrangebyscore(
+            key, f'({before}' if before else '+inf', '-inf', start=0, num=count)
+        if ids or current_app.redis.exists(key):
+            return [int(event_id) for event_id in ids]
+        event_ids = _rebuild(user_id)
+    except RedisError:
+        return None
+    return [event_id for event_id in event_ids if not before or event_id < before][:count]
+
+
+def get_feed(user, before=None, limit=None):
+    """Returns (events, next_before) for the events of the users that user
+    follows, newest first. next_before is None on the last page."""
+    limit = max(1, limit or current_app.config['FEED_PER_PAGE'])
+    ids = _page_ids(user.id, before, limit + 1)
+    if ids is None:
+        query = _feed_query(user.id)
+        if before:
+            query = query.where(DinnerEvent.id < before)
+        ids = db.session.scalars(query.order_by(DinnerEvent.id.desc()).limit(limit + 1)).all()
+    next_before = ids[limit - 1] if len(ids) > limit else None
+    ids = ids[:limit]
+    events = {event.id: event for event in db.session.scalars(
+        sa.select(DinnerEvent)
+          .where(DinnerEvent.id.in_(ids), DinnerEvent.is_public == True)
+          .options(selectinload(DinnerEvent.creator)))} if ids else {}
+    # Gelöschte oder nicht mehr öffentliche Events beim Lesen entfernen
+    stale = [event_id for event_id in ids if event_id not in events]
+    if stale:
+        try:
+            current_app.redis.zrem(_key(user.id), *stale)
+        except RedisError:
+            pass
+    return [events[event_id] for event_id in ids if event_id in events], next_before
+
+
+def feed_to_dict(user, before=None, limit=None):
+    limit = max(1, min(limit or current_app.config['FEED_PER_PAGE'], 100))
+    events, next_before = get_feed(user, before, limit)
+    event_url = url_template('api.get_dinner_event', 'id')
+    return {
+        'items': [{
+            'id': event.id,
+            'title': event.title,
+            'event_date': event.event_date.isoformat() if event.event_date else None,
+            'created_at': event.created_at.isoformat() if event.created_at else None,
+            'creator': {'id': event.creator.id, 'username': event.creator.username},
+            '_links': {'self': event_url.format(id=event.id)}
+        } for event in events],
+        '_meta': {'limit': limit, 'next_before': next_before},
+        '_links': {
+            'self': url_for('api.get_feed', before=before, limit=limit),
+            'next': url_for('api.get_feed', before=next_before,
+                            limit=limit) if next_before else None
+        }
+    }
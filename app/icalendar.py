@@ -0,0 +1,58 @@
+from datetime import timezone
+
+# Selbsterstellt: minimale iCalendar-Erzeugung (RFC 5545) für Kalender-Abos
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;') \
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def _fold(line):
+    """Lines longer than 75 octets are folded with CRLF + space."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    while len(data) > 75:
+        cut = 75 if not parts else 74
+        # Nicht mitten in einem UTF-8-Zeichen umbrechen
+        while cut and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _utc(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_calendar(name, entries, uid_domain):
+    """Renders (event, category, url) tuples as a VCALENDAR document."""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//dbwe-app//Event Planner//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:' + _escape(name),
+    ]
+    for event, category, url in entries:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:dinner-event-{event.id}@{uid_domain}',
+            'DTSTAMP:' + _utc(event.updated_at),
+            'LAST-MODIFIED:' + _utc(event.updated_at),
+            'DTSTART:' + event.event_date.strftime('%Y%m%dT%H%M%S'),
+            'SUMMARY:' + _escape(event.title),
+            'DESCRIPTION:' + _escape(event.description),
+            'CATEGORIES:' + _escape(category),
+            'URL:' + url,
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
@@ -0,0 +1,109 @@
+import threading
+import time
+from contextlib import contextmanager
+import sqlalchemy as sa
+from flask import g, request, current_app, has_request_context
+
+# Selbsterstellt: Zählt SQL-Abfragen und misst Zeiten pro Request.
+# Aktivierung über SQL_INSTRUMENTATION; count_queries() und
+# assert_max_queries() funktionieren auch ohne (z.B. in tests.py).
+
+_local = threading.local()
+_listeners_installed = False
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def add(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+
+
+def _active_stats():
+    stats = list(getattr(_local, 'counters', ()))
+    if has_request_context() and '_query_stats' in g:
+        stats.append(g._query_stats)
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    for stats in _active_stats():
+        stats.add(statement, duration)
+    if has_request_context() and '_query_stats' in g and \
+            duration > current_app.config['SLOW_QUERY_THRESHOLD']:
+        current_app.logger.warning(
+            'Slow query in %s (%.1f ms): %s', request.endpoint,
+            duration * 1000, statement)
+
+
+def _install_listeners():
+    global _listeners_installed
+    if not _listeners_installed:
+        sa.event.listen(sa.engine.Engine, 'before_cursor_execute',
+                        _before_cursor_execute)
+        sa.event.listen(sa.engine.Engine, 'after_cursor_execute',
+                        _after_cursor_execute)
+        _listeners_installed = True
+
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements executed inside the with block."""
+    _install_listeners()
+    stats = QueryStats()
+    counters = _local.__dict__.setdefault('counters', [])
+    counters.append(stats)
+    try:
+        yield stats
+    finally:
+        counters.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    with count_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise AssertionError('{} queries executed, at most {} expected:\n{}'.format(
+            stats.count, max_queries, '\n'.join(stats.statements)))
+
+
+def _start_request():
+    g._query_stats = QueryStats()
+    g._request_start = time.perf_counter()
+
+
+def _finish_request(response):
+    if '_query_stats' not in g:
+        return response
+    stats = g._query_stats
+    total = time.perf_counter() - g._request_start
+    response.headers.add(
+        'Server-Timing', 'db;dur={:.1f};desc="{} queries", app;dur={:.1f}'.format(
+            stats.duration * 1000, stats.count, total * 1000))
+    if total > current_app.config['SLOW_REQUEST_THRESHOLD']:
+        current_app.logger.warning(
+            'Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in SQL',
+            request.method, request.path, request.endpoint, total * 1000,
+            stats.count, stats.duration * 1000)
+    return response
+
+
+def init_app(app):
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+    _install_listeners()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
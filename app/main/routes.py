@@ -1,15 +1,25 @@
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone, date, timedelta
+from hashlib import md5
 import json
 import sqlalchemy as sa
-from flask import render_template, flash, redirect, url_for, request, g, current_app, jsonify
+from flask import render_template, flash, redirect, url_for, request, g, current_app, jsonify, session, \
+    abort, make_response
 from flask_login import current_user, login_required
 from flask_babel import _, get_locale
-from sqlalchemy.orm import joinedload
-
-from app import db
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db, purge
+from app.archive import with_archive, parse_history_key
+from app.autocomplete import suggest
+from app.avatars import clamp_size, get_identicon
+from app.cache import versioned_key
+from app.feed import get_feed, follow_creator, unfollow_creator
+from app.notifications import notify_users
+from app.icalendar import render_calendar
 from app.main import bp
 from app.main.forms import EditProfileForm, EmptyForm, MessageForm, DinnerEventForm, CommentForm  
-from app.models import User, Message, Notification, DinnerEvent, Comment
+from app.models import User, Message, Notification, DinnerEvent, DinnerEventRsvp, Comment, \
+    ArchivedDinnerEvent, archived_dinner_event_invites
 
 # Teilweise von miguelgrinberg übernommen, eigene Anpassungen sind mit "Selbsterstellt" dokumentiert
 
@@ -32,12 +42,50 @@ def process_invites(event, invite_str):
                 'event_id': event.id
             })
 
+#Selbsterstellt
+CALENDAR_COLORS = {
+    'created': '#007bff',  # blue
+    'invited': '#28a745',  # green
+    'rsvp': '#6f42c1',  # violet
+}
+CALENDAR_CATEGORIES = {'created': 'Created', 'invited': 'Invited', 'rsvp': 'RSVP'}
+
+def calendar_events_query(user):
+    """Selbst erstellte Events und Events, zu denen der User eingeladen ist."""
+    return sa.select(DinnerEvent).where(
+        sa.or_(DinnerEvent.creator_id == user.id,
+               DinnerEvent.invited.any(User.id == user.id)))
+
+def get_calendar_events(user):
+    """Liefert (Event, Kategorie)-Paare: 'created', 'rsvp' (beantwortet) oder 'invited'."""
+    events = db.session.scalars(calendar_events_query(user).order_by(DinnerEvent.event_date)).all()
+    responded = set(db.session.scalars(
+        sa.select(DinnerEventRsvp.dinner_event_id).where(
+            DinnerEventRsvp.user_id == user.id, DinnerEventRsvp.status != 'no_response')))
+    entries = []
+    for event in events:
+        if event.creator_id == user.id:
+            entries.append((event, 'created'))
+        elif event.id in responded:
+            entries.append((event, 'rsvp'))
+        else:
+            entries.append((event, 'invited'))
+    return entries
+
 # --- Vor-Anfrage ---
 @bp.before_app_request
 def before_request():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.now(timezone.utc)
-        db.session.commit()
+        # Selbsterstellt: last_seen nur periodisch schreiben, damit nicht jeder
+        # Request eine Schreibtransaktion (und den Primary) braucht
+        now = datetime.now(timezone.utc)
+        last_seen = current_user.last_seen
+        if last_seen is not None and last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+        if last_seen is None or now - last_seen > timedelta(
+                seconds=current_app.config['LAST_SEEN_UPDATE_INTERVAL']):
+            current_user.last_seen = now
+            db.session.commit()
     g.locale = str(get_locale())
 
 # --- Startseiten ---
@@ -47,9 +95,14 @@ def before_request():
 @login_required
 def index():
     now = datetime.now()
+    # Vom Template benötigte Beziehungen gesammelt laden statt pro Event
     upcoming_events = db.session.scalars(
         sa.select(DinnerEvent)
           .where(DinnerEvent.event_date >= now)
+          .options(selectinload(DinnerEvent.creator),
+                   selectinload(DinnerEvent.invited),
+                   selectinload(DinnerEvent.rsvps),
+                   selectinload(DinnerEvent.pending_opt_ins))
           .order_by(DinnerEvent.event_date.asc())
     ).all()
     created_upcoming_events = db.session.scalars(
@@ -63,7 +116,10 @@ def index():
           .order_by(DinnerEvent.event_date.desc())
     ).all()
     need_accept_optins_events = [event for event in created_upcoming_events if event.pending_opt_ins]
+    #Selbsterstellt: Feed der gefolgten User, seitenweise über feed_before
+    feed_events, feed_next = get_feed(current_user, request.args.get('feed_before', type=int))
     return render_template('index.html', title=_('Home'),
+                           feed_events=feed_events, feed_next=feed_next,
                            upcoming_events=upcoming_events,
                            created_upcoming_events=created_upcoming_events,
                            created_previous_events=created_previous_events,
@@ -72,23 +128,44 @@ def index():
 #Übernommen und stark verändert
 @bp.route('/explore')
 def explore():
+    # Anonyme Besucher (Crawler, ausgeloggte Nutzer) erhalten die gecachte Seite
+    cache_key = None
+    history = request.args.get('history', type=int) == 1
+    if not current_user.is_authenticated and '_flashes' not in session and not history:
+        cache_key = versioned_key('explore', g.locale)
+        if cache_key is not None:
+            html = current_app.cache.get(cache_key)
+            if html is not None:
+                return html
     now = datetime.now()
     upcoming = db.session.scalars(
         sa.select(DinnerEvent)
           .where(DinnerEvent.event_date >= now, DinnerEvent.is_public == True)
           .order_by(DinnerEvent.event_date.asc())
     ).all()
-    previous = db.session.scalars(
-        sa.select(DinnerEvent)
-          .where(DinnerEvent.event_date < now, DinnerEvent.is_public == True)
-          .order_by(DinnerEvent.event_date.desc())
-    ).all()
+    previous_query = sa.select(DinnerEvent).where(
+        DinnerEvent.event_date < now, DinnerEvent.is_public == True
+    ).order_by(DinnerEvent.event_date.desc())
+    #Selbsterstellt: archivierte Events nur in der Verlaufsansicht, seitenweise
+    history_next = None
+    if history:
+        previous, history_next = with_archive(
+            previous_query, sa.select(ArchivedDinnerEvent).where(
+                ArchivedDinnerEvent.is_public == True
+            ).options(selectinload(ArchivedDinnerEvent.creator)),
+            before=parse_history_key(request.args.get('before')))
+    else:
+        previous = db.session.scalars(previous_query).all()
     description = ""
     if not current_user.is_authenticated:
         description = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
                        "tempor incididunt ut labore et dolore magna aliqua. Please <a href='{}'>login</a> "
                        "to see more that Webapp.").format(url_for('auth.login'))
-    return render_template('explore.html', title=_('Explore'), upcoming=upcoming, previous=previous, description=description)
+    html = render_template('explore.html', title=_('Explore'), upcoming=upcoming, previous=previous,
+                           description=description, history=history, history_next=history_next)
+    if cache_key is not None:
+        current_app.cache.set(cache_key, html, timeout=current_app.config['EXPLORE_CACHE_TIMEOUT'])
+    return html
 
 #Erweitert für Dinner Events
 # --- User-bezogene Routen ---
@@ -97,16 +174,43 @@ def explore():
 def user(username):
     user_obj = get_user_by_username(username)
     form = EmptyForm()
-    event_history = db.session.scalars(
-        sa.select(DinnerEvent).where(
+    history = request.args.get('history', type=int) == 1
+    query = sa.select(DinnerEvent).where(
+        sa.or_(
+            DinnerEvent.is_public == True,
+            DinnerEvent.creator_id == user_obj.id,
+            DinnerEvent.invited.any(User.id == user_obj.id)
+        )
+    ).order_by(DinnerEvent.event_date.desc())
+    history_next = None
+    if history:
+        event_history, history_next = with_archive(query, sa.select(ArchivedDinnerEvent).where(
             sa.or_(
-                DinnerEvent.is_public == True,
-                DinnerEvent.creator_id == user_obj.id,
-                DinnerEvent.invited.any(User.id == user_obj.id)
+                ArchivedDinnerEvent.is_public == True,
+                ArchivedDinnerEvent.creator_id == user_obj.id,
+                ArchivedDinnerEvent.id.in_(
+                    sa.select(archived_dinner_event_invites.c.dinner_event_id).where(
+                        archived_dinner_event_invites.c.user_id == user_obj.id))
             )
-        ).order_by(DinnerEvent.event_date.desc())
-    ).all()
-    return render_template('user.html', user=user_obj, form=form, event_history=event_history)
+        ), before=parse_history_key(request.args.get('before')))
+    else:
+        event_history = db.session.scalars(query).all()
+    return render_template('user.html', user=user_obj, form=form, event_history=event_history,
+                           history=history, history_next=history_next)
+
+# Selbsterstellt: lokal generierte Identicons, unveränderlich pro Digest und Grösse
+@bp.route('/avatar/<digest>')
+def avatar(digest):
+    if len(digest) != 32 or any(c not in '0123456789abcdef' for c in digest):
+        abort(404)
+    size = clamp_size(request.args.get('s', 80, type=int))
+    response = make_response(get_identicon(digest, size))
+    response.mimetype = 'image/png'
+    response.set_etag(f'{digest}-{size}')
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
 @bp.route('/user/<username>/popup', methods=['GET', 'POST'])
 @login_required
@@ -137,6 +241,7 @@ def follow(username):
         else:
             current_user.follow(user_obj)
             db.session.commit()
+            follow_creator(current_user, user_obj)
             flash(_('You are following %(username)s!', username=username))
         return redirect(url_for('main.user', username=username))
     return redirect(url_for('main.index'))
@@ -155,6 +260,7 @@ def unfollow(username):
         else:
             current_user.unfollow(user_obj)
             db.session.commit()
+            unfollow_creator(current_user, user_obj)
             flash(_('You are not following %(username)s.', username=username))
         return redirect(url_for('main.user', username=username))
     return redirect(url_for('main.index'))
@@ -185,7 +291,8 @@ def messages():
     # Sortierung der empfangenen Nachrichten
     messages_list = sorted(current_user.messages_received, key=lambda m: m.timestamp, reverse=True)
     
-    event_notif = ["event_created", "dinner_event_invite", "rsvp_updated", "uninvited"]
+    event_notif = ["event_created", "dinner_event_invite", "rsvp_updated", "uninvited",
+                   "dinner_event_updated", "dinner_event_cancelled", "dinner_event_reminder"]
     history_query = current_user.notifications.select().where(
         Notification.name.in_(event_notif)
     ).order_by(Notification.timestamp.desc())
@@ -256,11 +363,14 @@ def create_dinner_event():
 @bp.route('/dinner_event/<int:event_id>')
 @login_required
 def dinner_event_detail(event_id):
+    # RSVPs und Kommentare werden erst im Template (und nur bei einem
+    # Fragment-Cache-Miss) geladen
+    # Listen per selectinload statt joinedload, sonst multipliziert jede
+    # weitere Liste die Zeilen (Gäste x Kommentare). Kommentare werden
+    # seitenweise geladen (DinnerEvent.comment_page)
     q = sa.select(DinnerEvent).options(
             joinedload(DinnerEvent.creator),
-            joinedload(DinnerEvent.invited),
-            joinedload(DinnerEvent.rsvps),
-            joinedload(DinnerEvent.comments).joinedload(Comment.user)
+            selectinload(DinnerEvent.invited)
         ).where(DinnerEvent.id == event_id)
     event = db.session.scalar(q)
     if event is None:
@@ -269,11 +379,38 @@ def dinner_event_detail(event_id):
     if not event.is_public and event.creator != current_user and current_user not in event.invited:
         flash(_('You are not allowed to view this dinner event.'))
         return redirect(url_for('main.dinner_events_list'))
-    user_rsvp = next((r for r in event.rsvps if r.user_id == current_user.id), None)
-    pending_opt_ins = [user for user in event.invited if user not in event.rsvps]
+    user_rsvp = db.session.get(DinnerEventRsvp, (event.id, current_user.id))
+    # Kommentarliste mit Löschen-Buttons ist nutzerspezifisch und wird nicht gecacht
+    has_own_comments = db.session.scalar(
+        sa.select(Comment.id).where(Comment.event_id == event.id,
+                                    Comment.user_id == current_user.id).limit(1)) is not None
+    event_version = current_app.cache.get_version(f'dinner_event:{event.id}')
     comment_form = CommentForm()
     return render_template('dinner_event_detail.html', event=event, user_rsvp=user_rsvp,
-                           comment_form=comment_form, pending_opt_ins=pending_opt_ins)
+                           comment_form=comment_form, event_version=event_version,
+                           has_own_comments=has_own_comments)
+
+#Selbsterstellt: Vorschläge für das Einladungsfeld
+@bp.route('/users/autocomplete')
+@login_required
+def autocomplete_users():
+    return jsonify([username for user_id, username in
+                    suggest(current_user, request.args.get('q', ''), limit=8)])
+
+#Selbsterstellt: ältere Kommentare für den "Load older"-Button
+@bp.route('/dinner_event/<int:event_id>/comments')
+@login_required
+def dinner_event_comments(event_id):
+    event = db.get_or_404(DinnerEvent, event_id)
+    if not event.is_visible_to(current_user):
+        abort(403)
+    before = request.args.get('before', type=int)
+    limit = max(1, min(request.args.get('limit', current_app.config['COMMENTS_PER_PAGE'], type=int), 100))
+    data = event.comments_to_dict(before, limit, 'main.dinner_event_comments', event_id=event_id)
+    for item in data['items']:
+        if item['user_id'] == current_user.id:
+            item['delete_url'] = url_for('main.delete_comment', comment_id=item['id'])
+    return data
 
 # Kommentar zu einem Dinner Event hinzufügen, an miguelgrinberg angelehnt und angepasst (Post)
 @bp.route('/dinner_event/<int:event_id>/comment', methods=['POST'])
@@ -395,8 +532,15 @@ def edit_dinner_event(event_id):
         event.external_event_url = form.external_event_url.data
         event.event_date = form.date.data
         event.is_public = form.is_public.data
+        #Selbsterstellt: bisherige Gäste mit einem Bulk-Insert benachrichtigen,
+        #neu Eingeladene erhalten stattdessen die Einladung
+        guest_ids = event.invited_user_ids(exclude=current_user.id)
         if form.invite.data and not form.is_public.data:
             process_invites(event, form.invite.data)
+        notify_users(guest_ids, 'dinner_event_updated', {
+            'message': _('The event %(event_title)s has been updated.', event_title=event.title),
+            'event_id': event.id
+        })
         db.session.commit()
         flash(_('Dinner event updated.'))
         return redirect(url_for('main.dinner_event_detail', event_id=event.id))
@@ -511,9 +655,14 @@ def delete_dinner_event(event_id):
     if event.creator != current_user:
         flash(_('You are not allowed to delete this dinner event.'))
         return redirect(url_for('main.dinner_event_detail', event_id=event_id))
-    db.session.delete(event)
-    db.session.commit()
-    flash(_('Dinner event deleted successfully.'))
+    # Ohne event_id, sonst würde die Benachrichtigung mit dem Event gelöscht
+    notify_users(event.invited_user_ids(exclude=current_user.id), 'dinner_event_cancelled', {
+        'message': _('The event %(event_title)s has been cancelled.', event_title=event.title)
+    })
+    if purge.delete_dinner_event(event):
+        flash(_('Dinner event deleted successfully.'))
+    else:
+        flash(_('Dinner event is being deleted.'))
     return redirect(url_for('main.dinner_events_list'))
 
 # --- Ende Dinner Event Routen ---
@@ -522,38 +671,49 @@ def delete_dinner_event(event_id):
 @bp.route('/calendar')
 @login_required
 def event_calendar():
-    all_events = db.session.scalars(sa.select(DinnerEvent)).all()
-    created_events = [e for e in all_events if e.creator == current_user]
-    invited_events = [e for e in all_events if e.creator != current_user and current_user in e.invited]
-    rsvp_events = [e for e in invited_events if any(r.user_id == current_user.id and r.status != 'no_response' for r in e.rsvps)]
-    invited_only = [e for e in invited_events if e not in rsvp_events]
-
-    events_list = []
-    for event in created_events:
-        events_list.append({
-            'title': event.title,
-            'start': event.event_date.isoformat(),
-            'color': '#007bff',  # blue
-            'allDay': True,
-            'url': url_for('main.dinner_event_detail', event_id=event.id)
-        })
-    for event in invited_only:
-        events_list.append({
-            'title': event.title,
-            'start': event.event_date.isoformat(),
-            'color': '#28a745',  # green
-            'allDay': True,
-            'url': url_for('main.dinner_event_detail', event_id=event.id)
-        })
-    for event in rsvp_events:
-        events_list.append({
-            'title': event.title,
-            'start': event.event_date.isoformat(),
-            'color': '#6f42c1',  # violet
-            'allDay': True,
-            'url': url_for('main.dinner_event_detail', event_id=event.id)
-        })
-    return render_template('event_calendar.html', events=events_list)
+    events_list = [{
+        'title': event.title,
+        'start': event.event_date.isoformat(),
+        'color': CALENDAR_COLORS[category],
+        'allDay': True,
+        'url': url_for('main.dinner_event_detail', event_id=event.id)
+    } for event, category in get_calendar_events(current_user)]
+    feed_token = current_user.get_calendar_token()
+    db.session.commit()
+    feed_url = url_for('main.calendar_feed', token=feed_token, _external=True)
+    return render_template('event_calendar.html', events=events_list, feed_url=feed_url)
+
+# iCalendar-Abo: wird nur neu erzeugt, wenn sich eines der Events des Users ändert
+@bp.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    user_obj = db.first_or_404(sa.select(User).where(User.calendar_token == token))
+    # Fingerabdruck aus IDs und updated_at (RSVP-Änderungen aktualisieren updated_at ebenfalls)
+    versions = db.session.execute(
+        calendar_events_query(user_obj).with_only_columns(DinnerEvent.id, DinnerEvent.updated_at)
+        .order_by(DinnerEvent.id)).all()
+    # Username (Kalendername) und Sprache stecken ebenfalls im Inhalt
+    locale = str(get_locale())
+    etag = md5(repr((user_obj.username, locale, versions)).encode('utf-8')).hexdigest()
+    # Komprimierte Antworten tragen ein schwaches ETag (app/assets.py)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        cache_key = f'calendar_feed:{user_obj.id}:{locale}:{request.host}:{etag}'
+        body = current_app.cache.get(cache_key)
+        if body is None:
+            entries = [(event, CALENDAR_CATEGORIES[category],
+                        url_for('main.dinner_event_detail', event_id=event.id, _external=True))
+                       for event, category in get_calendar_events(user_obj)]
+            body = render_calendar(_('Dinner Events of %(username)s', username=user_obj.username),
+                                   entries, request.host)
+            current_app.cache.set(cache_key, body, timeout=current_app.config['FRAGMENT_CACHE_TIMEOUT'])
+        response = make_response(body)
+        response.mimetype = 'text/calendar'
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Language')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 # Selbsterstellt
 @bp.route('/delete_message/<int:message_id>', methods=['POST'])
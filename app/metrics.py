@@ -0,0 +1,109 @@
+import os
+import time
+import sqlalchemy as sa
+from flask import current_app, g, request, Response
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                               REGISTRY, CONTENT_TYPE_LATEST, generate_latest,
+                               multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+import redis
+from app import db
+from app.replicas import replica_engines
+
+# Selbsterstellt: Prometheus-Metriken unter /metrics (Aktivierung über
+# METRICS_ENABLED, nur dann wird das Modul importiert). Mit gunicorn muss
+# PROMETHEUS_MULTIPROC_DIR gesetzt sein, damit die Werte aller Worker
+# zusammengefasst werden (siehe gunicorn.conf.py).
+
+REQUEST_LATENCY = Histogram(
+    'dbwe_http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'endpoint', 'status'])
+DB_POOL_CHECKED_OUT = Gauge(
+    'dbwe_db_pool_checked_out', 'Database connections currently checked out',
+    ['bind'], multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = Gauge(
+    'dbwe_db_pool_overflow', 'Database connections opened beyond pool_size',
+    ['bind'], multiprocess_mode='livesum')
+DB_POOL_CHECKOUTS = Counter(
+    'dbwe_db_pool_checkouts', 'Database connection checkouts', ['bind'])
+REDIS_LATENCY = Histogram(
+    'dbwe_redis_ping_duration_seconds', 'Redis round-trip time (PING)',
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1))
+
+
+class TaskQueueCollector:
+    """Reads the RQ queue state from Redis at scrape time."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        up = GaugeMetricFamily('dbwe_redis_up', 'Whether Redis answered PING')
+        depth = GaugeMetricFamily('dbwe_rq_queue_depth', 'Jobs waiting in the queue',
+                                  labels=['queue'])
+        failed = GaugeMetricFamily('dbwe_rq_failed_jobs', 'Jobs in the failed job registry',
+                                   labels=['queue'])
+        queue = self.app.task_queue
+        try:
+            start = time.perf_counter()
+            self.app.redis.ping()
+            REDIS_LATENCY.observe(time.perf_counter() - start)
+            depth.add_metric([queue.name], len(queue))
+            failed.add_metric([queue.name], queue.failed_job_registry.count)
+            up.add_metric([], 1)
+        except redis.exceptions.RedisError:
+            up.add_metric([], 0)
+        yield up
+        yield depth
+        yield failed
+
+
+def _pool_listeners(bind, pool):
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.labels(bind).inc()
+        DB_POOL_CHECKED_OUT.labels(bind).inc()
+        if hasattr(pool, 'overflow'):
+            DB_POOL_OVERFLOW.labels(bind).set(max(pool.overflow(), 0))
+
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(bind).dec()
+        if hasattr(pool, 'overflow'):
+            DB_POOL_OVERFLOW.labels(bind).set(max(pool.overflow(), 0))
+
+    sa.event.listen(pool, 'checkout', on_checkout)
+    sa.event.listen(pool, 'checkin', on_checkin)
+
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    if '_metrics_start' in g:
+        REQUEST_LATENCY.labels(request.method, request.endpoint or 'unknown',
+                               response.status_code).observe(
+            time.perf_counter() - g._metrics_start)
+    return response
+
+
+def metrics():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    scrape_registry = CollectorRegistry()
+    scrape_registry.register(TaskQueueCollector(current_app._get_current_object()))
+    return Response(generate_latest(registry) + generate_latest(scrape_registry),
+                    content_type=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    with app.app_context():
+        for bind, engine in db.engines.items():
+            _pool_listeners(bind or 'default', engine.pool)
+    for bind, engine in replica_engines(app).items():
+        _pool_listeners(bind, engine.pool)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -1,5 +1,4 @@
 from datetime import datetime, timezone, timedelta
-from hashlib import md5
 import json
 import secrets
 from time import time
@@ -10,10 +9,10 @@ from flask import current_app, url_for
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
-import redis
-import rq
 from app import db, login
-from app.search import add_to_index, remove_from_index, query_index
+from app.avatars import avatar_digest
+from app.cache import invalidate
+from app.search import add_to_index, remove_from_index, query_index, reindex as rebuild_search_index
 from sqlalchemy import Boolean
 
 # Teilweise von miguelgrinberg übernommen, eigene Anpassungen sind mit "Selbstergstellt" dokumentiert
@@ -52,10 +51,10 @@ class SearchableMixin:
                 remove_from_index(obj.__tablename__, obj)
         session._changes = None
 
+    # Selbsterstellt: neuer Index mit Bulk-Workern und Alias-Wechsel statt einzelner index()-Aufrufe
     @classmethod
-    def reindex(cls):
-        for obj in db.session.scalars(sa.select(cls)):
-            add_to_index(cls.__tablename__, obj)
+    def reindex(cls, **kwargs):
+        return rebuild_search_index(cls, **kwargs)
 
 
 db.event.listen(db.session, 'before_commit', SearchableMixin.before_commit)
@@ -63,12 +62,17 @@ db.event.listen(db.session, 'after_commit', SearchableMixin.after_commit)
 
 
 class PaginatedAPIMixin(object):
-    @staticmethod
-    def to_collection_dict(query, page, per_page, endpoint, **kwargs):
+    # Selbsterstellt: Models mit einem Batch-Serializer überschreiben to_dict_many
+    @classmethod
+    def to_dict_many(cls, items):
+        return [item.to_dict() for item in items]
+
+    @classmethod
+    def to_collection_dict(cls, query, page, per_page, endpoint, **kwargs):
         resources = db.paginate(query, page=page, per_page=per_page,
                                 error_out=False)
         data = {
-            'items': [item.to_dict() for item in resources.items],
+            'items': cls.to_dict_many(resources.items),
             '_meta': {
                 'page': page,
                 'per_page': per_page,
@@ -90,9 +94,9 @@ class PaginatedAPIMixin(object):
 followers = sa.Table(
     'followers',
     db.metadata,
-    sa.Column('follower_id', sa.Integer, sa.ForeignKey('user.id'),
+    sa.Column('follower_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'),
               primary_key=True),
-    sa.Column('followed_id', sa.Integer, sa.ForeignKey('user.id'),
+    sa.Column('followed_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'),
               primary_key=True)
 )
 
@@ -100,21 +104,21 @@ followers = sa.Table(
 dinner_event_invites = sa.Table(
     'dinner_event_invites',
     db.metadata,
-    sa.Column('dinner_event_id', sa.Integer, sa.ForeignKey('dinnerevent.id'), primary_key=True),
-    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), primary_key=True)
+    sa.Column('dinner_event_id', sa.Integer, sa.ForeignKey('dinnerevent.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
 )
 #Selbstergstellt
 dinner_event_pending = sa.Table(
     'dinner_event_pending',
     db.metadata,
-    sa.Column('dinner_event_id', sa.Integer, sa.ForeignKey('dinnerevent.id'), primary_key=True),
-    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), primary_key=True)
+    sa.Column('dinner_event_id', sa.Integer, sa.ForeignKey('dinnerevent.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
 )
 #Selbstergstellt
 class DinnerEventRsvp(db.Model):
     __tablename__ = 'dinner_event_rsvps'
-    dinner_event_id = db.Column(db.Integer, db.ForeignKey('dinnerevent.id'), primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    dinner_event_id = db.Column(db.Integer, db.ForeignKey('dinnerevent.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
     status = db.Column(sa.String(16), nullable=False, server_default='no_response')
     user = db.relationship('User', back_populates='dinner_event_rsvps')
     event = db.relationship('DinnerEvent', back_populates='rsvps')
@@ -134,19 +138,24 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
     token: so.Mapped[Optional[str]] = so.mapped_column(
         sa.String(32), index=True, unique=True)
     token_expiration: so.Mapped[Optional[datetime]]
+    calendar_token: so.Mapped[Optional[str]] = so.mapped_column(
+        sa.String(32), index=True, unique=True)
 
     following: so.WriteOnlyMapped['User'] = so.relationship(
         secondary=followers, primaryjoin=(followers.c.follower_id == id),
         secondaryjoin=(followers.c.followed_id == id),
-        back_populates='followers')
+        back_populates='followers', passive_deletes=True)
     followers: so.WriteOnlyMapped['User'] = so.relationship(
         secondary=followers, primaryjoin=(followers.c.followed_id == id),
         secondaryjoin=(followers.c.follower_id == id),
-        back_populates='following')
+        back_populates='following', passive_deletes=True)
     notifications: so.WriteOnlyMapped['Notification'] = so.relationship(
-        back_populates='user')
-    tasks: so.WriteOnlyMapped['Task'] = so.relationship(back_populates='user')
-    dinner_event_rsvps = db.relationship('DinnerEventRsvp', back_populates='user')
+        back_populates='user', passive_deletes=True)
+    tasks: so.WriteOnlyMapped['Task'] = so.relationship(back_populates='user',
+                                                        passive_deletes=True)
+    # Selbsterstellt: RSVPs, Events und Kommentare eines gelöschten Users entfernt die
+    # Datenbank (ON DELETE CASCADE), auch wenn sie in der Session geladen sind
+    dinner_event_rsvps = db.relationship('DinnerEventRsvp', back_populates='user', passive_deletes='all')
 
     def __repr__(self):
         return '<User {}>'.format(self.username)
@@ -158,8 +167,7 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def avatar(self, size):
-        digest = md5(self.email.lower().encode('utf-8')).hexdigest()
-        return f'https://www.gravatar.com/avatar/{digest}?d=identicon&s={size}'
+        return url_for('main.avatar', digest=avatar_digest(self.email), s=size)
 
     def follow(self, user):
         if not self.is_following(user):
@@ -197,15 +205,31 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
             return
         return db.session.get(User, id)
 
-    def unread_message_count(self):
+    # Erweitert: in einer Konversation gelesene Nachrichten zählen nicht
+    def unread_messages(self):
         last_read_time = self.last_message_read_time or datetime(1900, 1, 1)
-        query = sa.select(Message).where(Message.recipient == self,
-                                         Message.timestamp > last_read_time)
+        return sa.select(Message).outerjoin(ConversationRead, sa.and_(
+            ConversationRead.user_id == self.id,
+            ConversationRead.conversation_key == Message.conversation_key)).where(
+            Message.recipient_id == self.id,
+            Message.timestamp > last_read_time,
+            sa.or_(ConversationRead.last_read_at.is_(None),
+                   Message.timestamp > ConversationRead.last_read_at))
+
+    def unread_message_count(self):
         return db.session.scalar(sa.select(sa.func.count()).select_from(
-            query.subquery()))
+            self.unread_messages().subquery()))
+
+    #Selbsterstellt
+    def unread_counts_by_conversation(self, conversation_keys):
+        query = self.unread_messages().with_only_columns(
+            Message.conversation_key, sa.func.count()).where(
+            Message.conversation_key.in_(conversation_keys)).group_by(Message.conversation_key)
+        return dict(db.session.execute(query).all())
 
     def add_notification(self, name, data):
-        n = Notification(name=name, payload_json=json.dumps(data), user=self)
+        n = Notification(name=name, payload_json=json.dumps(data), user=self,
+                         event_id=data.get('event_id') if isinstance(data, dict) else None)
         db.session.add(n)
         return n
 
@@ -227,24 +251,13 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         return db.session.scalar(query)
 
     def to_dict(self, include_email=False):
-        data = {
-            'id': self.id,
-            'username': self.username,
-            'last_seen': self.last_seen.replace(
-                tzinfo=timezone.utc).isoformat(),
-            'about_me': self.about_me,
-            'follower_count': self.followers_count(),
-            'following_count': self.following_count(),
-            '_links': {
-                'self': url_for('api.get_user', id=self.id),
-                'followers': url_for('api.get_followers', id=self.id),
-                'following': url_for('api.get_following', id=self.id),
-                'avatar': self.avatar(128)
-            }
-        }
-        if include_email:
-            data['email'] = self.email
-        return data
+        from app.serializers import users_to_dicts
+        return users_to_dicts([self], include_email)[0]
+
+    @classmethod
+    def to_dict_many(cls, users, include_email=False):
+        from app.serializers import users_to_dicts
+        return users_to_dicts(users, include_email)
 
     def from_dict(self, data, new_user=False):
         for field in ['username', 'email', 'about_me']:
@@ -267,6 +280,13 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         self.token_expiration = datetime.now(timezone.utc) - timedelta(
             seconds=1)
 
+    # Selbstergstellt: geheimer Token für das iCalendar-Abo
+    def get_calendar_token(self):
+        if not self.calendar_token:
+            self.calendar_token = secrets.token_hex(16)
+            db.session.add(self)
+        return self.calendar_token
+
     @staticmethod
     def check_token(token):
         user = db.session.scalar(sa.select(User).where(User.token == token))
@@ -276,16 +296,41 @@ class User(PaginatedAPIMixin, UserMixin, db.Model):
         return user
 
 
+# Selbsterstellt: Identity-Cache, damit nicht jeder Request den User neu lädt.
+# Geheimnisse (Passwort-Hash, Tokens) werden nicht gecacht und bei Bedarf
+# nachgeladen. Änderungen am User löschen den Eintrag (siehe _invalidate_caches).
+IDENTITY_EXCLUDED = {'password_hash', 'token', 'token_expiration', 'calendar_token'}
+
+
+def _identity_key(user_id):
+    return f'identity:{user_id}'
+
+
 @login.user_loader
 def load_user(id):
-    return db.session.get(User, int(id))
+    data = current_app.identity_cache.get(_identity_key(int(id)))
+    if data is not None:
+        user = User(**data)
+        so.make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    user = db.session.get(User, int(id))
+    if user is not None:
+        current_app.identity_cache.set(
+            _identity_key(user.id),
+            {attr.key: getattr(user, attr.key) for attr in sa.inspect(User).column_attrs
+             if attr.key not in IDENTITY_EXCLUDED},
+            timeout=current_app.config['IDENTITY_CACHE_TIMEOUT'])
+    return user
 
 
 class Notification(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(128), index=True)
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id),
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='CASCADE'),
                                                index=True)
+    # Selbsterstellt: Event-Benachrichtigungen werden mit dem Event gelöscht
+    event_id: so.Mapped[Optional[int]] = so.mapped_column(
+        sa.ForeignKey('dinnerevent.id', ondelete='CASCADE'), index=True)
     timestamp: so.Mapped[float] = so.mapped_column(index=True, default=time)
     payload_json: so.Mapped[str] = so.mapped_column(sa.Text)
 
@@ -298,12 +343,14 @@ class Task(db.Model):
     id: so.Mapped[str] = so.mapped_column(sa.String(36), primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(128), index=True)
     description: so.Mapped[Optional[str]] = so.mapped_column(sa.String(128))
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id))
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id, ondelete='CASCADE'))
     complete: so.Mapped[bool] = so.mapped_column(default=False)
 
     user: so.Mapped[User] = so.relationship(back_populates='tasks')
 
     def get_rq_job(self):
+        import redis
+        import rq
         try:
             rq_job = rq.job.Job.fetch(self.id, connection=current_app.redis)
         except (redis.exceptions.RedisError, rq.exceptions.NoSuchJobError):
@@ -317,30 +364,43 @@ class Task(db.Model):
 #Selbstergstellt
 class DinnerEvent(PaginatedAPIMixin, db.Model):
     __tablename__ = 'dinnerevent'
+    archived = False  # siehe ArchivedDinnerEvent
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(sa.String(128), nullable=False)
     description = db.Column(sa.Text)
     external_event_url = db.Column(sa.String(256), nullable=False)
-    event_date = db.Column(sa.DateTime, nullable=False, server_default=sa.text('CURRENT_TIMESTAMP'))
-    creator_id = db.Column(sa.Integer, sa.ForeignKey('user.id'), nullable=False)
+    event_date = db.Column(sa.DateTime, nullable=False, index=True, server_default=sa.text('CURRENT_TIMESTAMP'))
+    creator_id = db.Column(sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     is_public = db.Column(Boolean, nullable=False, default=True, server_default=sa.true())  # NEW FIELD
+    # Für die Delta-Synchronisation der API (auch bei RSVP-, Kommentar- und Einladungsänderungen aktualisiert)
+    created_at = db.Column(sa.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc),
+                           server_default=sa.text('CURRENT_TIMESTAMP'))
+    updated_at = db.Column(sa.DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc), server_default=sa.text('CURRENT_TIMESTAMP'))
+    # Selbsterstellt: vom Purge-Job zum Löschen vorgemerkt, in keiner Abfrage mehr sichtbar
+    pending_deletion = db.Column(Boolean, nullable=False, default=False, server_default=sa.false())
     # relationships
-    creator = db.relationship('User', backref='created_dinner_events')
+    creator = db.relationship('User', backref=db.backref('created_dinner_events', passive_deletes='all'))
     invited = db.relationship(
         'User',
         secondary=dinner_event_invites,
         primaryjoin="dinner_event_invites.c.dinner_event_id == DinnerEvent.id",
         secondaryjoin="dinner_event_invites.c.user_id == User.id",
-        backref='invited_dinner_events'
+        backref=db.backref('invited_dinner_events', passive_deletes=True),
+        passive_deletes=True
     )
     # NEW: pending opt-ins relationship for public events
     pending_opt_ins = db.relationship(
         'User',
         secondary=dinner_event_pending,
-        backref='pending_dinner_events'
+        backref=db.backref('pending_dinner_events', passive_deletes=True),
+        passive_deletes=True
     )
-    rsvps = db.relationship('DinnerEventRsvp', back_populates='event', cascade='all, delete-orphan')  # Add cascade delete
-    comments = db.relationship('Comment', back_populates='event', cascade='all, delete-orphan')
+    # Gelöscht wird per ON DELETE CASCADE in der Datenbank, ohne die Zeilen zu laden
+    rsvps = db.relationship('DinnerEventRsvp', back_populates='event', cascade='all, delete-orphan',
+                            passive_deletes=True)
+    comments = db.relationship('Comment', back_populates='event', cascade='all, delete-orphan',
+                               passive_deletes=True)
 
     def invite_user(self, user):
         if user not in self.invited:
@@ -364,20 +424,59 @@ class DinnerEvent(PaginatedAPIMixin, db.Model):
             self.rsvps.append(new_rsvp)
     # Erweiterung für  RESTful API  Dinner Events
     def to_dict(self):
+        from app.serializers import dinner_events_to_dicts
+        return dinner_events_to_dicts([self])[0]
+
+    @classmethod
+    def to_dict_many(cls, events):
+        from app.serializers import dinner_events_to_dicts
+        return dinner_events_to_dicts(events)
+
+    #Selbsterstellt
+    def invited_user_ids(self, exclude=None):
+        """IDs der Eingeladenen, ohne die User-Objekte zu laden."""
+        query = sa.select(dinner_event_invites.c.user_id).where(
+            dinner_event_invites.c.dinner_event_id == self.id)
+        if exclude is not None:
+            query = query.where(dinner_event_invites.c.user_id != exclude)
+        return db.session.scalars(query).all()
+
+    #Selbsterstellt
+    def is_visible_to(self, user):
+        """Öffentlich, selbst erstellt oder eingeladen; ohne die Gästeliste zu laden."""
+        if self.is_public or self.creator_id == user.id:
+            return True
+        return db.session.scalar(sa.select(dinner_event_invites.c.user_id).where(
+            dinner_event_invites.c.dinner_event_id == self.id,
+            dinner_event_invites.c.user_id == user.id)) is not None
+
+    #Selbsterstellt
+    def comment_page(self, before=None, limit=20):
+        """Die neuesten `limit` Kommentare mit einer ID kleiner als `before`.
+
+        Gibt (Kommentare, neueste zuerst; ob es ältere gibt) zurück.
+        """
+        query = sa.select(Comment).options(so.joinedload(Comment.user)).where(
+            Comment.event_id == self.id)
+        if before is not None:
+            query = query.where(Comment.id < before)
+        comments = db.session.scalars(query.order_by(Comment.id.desc()).limit(limit + 1)).all()
+        return comments[:limit], len(comments) > limit
+
+    #Selbsterstellt
+    def comments_to_dict(self, before, limit, endpoint, **kwargs):
+        comments, has_more = self.comment_page(before, limit)
+        next_before = comments[-1].id if has_more else None
         return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'external_event_url': self.external_event_url,
-            'event_date': self.event_date.isoformat(),
-            'creator_id': self.creator_id,
-            'is_public': self.is_public,
-            'invited': [user.id for user in self.invited],
-            'pending_opt_ins': [user.id for user in self.pending_opt_ins],
-            'rsvps': [{'user_id': rsvp.user_id, 'status': rsvp.status} for rsvp in self.rsvps],
-            'comments': [{'id': comment.id, 'body': comment.body, 'timestamp': comment.timestamp.isoformat(), 'user_id': comment.user_id} for comment in self.comments]
+            'items': [comment.to_dict() for comment in comments],
+            '_meta': {'limit': limit, 'next_before': next_before},
+            '_links': {
+                'self': url_for(endpoint, before=before, limit=limit, **kwargs),
+                'next': url_for(endpoint, before=next_before, limit=limit,
+                                **kwargs) if has_more else None
+            }
         }
-    
+
     def from_dict(self, data, new_event=False):
         """Setzt Event-Daten aus einem Dictionary (z. B. aus einem API-Request)."""
         for field in ['title', 'description', 'external_event_url', 'event_date', 'is_public']:
@@ -395,28 +494,276 @@ class DinnerEvent(PaginatedAPIMixin, db.Model):
                 if user:
                     self.invite_user(user)
 
+#Selbstergstellt: Markierung gelöschter Events für die Delta-Synchronisation. Ein Tombstone
+# ohne user_id gilt für alle, sonst nur für diesen User (private Events, Ausladungen),
+# damit die IDs privater Events nicht an Unbeteiligte gehen.
+class DinnerEventTombstone(db.Model):
+    __tablename__ = 'dinner_event_tombstones'
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), index=True)
+    deleted_at = db.Column(sa.DateTime, nullable=False, index=True, default=lambda: datetime.now(timezone.utc))
+
+    @staticmethod
+    def add_for_events(session, event_ids, deleted_at):
+        """Writes the tombstones of events that are about to disappear: one for
+        everyone if an event is public, otherwise one for the creator and each guest."""
+        if not event_ids:
+            return
+        events = session.execute(
+            sa.select(DinnerEvent.id, DinnerEvent.is_public, DinnerEvent.creator_id)
+              .where(DinnerEvent.id.in_(event_ids))
+              .execution_options(include_pending_deletion=True)).all()
+        private = [event_id for event_id, is_public, _ in events if not is_public]
+        rows = [{'event_id': event_id, 'user_id': None if is_public else creator_id,
+                 'deleted_at': deleted_at} for event_id, is_public, creator_id in events]
+        if private:
+            rows += [{'event_id': event_id, 'user_id': user_id, 'deleted_at': deleted_at}
+                     for event_id, user_id in session.execute(
+                         sa.select(dinner_event_invites.c.dinner_event_id, dinner_event_invites.c.user_id)
+                           .where(dinner_event_invites.c.dinner_event_id.in_(private)))]
+        # Core-Insert: ein Statement für alle Zeilen, auch innerhalb von before_flush
+        session.execute(sa.insert(DinnerEventTombstone.__table__), rows)
+
+
+#Selbsterstellt: verschickte Erinnerungen, damit jeder Gast pro Event nur eine erhält
+class EventReminder(db.Model):
+    __tablename__ = 'event_reminders'
+    event_id = db.Column(db.Integer, db.ForeignKey('dinnerevent.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    sent_at = db.Column(sa.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+#Selbsterstellt: Archiv für vergangene Events (siehe app/archive.py). Die Tabellen
+# entsprechen den aktiven Tabellen, werden aber nur für Verlaufsansichten gelesen.
+class ArchivedDinnerEvent(db.Model):
+    __tablename__ = 'archived_dinner_events'
+    archived = True
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(sa.String(128), nullable=False)
+    description = db.Column(sa.Text)
+    external_event_url = db.Column(sa.String(256), nullable=False)
+    event_date = db.Column(sa.DateTime, nullable=False, index=True)
+    creator_id = db.Column(sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    is_public = db.Column(Boolean, nullable=False)
+    created_at = db.Column(sa.DateTime, nullable=False)
+    updated_at = db.Column(sa.DateTime, nullable=False)
+    archived_at = db.Column(sa.DateTime, nullable=False)
+    creator = db.relationship('User')
+
+
+archived_dinner_event_invites = sa.Table(
+    'archived_dinner_event_invites',
+    db.metadata,
+    sa.Column('dinner_event_id', sa.Integer, sa.ForeignKey('archived_dinner_events.id', ondelete='CASCADE'),
+              primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+archived_dinner_event_rsvps = sa.Table(
+    'archived_dinner_event_rsvps',
+    db.metadata,
+    sa.Column('dinner_event_id', sa.Integer, sa.ForeignKey('archived_dinner_events.id', ondelete='CASCADE'),
+              primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('status', sa.String(16), nullable=False)
+)
+
+archived_comments = sa.Table(
+    'archived_comments',
+    db.metadata,
+    sa.Column('id', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('body', sa.Text, nullable=False),
+    sa.Column('timestamp', sa.DateTime),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), nullable=False),
+    sa.Column('event_id', sa.Integer, sa.ForeignKey('archived_dinner_events.id', ondelete='CASCADE'),
+              nullable=False, index=True)
+)
+
 # Angepassung für Dinner Events
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text, nullable=False)
     timestamp = db.Column(sa.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
-    user_id = db.Column(db.Integer, sa.ForeignKey('user.id'), nullable=False)
-    event_id = db.Column(db.Integer, sa.ForeignKey('dinnerevent.id'), nullable=False)
-    user = db.relationship('User', backref='comments')
+    user_id = db.Column(db.Integer, sa.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    event_id = db.Column(db.Integer, sa.ForeignKey('dinnerevent.id', ondelete='CASCADE'), nullable=False, index=True)
+    user = db.relationship('User', backref=db.backref('comments', passive_deletes='all'))
     event = db.relationship('DinnerEvent', back_populates='comments')
 
+    def to_dict(self):
+        from app.serializers import comment_to_dict
+        return comment_to_dict(self)
+
     def __repr__(self):
         return f'<Comment {self.body[:20]}>'
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
-    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    # Nachrichten bleiben für die andere Seite erhalten, wenn ein User gelöscht wird
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), index=True)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), index=True)
     body = db.Column(db.String(500))
     timestamp = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc))
+    # Selbsterstellt: beide User-IDs sortiert ("3:7"), wird beim Einfügen gesetzt
+    conversation_key = db.Column(sa.String(32))
     # Relationships (adjust backrefs as needed)
-    author = db.relationship('User', foreign_keys=[sender_id], backref='messages_sent')
-    recipient = db.relationship('User', foreign_keys=[recipient_id], backref='messages_received')
-    
+    author = db.relationship('User', foreign_keys=[sender_id],
+                             backref=db.backref('messages_sent', passive_deletes=True))
+    recipient = db.relationship('User', foreign_keys=[recipient_id],
+                                backref=db.backref('messages_received', passive_deletes=True))
+
+    __table_args__ = (
+        sa.Index('ix_message_conversation_timestamp', 'conversation_key', 'timestamp', 'id'),
+    )
+
+    @staticmethod
+    def make_conversation_key(user_id, other_user_id):
+        return '{}:{}'.format(*sorted((user_id, other_user_id)))
+
+    def to_dict(self):
+        from app.serializers import MESSAGE_FIELDS
+        return MESSAGE_FIELDS(self)
+
     def __repr__(self):
         return f'<Message {self.body[:20]}>'
+
+
+@sa.event.listens_for(Message, 'before_insert')
+def _set_conversation_key(mapper, connection, target):
+    target.conversation_key = Message.make_conversation_key(target.sender_id, target.recipient_id)
+
+
+#Selbsterstellt: bis wann ein User eine Konversation gelesen hat
+class ConversationRead(db.Model):
+    __tablename__ = 'conversation_reads'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    conversation_key = db.Column(sa.String(32), primary_key=True)
+    last_read_at = db.Column(sa.DateTime, nullable=False)
+
+
+#Selbstergstellt: updated_at der Events nachführen und gelöschte Events protokollieren
+def _track_dinner_event_changes(session, flush_context, instances):
+    now = datetime.now(timezone.utc)
+    touched = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (DinnerEventRsvp, Comment)):
+            event = obj.event
+            if event is None:
+                event_id = obj.dinner_event_id if isinstance(obj, DinnerEventRsvp) else obj.event_id
+                event = session.get(DinnerEvent, event_id) if event_id else None
+            touched.add(event)
+        elif isinstance(obj, DinnerEvent) and obj in session.dirty and session.is_modified(obj):
+            touched.add(obj)
+    for event in touched:
+        if event is not None and event not in session.deleted:
+            event.updated_at = now
+    # Events, die ein User nicht mehr sehen darf: privat geworden oder ausgeladen
+    for obj in session.dirty:
+        if isinstance(obj, DinnerEvent) and obj not in session.deleted:
+            state = sa.inspect(obj)
+            if True in (state.attrs.is_public.history.deleted or ()) and not obj.is_public:
+                session.add(DinnerEventTombstone(event_id=obj.id, deleted_at=now))
+            for user in state.attrs.invited.history.deleted or ():
+                session.add(DinnerEventTombstone(event_id=obj.id, user_id=user.id, deleted_at=now))
+    # Vorgemerkte Events haben ihre Tombstones schon beim Vormerken erhalten
+    deleted = [obj.id for obj in session.deleted
+               if isinstance(obj, DinnerEvent) and not obj.pending_deletion]
+    DinnerEventTombstone.add_for_events(session, deleted, now)
+
+
+db.event.listen(db.session, 'before_flush', _track_dinner_event_changes)
+
+
+#Selbsterstellt: zum Löschen vorgemerkte Events (siehe app/purge.py) aus allen ORM-Abfragen
+# ausblenden, damit sie weder angezeigt noch bearbeitet werden können. Der Purge-Job
+# liest sie mit execution_options(include_pending_deletion=True).
+def _hide_pending_deletion(execute_state):
+    if execute_state.is_select and not execute_state.is_column_load \
+            and not execute_state.is_relationship_load \
+            and not execute_state.execution_options.get('include_pending_deletion', False):
+        execute_state.statement = execute_state.statement.options(so.with_loader_criteria(
+            DinnerEvent, lambda cls: cls.pending_deletion == False, include_aliases=True))
+
+
+db.event.listen(db.session, 'do_orm_execute', _hide_pending_deletion)
+
+
+#Selbstergstellt: Cache-Invalidierung bei Änderungen an Events, RSVPs, Kommentaren und Usern
+# sowie Fan-out neuer öffentlicher Events in die Feeds (app/feed.py) und Nachführen
+# des Autocomplete-Index (app/autocomplete.py)
+def _collect_cache_changes(session, flush_context):
+    changes = session.info.setdefault('cache_changes', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, DinnerEvent):
+            changes.add(f'dinner_event:{obj.id}')
+            history = sa.inspect(obj).attrs.is_public.history
+            if obj.is_public or True in (history.deleted or ()):
+                changes.add('explore')
+        elif isinstance(obj, DinnerEventRsvp):
+            changes.add(f'dinner_event:{obj.dinner_event_id}')
+        elif isinstance(obj, Comment):
+            changes.add(f'dinner_event:{obj.event_id}')
+        elif isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault('identity_changes', set()).add(obj.id)
+    # Neu veröffentlichte Events für die Feeds der Follower vormerken
+    published = [obj for obj in list(session.new) + list(session.dirty)
+                 if isinstance(obj, DinnerEvent) and obj.is_public and
+                 (obj in session.new or True in (sa.inspect(obj).attrs.is_public.history.added or ()))]
+    if published:
+        # Eine Abfrage für die Follower aller Ersteller dieses Flushs
+        follower_ids = {}
+        for creator_id, follower_id in session.execute(
+                sa.select(followers.c.followed_id, followers.c.follower_id).where(
+                    followers.c.followed_id.in_({obj.creator_id for obj in published}))):
+            follower_ids.setdefault(creator_id, []).append(follower_id)
+        session.info.setdefault('feed_pushes', []).extend(
+            (obj.id, follower_ids[obj.creator_id]) for obj in published
+            if obj.creator_id in follower_ids)
+    # Neue, umbenannte und gelöschte User für die Autovervollständigung vormerken
+    renamed = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            history = sa.inspect(obj).attrs.username.history
+            if obj in session.new:
+                change = (obj.id, None, obj.username)
+            elif obj in session.deleted:
+                change = (obj.id, (history.deleted or [obj.username])[0], None)
+            elif history.deleted:
+                change = (obj.id, history.deleted[0], obj.username)
+                renamed.append(obj.id)
+            else:
+                continue
+            session.info.setdefault('autocomplete_changes', []).append(change)
+    # Gästeliste und Kommentare der Eventseite zeigen Usernamen
+    if renamed:
+        changes.update(f'dinner_event:{event_id}' for event_id in session.scalars(sa.union(
+            sa.select(dinner_event_invites.c.dinner_event_id).where(
+                dinner_event_invites.c.user_id.in_(renamed)),
+            sa.select(Comment.event_id).where(Comment.user_id.in_(renamed)))))
+
+
+def _invalidate_caches(session):
+    for name in session.info.pop('cache_changes', ()):
+        invalidate(name)
+    user_ids = session.info.pop('identity_changes', ())
+    if user_ids:
+        current_app.identity_cache.delete(*[_identity_key(user_id) for user_id in user_ids])
+    pushes = session.info.pop('feed_pushes', None)
+    if pushes:
+        from app.feed import push_events
+        push_events(pushes)
+    changes = session.info.pop('autocomplete_changes', None)
+    if changes:
+        from app.autocomplete import update_index
+        update_index(changes)
+
+
+def _discard_cache_changes(session):
+    session.info.pop('cache_changes', None)
+    session.info.pop('identity_changes', None)
+    session.info.pop('feed_pushes', None)
+    session.info.pop('autocomplete_changes', None)
+
+
+db.event.listen(db.session, 'after_flush', _collect_cache_changes)
+db.event.listen(db.session, 'after_commit', _invalidate_caches)
+db.event.listen(db.session, 'after_rollback', _discard_cache_changes)
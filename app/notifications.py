@@ -0,0 +1,81 @@
+import json
+from time import time
+import sqlalchemy as sa
+from flask import current_app
+from redis.exceptions import RedisError
+from app import db
+from app.models import Notification
+
+# Selbsterstellt: Benachrichtigungen an viele User auf einmal. Statt einer
+# ORM-Instanz pro User wird mit einem Bulk-Insert geschrieben. Ab
+# NOTIFICATION_ASYNC_THRESHOLD Empfängern übernimmt ein RQ-Job das Schreiben
+# (nach dem Commit, damit abgebrochene Requests nichts verschicken); ist die
+# Queue nicht erreichbar, wird direkt geschrieben. Mit NOTIFICATION_CHANNEL
+# wird jede Auslieferung zusätzlich per Redis Pub/Sub veröffentlicht.
+
+
+def _rows(user_ids, name, data, timestamp):
+    payload_json = json.dumps(data)
+    return [{'user_id': user_id, 'name': name, 'timestamp': timestamp,
+             'event_id': data.get('event_id'), 'payload_json': payload_json}
+            for user_id in user_ids]
+
+
+def insert_notifications(connection, user_ids, name, data, timestamp=None):
+    """Schreibt die Benachrichtigungen in Blöcken von NOTIFICATION_CHUNK_SIZE."""
+    timestamp = timestamp or time()
+    chunk_size = current_app.config['NOTIFICATION_CHUNK_SIZE']
+    for start in range(0, len(user_ids), chunk_size):
+        connection.execute(sa.insert(Notification),
+                           _rows(user_ids[start:start + chunk_size], name, data, timestamp))
+
+
+def publish(user_ids, name, data):
+    channel = current_app.config['NOTIFICATION_CHANNEL']
+    if not channel or not user_ids:
+        return
+    try:
+        current_app.redis.publish(channel, json.dumps(
+            {'user_ids': list(user_ids), 'name': name, 'data': data}))
+    except RedisError as e:
+        current_app.logger.warning('Publishing notifications failed: %s', e)
+
+
+def notify_users(user_ids, name, data, sync=False):
+    """Notifies all user_ids with one notification name/data.
+
+    Small batches are inserted in the current transaction, larger ones are
+    handed to the task queue once the transaction commits."""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    session = db.session()
+    if sync or len(user_ids) < current_app.config['NOTIFICATION_ASYNC_THRESHOLD']:
+        insert_notifications(session, user_ids, name, data)
+        session.info.setdefault('notification_publish', []).append((user_ids, name, data))
+    else:
+        session.info.setdefault('notification_jobs', []).append((user_ids, name, data))
+
+
+def _deliver(session):
+    for user_ids, name, data in session.info.pop('notification_publish', ()):
+        publish(user_ids, name, data)
+    for user_ids, name, data in session.info.pop('notification_jobs', ()):
+        try:
+            current_app.task_queue.enqueue('app.tasks.send_notifications',
+                                           user_ids, name, data)
+        except RedisError as e:
+            current_app.logger.warning('Queueing notifications failed, sending inline: %s', e)
+            # Die Session ist bereits committed, daher eigene Transaktion
+            with db.engine.begin() as connection:
+                insert_notifications(connection, user_ids, name, data)
+            publish(user_ids, name, data)
+
+
+def _discard(session):
+    session.info.pop('notification_publish', None)
+    session.info.pop('notification_jobs', None)
+
+
+db.event.listen(db.session, 'after_commit', _deliver)
+db.event.listen(db.session, 'after_rollback', _discard)
@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+import sqlalchemy as sa
+from flask import current_app
+from redis.exceptions import RedisError
+from app import db
+from app.feed import delete_feed
+from app.models import DinnerEvent, DinnerEventRsvp, DinnerEventTombstone, Comment, \
+    dinner_event_invites, dinner_event_pending
+
+# Selbsterstellt: Löschen von Events. Abhängige Zeilen (Einladungen, RSVPs,
+# Kommentare, Benachrichtigungen ...) löscht die Datenbank per ON DELETE
+# CASCADE, das ORM lädt sie nicht mehr. Events mit sehr vielen Kommentaren
+# werden von einem RQ-Job in kleinen Transaktionen abgebaut, damit weder der
+# Request noch eine lange Transaktion die Tabellen blockiert.
+# Beim Löschen eines Users entfernt die Datenbank auch seine Events; die
+# Tombstones und die Cache-Invalidierung dafür schreibt delete_user().
+
+
+def delete_dinner_event(event):
+    """Deletes the event and commits. Returns False if the deletion was
+    handed to the background purge instead; the event is hidden and no
+    longer writable until the purge has run."""
+    comments = db.session.scalar(sa.select(sa.func.count(Comment.id)).where(
+        Comment.event_id == event.id))
+    if comments >= current_app.config['EVENT_PURGE_THRESHOLD']:
+        event.pending_deletion = True
+        # Für die Delta-Synchronisation gilt das Event ab jetzt als gelöscht
+        DinnerEventTombstone.add_for_events(db.session, [event.id], datetime.now(timezone.utc))
+        db.session.commit()
+        try:
+            current_app.task_queue.enqueue('app.tasks.purge_dinner_event', event.id)
+            return False
+        except RedisError as e:
+            current_app.logger.warning('Queueing the purge failed, deleting inline: %s', e)
+    db.session.delete(event)
+    db.session.commit()
+    return True
+
+
+def purge_dinner_event(event_id, batch_size=None):
+    """Deletes the comments of an event in batches, then the event itself."""
+    batch_size = batch_size or current_app.config['EVENT_PURGE_BATCH_SIZE']
+    while True:
+        comment_ids = db.session.scalars(sa.select(Comment.id).where(
+            Comment.event_id == event_id).limit(batch_size)).all()
+        if not comment_ids:
+            break
+        db.session.execute(sa.delete(Comment).where(Comment.id.in_(comment_ids)))
+        db.session.commit()
+    event = db.session.get(DinnerEvent, event_id,
+                           execution_options={'include_pending_deletion': True})
+    if event is not None:
+        db.session.delete(event)
+        db.session.commit()
+
+
+def delete_user(user):
+    """Deletes the user and commits. The database removes their events,
+    follows, invites, RSVPs and comments; this writes the tombstones of their
+    events, marks the events they took part in as changed and invalidates
+    the caches of all of them."""
+    user_id = user.id
+    now = datetime.now(timezone.utc)
+    own = set(db.session.scalars(sa.select(DinnerEvent.id).where(DinnerEvent.creator_id == user_id)))
+    joined = set(db.session.scalars(sa.union(
+        sa.select(dinner_event_invites.c.dinner_event_id).where(dinner_event_invites.c.user_id == user_id),
+        sa.select(dinner_event_pending.c.dinner_event_id).where(dinner_event_pending.c.user_id == user_id),
+        sa.select(DinnerEventRsvp.dinner_event_id).where(DinnerEventRsvp.user_id == user_id),
+        sa.select(Comment.event_id).where(Comment.user_id == user_id)))) - own
+    DinnerEventTombstone.add_for_events(db.session, own, now)
+    if joined:
+        # Gästeliste, RSVPs oder Kommentare dieser Events ändern sich (Delta-Sync)
+        db.session.execute(sa.update(DinnerEvent).where(DinnerEvent.id.in_(joined))
+                           .values(updated_at=now))
+    changes = db.session.info.setdefault('cache_changes', set())
+    changes.update(f'dinner_event:{event_id}' for event_id in own | joined)
+    if own:
+        changes.add('explore')
+    db.session.delete(user)
+    db.session.commit()
+    # Events in den Feeds der Follower entfernt get_feed() beim Lesen
+    delete_feed(user_id)
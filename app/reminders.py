@@ -0,0 +1,83 @@
+import json
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from time import time
+import sqlalchemy as sa
+from flask import current_app, render_template
+from flask_mail import Message as MailMessage
+from app import db, mail
+from app.models import User, DinnerEvent, DinnerEventRsvp, EventReminder, Notification
+from app.notifications import publish
+
+# Selbsterstellt: Erinnerungen an bevorstehende Events. Eine Abfrage über den
+# Index auf event_date liefert alle zugesagten Gäste der Events in den nächsten
+# REMINDER_HOURS Stunden, die noch keine Erinnerung erhalten haben. Pro Block
+# von REMINDER_BATCH_SIZE Gästen werden die Erinnerungen vermerkt und die
+# Benachrichtigungen mit je einem Insert geschrieben, danach die E-Mails über
+# eine einzige SMTP-Verbindung verschickt. Ohne Request gibt es keine
+# Sprachauswahl, die Texte sind daher wie bei den Export-Mails englisch.
+
+
+def _due_reminders(now, hours):
+    return sa.select(
+        DinnerEvent.id, DinnerEvent.title, DinnerEvent.event_date,
+        User.id, User.username, User.email
+    ).join(DinnerEventRsvp, DinnerEventRsvp.dinner_event_id == DinnerEvent.id).join(
+        User, User.id == DinnerEventRsvp.user_id
+    ).outerjoin(EventReminder, sa.and_(
+        EventReminder.event_id == DinnerEvent.id, EventReminder.user_id == User.id)
+    ).where(
+        DinnerEvent.event_date >= now,
+        DinnerEvent.event_date < now + timedelta(hours=hours),
+        DinnerEventRsvp.status == 'accepted',
+        EventReminder.event_id.is_(None)
+    ).order_by(DinnerEvent.id, User.id)
+
+
+def _emails(rows):
+    sender = current_app.config['ADMINS'][0]
+    for event_id, title, event_date, user_id, username, email in rows:
+        if not email:
+            continue
+        msg = MailMessage(f'Reminder: {title}',
+                          sender=sender, recipients=[email])
+        msg.body = render_template('email/dinner_event_reminder.txt', username=username,
+                                   title=title, event_date=event_date)
+        msg.html = render_template('email/dinner_event_reminder.html', username=username,
+                                   title=title, event_date=event_date)
+        yield msg
+
+
+def _send_batch(rows, send_emails):
+    now = datetime.now(timezone.utc)
+    timestamp = time()
+    # Zuerst vermerken: eine abgebrochene Auslieferung wird nicht wiederholt
+    db.session.execute(sa.insert(EventReminder), [
+        {'event_id': row[0], 'user_id': row[3], 'sent_at': now} for row in rows])
+    db.session.execute(sa.insert(Notification), [
+        {'user_id': row[3], 'name': 'dinner_event_reminder', 'timestamp': timestamp,
+         'event_id': row[0],
+         'payload_json': json.dumps({
+             'message': f"Reminder: {row[1]} starts at {row[2].strftime('%Y-%m-%d %H:%M')}",
+             'event_id': row[0]})}
+        for row in rows])
+    db.session.commit()
+    for (event_id, title, event_date), group in groupby(rows, key=lambda row: row[:3]):
+        publish([row[3] for row in group], 'dinner_event_reminder', {'event_id': event_id})
+    if send_emails:
+        with mail.connect() as connection:
+            for msg in _emails(rows):
+                connection.send(msg)
+
+
+def send_reminders(hours=None, batch_size=None, now=None):
+    """Sends the reminders that are due and returns how many were sent."""
+    hours = hours or current_app.config['REMINDER_HOURS']
+    batch_size = batch_size or current_app.config['REMINDER_BATCH_SIZE']
+    # event_date wird wie in den Views als lokale Zeit ohne Zeitzone gespeichert
+    now = now or datetime.now()
+    send_emails = bool(current_app.config['MAIL_SERVER'])
+    rows = db.session.execute(_due_reminders(now, hours)).all()
+    for start in range(0, len(rows), batch_size):
+        _send_batch(rows[start:start + batch_size], send_emails)
+    return len(rows)
@@ -0,0 +1,85 @@
+import random
+import time
+import sqlalchemy as sa
+from flask import g, request, session, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+
+# Selbsterstellt: Lesezugriffe von GET-Requests auf Read-Replicas verteilen.
+# Sobald im Request geschrieben wird, laufen alle weiteren Abfragen über den
+# Primary (read-after-write). Nach einem Schreibzugriff bleibt der Browser für
+# REPLICA_STICKY_SECONDS auf dem Primary, damit Redirects nach POST keine
+# veralteten Daten vom Replica sehen.
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_engines(app=None):
+    """Replica engines by name; they are not Flask-SQLAlchemy binds, so
+    db.create_all() and migrations never touch them."""
+    return (app or current_app).extensions.get('db_replicas', {})
+
+
+def _use_replica(clause):
+    if not has_request_context() or g.get('_db_replica') is None:
+        return False
+    if g.get('_db_wrote'):
+        return False
+    if clause is not None and getattr(clause, 'is_dml', False):
+        g._db_wrote = True
+        return False
+    return True
+
+
+class RoutingSession(Session):
+    """Session that sends reads of read-only requests to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is None and not self._flushing and engine is self._db.engines.get(None) \
+                and _use_replica(clause):
+            return replica_engines()[g._db_replica]
+        return engine
+
+
+@sa.event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    if has_request_context():
+        g._db_wrote = True
+
+
+def read_engine():
+    """Engine for reads outside the session, e.g. streamed exports."""
+    from app import db
+    if _use_replica(None):
+        return replica_engines()[g._db_replica]
+    return db.engine
+
+
+def _choose_replica():
+    keys = list(replica_engines())
+    if keys and request.method in READ_ONLY_METHODS and \
+            session.get('_db_primary_until', 0) < time.time():
+        g._db_replica = random.choice(keys)
+
+
+def _remember_write(response):
+    sticky = current_app.config['REPLICA_STICKY_SECONDS']
+    if g.get('_db_wrote') and sticky:
+        session['_db_primary_until'] = time.time() + sticky
+    return response
+
+
+def init_app(app):
+    uris = app.config['SQLALCHEMY_REPLICA_URIS']
+    if not uris:
+        return
+    engines = {}
+    for i, uri in enumerate(uris):
+        options = dict(app.config['SQLALCHEMY_REPLICA_ENGINE_OPTIONS'])
+        if uri.startswith('mysql'):
+            # Wie Flask-SQLAlchemy für den Primary
+            options.setdefault('pool_recycle', 7200)
+        engines[f'replica_{i}'] = sa.create_engine(uri, **options)
+    app.extensions['db_replicas'] = engines
+    app.before_request(_choose_replica)
+    app.after_request(_remember_write)
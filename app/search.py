@@ -1,4 +1,28 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import sqlalchemy as sa
 from flask import current_app
+from redis.exceptions import RedisError
+
+# Selbsterstellt: Der Index eines Models ist ein Alias (__tablename__) auf einen
+# versionierten Index. reindex() baut einen neuen Index parallel auf und
+# schwenkt den Alias danach atomar um; solange er aufgebaut wird, schreiben
+# add_to_index/remove_from_index zusätzlich in den neuen Index (Redis-Key
+# search:building:<alias>), damit keine Änderungen verloren gehen. Der Key
+# läuft nach SEARCH_BUILDING_TTL Sekunden ohne Fortschritt ab, ein
+# abgebrochener Aufbau hinterlässt so keine dauerhaften Doppel-Schreibzugriffe.
+
+
+def _building_key(index):
+    return f'search:building:{index}'
+
+
+def _target_indexes(index):
+    try:
+        building = current_app.redis.get(_building_key(index))
+    except RedisError:
+        building = None
+    return [index, building.decode()] if building else [index]
 
 
 def add_to_index(index, model):
@@ -7,13 +31,16 @@ def add_to_index(index, model):
     payload = {}
     for field in model.__searchable__:
         payload[field] = getattr(model, field)
-    current_app.elasticsearch.index(index=index, id=model.id, document=payload)
+    for target in _target_indexes(index):
+        current_app.elasticsearch.index(index=target, id=model.id, document=payload)
 
 
 def remove_from_index(index, model):
     if not current_app.elasticsearch:
         return
-    current_app.elasticsearch.delete(index=index, id=model.id)
+    for target in _target_indexes(index):
+        # Im neu aufgebauten Index kann das Dokument noch fehlen
+        current_app.elasticsearch.options(ignore_status=404).delete(index=target, id=model.id)
 
 
 def query_index(index, query, page, per_page):
@@ -26,3 +53,80 @@ def query_index(index, query, page, per_page):
         size=per_page)
     ids = [int(hit['_id']) for hit in search['hits']['hits']]
     return ids, search['hits']['total']['value']
+
+
+def id_ranges(low, high, size):
+    """Teilt die IDs low..high in Bereiche [start, end) mit je size IDs."""
+    return [(start, min(start + size, high + 1)) for start in range(low, high + 1, size)]
+
+
+def _index_range(app, cls, index, start, end):
+    """Worker: indexiert die Zeilen mit start <= id < end per Bulk-Request."""
+    from app import db
+    with app.app_context():
+        columns = [getattr(cls, field) for field in cls.__searchable__]
+        rows = db.session.execute(sa.select(cls.id, *columns).where(
+            cls.id >= start, cls.id < end)).all()
+        db.session.remove()
+    if not rows:
+        return 0
+    operations = []
+    for row in rows:
+        # create statt index: neuere Dokumente aus add_to_index nicht überschreiben
+        operations.append({'create': {'_index': index, '_id': row[0]}})
+        operations.append(dict(zip(cls.__searchable__, row[1:])))
+    response = app.elasticsearch.bulk(operations=operations)
+    if response['errors'] and any(item['create'].get('status') != 409 and 'error' in item['create']
+                                  for item in response['items']):
+        raise RuntimeError(f'bulk indexing of ids {start}-{end - 1} into {index} failed')
+    return len(rows)
+
+
+def reindex(cls, workers=4, chunk_size=1000, keep_old=False, progress=None):
+    """Builds a new versioned index for cls with parallel bulk workers and
+    atomically points the alias at it. Returns (new index, documents)."""
+    from app import db
+    app = current_app._get_current_object()
+    es = app.elasticsearch
+    alias = cls.__tablename__
+    new_index = f'{alias}-{time.strftime("%Y%m%d%H%M%S")}'
+    # Ohne Refresh und Replicas ist der Aufbau deutlich schneller
+    es.indices.create(index=new_index, settings={'refresh_interval': '-1',
+                                                 'number_of_replicas': 0})
+    ttl = app.config['SEARCH_BUILDING_TTL']
+    app.redis.set(_building_key(alias), new_index, ex=ttl)
+    try:
+        low, high = db.session.execute(sa.select(sa.func.min(cls.id), sa.func.max(cls.id))).one()
+        db.session.commit()
+        done = 0
+        start = time.perf_counter()
+        if low is not None:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_index_range, app, cls, new_index, range_start, range_end)
+                           for range_start, range_end in id_ranges(low, high, chunk_size)]
+                for future in as_completed(futures):
+                    done += future.result()
+                    app.redis.expire(_building_key(alias), ttl)
+                    if progress:
+                        progress(done, done / (time.perf_counter() - start))
+        es.indices.put_settings(index=new_index, settings={'refresh_interval': None,
+                                                            'number_of_replicas': None})
+        es.indices.refresh(index=new_index)
+
+        # Alias atomar umschwenken; ein alter Index direkt unter dem Alias-Namen wird ersetzt
+        old_indexes = list(es.indices.get_alias(name=alias)) \
+            if es.indices.exists_alias(name=alias) else []
+        actions = [{'remove': {'index': old, 'alias': alias}} for old in old_indexes]
+        if not old_indexes and es.indices.exists(index=alias):
+            actions.append({'remove_index': {'index': alias}})
+        actions.append({'add': {'index': new_index, 'alias': alias}})
+        es.indices.update_aliases(actions=actions)
+    except Exception:
+        es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise
+    finally:
+        app.redis.delete(_building_key(alias))
+    if not keep_old:
+        for old in old_indexes:
+            es.indices.delete(index=old, ignore_unavailable=True)
+    return new_index, done
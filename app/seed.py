@@ -0,0 +1,214 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+import sqlalchemy as sa
+from werkzeug.security import generate_password_hash
+from app import db
+from app.cache import invalidate
+from app.models import User, DinnerEvent, DinnerEventRsvp, Comment, Message, \
+    Notification, followers, dinner_event_invites
+
+# Selbsterstellt: generiert grosse Mengen synthetischer Daten mit Core-Bulk-Inserts.
+# Beliebtheit (Follower, Event-Ersteller, Nachrichten) ist Zipf-verteilt,
+# Gästelisten und Kommentare Pareto-verteilt. Gleicher Seed = gleiche Daten.
+
+DEFAULT_PASSWORD = 'password'
+COMMENTS = ['Looking forward to it!', 'Can I bring a friend?', 'What time exactly?',
+            'I will bring dessert.', 'Sorry, I might be late.', 'Count me in!']
+MESSAGES = ['Hi!', 'Are you coming on Friday?', 'Thanks for the invite.',
+            'See you there.', 'Did you get my message?']
+
+
+class _BulkInserter:
+    """Sammelt Zeilen und schreibt sie in Blöcken von chunk_size per executemany."""
+
+    def __init__(self, connection, table, chunk_size, progress=None):
+        self.connection = connection
+        self.table = table
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.connection.execute(self.table.insert(), self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+            if self.progress:
+                self.progress(self.table.name, self.count)
+
+
+def _zipf_cum_weights(n, exponent=1.1):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def _skewed_count(rng, mean, maximum, alpha=1.5):
+    """Pareto-verteilte Anzahl mit ungefähr dem gegebenen Mittelwert."""
+    if mean <= 0 or maximum <= 0:
+        return 0
+    scale = mean * (alpha - 1) / alpha
+    return min(maximum, int(scale * rng.paretovariate(alpha)))
+
+
+def _sample_distinct(rng, population, cum_weights, k, exclude):
+    """Zieht k verschiedene Elemente gewichtet, ohne exclude."""
+    if k * 4 > len(population):
+        # Bei sehr grossen Stichproben ist eine gleichverteilte Auswahl schneller
+        chosen = rng.sample(population, min(k + 1, len(population)))
+        return [item for item in chosen if item != exclude][:k]
+    chosen = set()
+    while len(chosen) < k:
+        chosen.update(rng.choices(population, cum_weights=cum_weights, k=k - len(chosen)))
+        chosen.discard(exclude)
+    return sorted(chosen)
+
+
+def _username_suffix(user_ids, chunk_size):
+    """'' wenn user<id> für alle user_ids frei ist, sonst das erste freie '_<n>'."""
+    suffix, n = '', 0
+    while True:
+        for start in range(0, len(user_ids), chunk_size):
+            names = [f'user{user_id}{suffix}' for user_id in user_ids[start:start + chunk_size]]
+            if db.session.scalar(sa.select(User.id).where(User.username.in_(names)).limit(1)):
+                break
+        else:
+            return suffix
+        n += 1
+        suffix = f'_{n}'
+
+
+def _sync_sequences(connection, tables):
+    """PostgreSQL führt die ID-Sequenzen bei expliziten IDs nicht nach."""
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        name = connection.dialect.identifier_preparer.format_table(table)
+        connection.execute(sa.text(
+            f"SELECT setval(pg_get_serial_sequence(:table, 'id'), (SELECT max(id) FROM {name}))"),
+            {'table': name})
+
+
+def seed_database(users=1000, events=2000, follows=20, guests=15, comments=5,
+                  messages=5000, notifications=5000, seed=42, chunk_size=5000,
+                  progress=None):
+    """Inserts synthetic data after the existing rows and returns the row counts.
+
+    All generated users have the password DEFAULT_PASSWORD and are named
+    user<id> (user<id>_<n> if one of these names is taken already). Low ids
+    are the popular users.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    password_hash = generate_password_hash(DEFAULT_PASSWORD)
+    # Explizite IDs nach den bestehenden Zeilen, damit alle Beziehungen ohne
+    # RETURNING (MySQL) per executemany geschrieben werden können
+    first_user = (db.session.scalar(sa.select(sa.func.max(User.id))) or 0) + 1
+    first_event = (db.session.scalar(sa.select(sa.func.max(DinnerEvent.id))) or 0) + 1
+    user_ids = range(first_user, first_user + users)
+    suffix = _username_suffix(user_ids, chunk_size)
+    db.session.commit()
+    user_weights = _zipf_cum_weights(users)
+    counts = {}
+
+    def inserter(connection, table):
+        return _BulkInserter(connection, table, chunk_size, progress)
+
+    def random_time(days_back, days_ahead=0):
+        return now + timedelta(seconds=rng.randint(-days_back * 86400, days_ahead * 86400))
+
+    with db.engine.begin() as connection:
+        rows = inserter(connection, User.__table__)
+        for user_id in user_ids:
+            rows.add({'id': user_id, 'username': f'user{user_id}{suffix}',
+                      'email': f'user{user_id}{suffix}@example.com',
+                      'password_hash': password_hash,
+                      'last_seen': random_time(90)})
+        rows.flush()
+        counts['users'] = rows.count
+
+        rows = inserter(connection, followers)
+        for user_id in user_ids:
+            for followed_id in _sample_distinct(
+                    rng, user_ids, user_weights,
+                    _skewed_count(rng, follows, users - 1), user_id):
+                rows.add({'follower_id': user_id, 'followed_id': followed_id})
+        rows.flush()
+        counts['follows'] = rows.count
+
+        # Beliebte User erstellen die meisten Events
+        creators = rng.choices(user_ids, cum_weights=user_weights, k=events)
+        rows = inserter(connection, DinnerEvent.__table__)
+        for offset, creator_id in enumerate(creators):
+            created_at = random_time(365)
+            rows.add({'id': first_event + offset,
+                      'title': f'Dinner {first_event + offset}',
+                      'description': f'Dinner hosted by user{creator_id}{suffix}',
+                      'external_event_url': 'https://example.com',
+                      'event_date': random_time(300, 60),
+                      'creator_id': creator_id,
+                      'is_public': rng.random() < 0.4,
+                      'created_at': created_at,
+                      'updated_at': created_at})
+        rows.flush()
+        counts['events'] = rows.count
+        _sync_sequences(connection, [User.__table__, DinnerEvent.__table__])
+
+        invites = inserter(connection, dinner_event_invites)
+        rsvps = inserter(connection, DinnerEventRsvp.__table__)
+        event_comments = inserter(connection, Comment.__table__)
+        for offset, creator_id in enumerate(creators):
+            event_id = first_event + offset
+            guest_ids = _sample_distinct(rng, user_ids, user_weights,
+                                         _skewed_count(rng, guests, users - 1), creator_id)
+            for user_id in guest_ids:
+                invites.add({'dinner_event_id': event_id, 'user_id': user_id})
+                answer = rng.random()
+                if answer < 0.7:
+                    rsvps.add({'dinner_event_id': event_id, 'user_id': user_id,
+                               'status': 'accepted' if answer < 0.5 else 'declined'})
+            authors = guest_ids + [creator_id]
+            for _ in range(_skewed_count(rng, comments, 10000)):
+                event_comments.add({'body': rng.choice(COMMENTS), 'event_id': event_id,
+                                    'user_id': rng.choice(authors),
+                                    'timestamp': random_time(365)})
+        for rows in (invites, rsvps, event_comments):
+            rows.flush()
+        counts['invites'] = invites.count
+        counts['rsvps'] = rsvps.count
+        counts['comments'] = event_comments.count
+
+        rows = inserter(connection, Message.__table__)
+        senders = rng.choices(user_ids, k=messages)
+        recipients = rng.choices(user_ids, cum_weights=user_weights, k=messages)
+        for sender_id, recipient_id in zip(senders, recipients):
+            if sender_id != recipient_id:
+                rows.add({'sender_id': sender_id, 'recipient_id': recipient_id,
+                          'conversation_key': Message.make_conversation_key(sender_id, recipient_id),
+                          'body': rng.choice(MESSAGES), 'timestamp': random_time(180)})
+        rows.flush()
+        counts['messages'] = rows.count
+
+        rows = inserter(connection, Notification.__table__)
+        timestamp = time.time()
+        recipients = rng.choices(user_ids, cum_weights=user_weights, k=notifications)
+        for user_id in recipients:
+            event_id = first_event + rng.randrange(events) if events else None
+            rows.add({'name': 'dinner_event_invite', 'user_id': user_id, 'event_id': event_id,
+                      'timestamp': timestamp - rng.random() * 86400 * 30,
+                      'payload_json': json.dumps({
+                          'message': f'You have been invited to the event: Dinner {event_id}',
+                          'event_id': event_id})})
+        rows.flush()
+        counts['notifications'] = rows.count
+
+    # Core-Inserts umgehen die Session-Events, daher manuell invalidieren
+    invalidate('explore')
+    return counts
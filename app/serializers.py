@@ -0,0 +1,192 @@
+import operator
+from collections import defaultdict
+from datetime import timezone
+import sqlalchemy as sa
+from flask import current_app, request, url_for, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from app import db
+from app.avatars import avatar_digest
+from app.models import DinnerEventRsvp, Comment, followers, dinner_event_invites, dinner_event_pending
+
+# Selbsterstellt: Serialisierung der API-Ressourcen. Die Felder pro Model sind
+# als FieldPlan vorkompiliert (ein attrgetter-Aufruf liest alle Werte), URLs
+# werden einmal pro Endpoint als Vorlage erzeugt statt url_for() pro Objekt,
+# und Zähler sowie Listen einer ganzen Seite werden mit je einer Abfrage
+# geladen. Ist orjson installiert, erzeugt es die JSON-Antworten.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Platzhalter-IDs für url_template(); gross genug, um nicht zufällig in einer URL vorzukommen
+_URL_PLACEHOLDER = 987654321000
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _utc_isoformat(value):
+    return value.replace(tzinfo=timezone.utc).isoformat()
+
+
+class FieldPlan:
+    """Compiled field list of a model. fields are attribute names or
+    (name, converter) pairs; converters are skipped for None values."""
+
+    def __init__(self, *fields):
+        fields = [(field, None) if isinstance(field, str) else field for field in fields]
+        self.keys = tuple(name for name, _ in fields)
+        getter = operator.attrgetter(*self.keys)
+        # attrgetter mit nur einem Namen liefert den Wert statt eines Tupels
+        self._get = getter if len(self.keys) > 1 else lambda obj: (getter(obj),)
+        self._converters = tuple((i, convert) for i, (_, convert) in enumerate(fields) if convert)
+
+    def __call__(self, obj):
+        values = self._get(obj)
+        if self._converters:
+            values = list(values)
+            for i, convert in self._converters:
+                if values[i] is not None:
+                    values[i] = convert(values[i])
+        return dict(zip(self.keys, values))
+
+
+USER_FIELDS = FieldPlan('id', 'username', ('last_seen', _utc_isoformat), 'about_me')
+DINNER_EVENT_FIELDS = FieldPlan('id', 'title', 'description', 'external_event_url',
+                                ('event_date', _isoformat), 'creator_id', 'is_public')
+COMMENT_FIELDS = FieldPlan('id', 'body', ('timestamp', _isoformat), 'user_id')
+MESSAGE_FIELDS = FieldPlan('id', 'sender_id', 'recipient_id', 'body', ('timestamp', _isoformat),
+                           'conversation_key')
+
+
+def url_template(endpoint, *params, **values):
+    """url_for(endpoint, **values) with params left as str.format() fields,
+    cached per app: url_template('api.get_user', 'id').format(id=1).
+    The values filled in later must not need URL quoting (ids, hex digests)."""
+    cache = current_app.extensions.setdefault('url_templates', {})
+    key = (request.script_root if has_request_context() else None,
+           endpoint, params, tuple(sorted(values.items())))
+    template = cache.get(key)
+    if template is None:
+        placeholders = {name: _URL_PLACEHOLDER + i for i, name in enumerate(params)}
+        template = url_for(endpoint, **values, **placeholders).replace('{', '{{').replace('}', '}}')
+        for name, placeholder in placeholders.items():
+            template = template.replace(str(placeholder), '{' + name + '}')
+        cache[key] = template
+    return template
+
+
+def _count_by(column, ids):
+    return dict(db.session.execute(
+        sa.select(column, sa.func.count()).where(column.in_(ids)).group_by(column)).all())
+
+
+def users_to_dicts(users, include_email=False):
+    """API representation of users, with two count queries for all of them."""
+    if not users:
+        return []
+    # Die folgenden Core-Abfragen lösen keinen Autoflush aus
+    db.session.flush()
+    ids = [user.id for user in users]
+    follower_counts = _count_by(followers.c.followed_id, ids)
+    following_counts = _count_by(followers.c.follower_id, ids)
+    self_url = url_template('api.get_user', 'id')
+    followers_url = url_template('api.get_followers', 'id')
+    following_url = url_template('api.get_following', 'id')
+    avatar_url = url_template('main.avatar', 'digest', s=128)
+    items = []
+    for user in users:
+        data = USER_FIELDS(user)
+        data['follower_count'] = follower_counts.get(user.id, 0)
+        data['following_count'] = following_counts.get(user.id, 0)
+        data['_links'] = {
+            'self': self_url.format(id=user.id),
+            'followers': followers_url.format(id=user.id),
+            'following': following_url.format(id=user.id),
+            'avatar': avatar_url.format(digest=avatar_digest(user.email))
+        }
+        if include_email:
+            data['email'] = user.email
+        items.append(data)
+    return items
+
+
+def dinner_events_to_dicts(events):
+    """API representation of dinner events (ORM objects or rows of the
+    dinnerevent table); guests, RSVPs and comments are loaded with one
+    query each for all events."""
+    if not events:
+        return []
+    db.session.flush()
+    ids = [event.id for event in events]
+    invited, pending, rsvps, comments = (defaultdict(list) for _ in range(4))
+    for event_id, user_id in db.session.execute(
+            sa.select(dinner_event_invites.c.dinner_event_id, dinner_event_invites.c.user_id)
+            .where(dinner_event_invites.c.dinner_event_id.in_(ids))):
+        invited[event_id].append(user_id)
+    for event_id, user_id in db.session.execute(
+            sa.select(dinner_event_pending.c.dinner_event_id, dinner_event_pending.c.user_id)
+            .where(dinner_event_pending.c.dinner_event_id.in_(ids))):
+        pending[event_id].append(user_id)
+    for event_id, user_id, status in db.session.execute(
+            sa.select(DinnerEventRsvp.dinner_event_id, DinnerEventRsvp.user_id, DinnerEventRsvp.status)
+            .where(DinnerEventRsvp.dinner_event_id.in_(ids))):
+        rsvps[event_id].append({'user_id': user_id, 'status': status})
+    for comment in db.session.execute(
+            sa.select(Comment.id, Comment.body, Comment.timestamp, Comment.user_id, Comment.event_id)
+            .where(Comment.event_id.in_(ids)).order_by(Comment.id)):
+        comments[comment.event_id].append(COMMENT_FIELDS(comment))
+    items = []
+    for event in events:
+        data = DINNER_EVENT_FIELDS(event)
+        data['invited'] = invited.get(event.id, [])
+        data['pending_opt_ins'] = pending.get(event.id, [])
+        data['rsvps'] = rsvps.get(event.id, [])
+        data['comments'] = comments.get(event.id, [])
+        items.append(data)
+    return items
+
+
+def comment_to_dict(comment):
+    data = COMMENT_FIELDS(comment)
+    data['username'] = comment.user.username
+    return data
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider using orjson. Dates, decimals etc. still go through
+    DefaultJSONProvider.default, so the output is the same."""
+
+    def _option(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | \
+            orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        # Sonderwünsche (separators, ensure_ascii, ...) kann nur json erfüllen
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._option()).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._option(indent)) + b'\n',
+            mimetype=self.mimetype)
+
+
+def init_app(app):
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
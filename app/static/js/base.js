@@ -0,0 +1,100 @@
+// Selbsterstellt: aus base.html ausgelagert, damit das Skript mit "flask assets build"
+// fingerprinted und vorkomprimiert als immutable gecacht werden kann. Werte aus dem
+// Template kommen über die data-Attribute des <script>-Tags.
+const baseConfig = document.currentScript.dataset;
+
+async function translate(sourceElem, destElem, sourceLang, destLang) {
+  document.getElementById(destElem).innerHTML =
+    '<img src="' + baseConfig.loadingImage + '">';
+  const response = await fetch('/translate', {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json; charset=utf-8'},
+    body: JSON.stringify({
+      text: document.getElementById(sourceElem).innerText,
+      source_language: sourceLang,
+      dest_language: destLang
+    })
+  })
+  const data = await response.json();
+  document.getElementById(destElem).innerText = data.text;
+}
+
+function initialize_popovers() {
+  const popups = document.getElementsByClassName('user_popup');
+  for (let i = 0; i < popups.length; i++) {
+    const popover = new bootstrap.Popover(popups[i], {
+      content: 'Loading...',
+      trigger: 'hover focus',
+      placement: 'right',
+      html: true,
+      sanitize: false,
+      delay: {show: 500, hide: 0},
+      container: popups[i],
+      customClass: 'd-inline',
+    });
+    popups[i].addEventListener('show.bs.popover', async (ev) => {
+      if (ev.target.popupLoaded) {
+        return;
+      }
+      const response = await fetch('/user/' + ev.target.innerText.trim() + '/popup');
+      const data = await response.text();
+      const popover = bootstrap.Popover.getInstance(ev.target);
+      if (popover && data) {
+        ev.target.popupLoaded = true;
+        popover.setContent({'.popover-body': data});
+        flask_moment_render_all();
+      }
+    });
+  }
+}
+document.addEventListener('DOMContentLoaded', initialize_popovers);
+
+function set_message_count(n) {
+  const count = document.getElementById('message_count');
+  count.innerText = n;
+  count.style.visibility = n ? 'visible' : 'hidden';
+}
+
+function set_task_progress(task_id, progress) {
+  const progressElement = document.getElementById(task_id + '-progress');
+  if (progressElement) {
+    progressElement.innerText = progress;
+  }
+}
+
+function initialize_notifications() {
+  let since = 0;
+  setInterval(async function() {
+    const response = await fetch(baseConfig.notificationsUrl + '?since=' + since);
+    const notifications = await response.json();
+    for (let i = 0; i < notifications.length; i++) {
+      switch (notifications[i].name) {
+        case 'unread_message_count':
+          set_message_count(notifications[i].data);
+          break;
+        case 'task_progress':
+          set_task_progress(notifications[i].data.task_id,
+              notifications[i].data.progress);
+          break;
+      }
+      since = notifications[i].timestamp;
+    }
+  }, 10000);
+}
+if (baseConfig.notificationsUrl) {
+  document.addEventListener('DOMContentLoaded', initialize_notifications);
+}
+
+function inviteUser(eventId) {
+  fetch(`/invite/${eventId}`, {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json; charset=utf-8'}
+  }).then(response => response.json())
+    .then(data => {
+      if (data.success) {
+        alert('User invited successfully!');
+      } else {
+        alert('Failed to invite user.');
+      }
+    });
+}
@@ -1,15 +1,21 @@
-import json
-import sys
-import time
-import sqlalchemy as sa
-from flask import render_template
 from rq import get_current_job
 from app import create_app, db
-from app.models import User, Post, Task
-from app.email import send_email
+from app.models import Task
+from app.notifications import insert_notifications, publish
+from app import purge
+from app.feed import push_events
 
-app = create_app()
-app.app_context().push()
+# Die App wird erst beim ersten Job erzeugt (nicht beim Import), damit der
+# RQ-Worker schnell startet und ein Import des Moduls keine App aufbaut.
+app = None
+
+
+def get_app():
+    global app
+    if app is None:
+        app = create_app()
+        app.app_context().push()
+    return app
 
 
 def _set_task_progress(progress):
@@ -25,32 +31,29 @@ def _set_task_progress(progress):
         db.session.commit()
 
 
-def export_posts(user_id):
+#Selbsterstellt: Massenbenachrichtigungen aus app.notifications.notify_users
+def send_notifications(user_ids, name, data):
+    get_app()
     try:
-        user = db.session.get(User, user_id)
-        _set_task_progress(0)
-        data = []
-        i = 0
-        total_posts = db.session.scalar(sa.select(sa.func.count()).select_from(
-            user.posts.select().subquery()))
-        for post in db.session.scalars(user.posts.select().order_by(
-                Post.timestamp.asc())):
-            data.append({'body': post.body,
-                         'timestamp': post.timestamp.isoformat() + 'Z'})
-            time.sleep(5)
-            i += 1
-            _set_task_progress(100 * i // total_posts)
-
-        send_email(
-            '[Microblog] Your blog posts',
-            sender=app.config['ADMINS'][0], recipients=[user.email],
-            text_body=render_template('email/export_posts.txt', user=user),
-            html_body=render_template('email/export_posts.html', user=user),
-            attachments=[('posts.json', 'application/json',
-                          json.dumps({'posts': data}, indent=4))],
-            sync=True)
+        insert_notifications(db.session, user_ids, name, data)
+        db.session.commit()
+        publish(user_ids, name, data)
     except Exception:
-        _set_task_progress(100)
-        app.logger.error('Unhandled exception', exc_info=sys.exc_info())
-    finally:
-        _set_task_progress(100)
+        db.session.rollback()
+        raise
+
+
+#Selbsterstellt: Löschen sehr grosser Events (app.purge.delete_dinner_event)
+def purge_dinner_event(event_id):
+    get_app()
+    try:
+        purge.purge_dinner_event(event_id)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+#Selbsterstellt: Grosser Feed-Fan-out aus app.feed.push_events
+def push_feed_events(pushes):
+    get_app()
+    push_events(pushes, sync=True)
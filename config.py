@@ -5,11 +5,30 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '.env'))
 
 
+def _engine_options(prefix):
+    """Pool options from <prefix>_POOL_SIZE, _MAX_OVERFLOW, _POOL_RECYCLE,
+    _POOL_TIMEOUT and _POOL_PRE_PING."""
+    options = {}
+    for suffix, name in (('POOL_SIZE', 'pool_size'), ('MAX_OVERFLOW', 'max_overflow'),
+                         ('POOL_RECYCLE', 'pool_recycle'), ('POOL_TIMEOUT', 'pool_timeout')):
+        if os.environ.get(f'{prefix}_{suffix}'):
+            options[name] = int(os.environ[f'{prefix}_{suffix}'])
+    if os.environ.get(f'{prefix}_POOL_PRE_PING') is not None:
+        options['pool_pre_ping'] = True
+    return options
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', '').replace(
         'postgres://', 'postgresql://') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options('DATABASE')
+    SQLALCHEMY_REPLICA_URIS = [uri.strip() for uri in os.environ.get(
+        'SQLALCHEMY_REPLICA_URIS', '').split(',') if uri.strip()]
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS = _engine_options('DATABASE_REPLICA')
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 5)
+    LAST_SEEN_UPDATE_INTERVAL = int(os.environ.get('LAST_SEEN_UPDATE_INTERVAL') or 60)
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
@@ -20,5 +39,38 @@ class Config:
     LANGUAGES = ['en', 'es']
     MS_TRANSLATOR_KEY = os.environ.get('MS_TRANSLATOR_KEY')
     ELASTICSEARCH_URL = os.environ.get('ELASTICSEARCH_URL')
+    SEARCH_BUILDING_TTL = int(os.environ.get('SEARCH_BUILDING_TTL') or 3600)
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://'
     POSTS_PER_PAGE = 25
+    COMMENTS_PER_PAGE = 20
+    MESSAGES_PER_PAGE = 25
+    FEED_PER_PAGE = 10
+    FEED_MAX_LENGTH = int(os.environ.get('FEED_MAX_LENGTH') or 500)
+    FEED_ASYNC_THRESHOLD = int(os.environ.get('FEED_ASYNC_THRESHOLD') or 1000)
+    NOTIFICATION_ASYNC_THRESHOLD = int(os.environ.get('NOTIFICATION_ASYNC_THRESHOLD') or 200)
+    NOTIFICATION_CHUNK_SIZE = int(os.environ.get('NOTIFICATION_CHUNK_SIZE') or 1000)
+    NOTIFICATION_CHANNEL = os.environ.get('NOTIFICATION_CHANNEL')
+    REMINDER_HOURS = int(os.environ.get('REMINDER_HOURS') or 24)
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE') or 500)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 365)
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 500)
+    HISTORY_PER_PAGE = 50
+    EVENT_PURGE_THRESHOLD = int(os.environ.get('EVENT_PURGE_THRESHOLD') or 1000)
+    EVENT_PURGE_BATCH_SIZE = int(os.environ.get('EVENT_PURGE_BATCH_SIZE') or 1000)
+    API_BATCH_MAX_ITEMS = int(os.environ.get('API_BATCH_MAX_ITEMS') or 500)
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE') or 500)
+    CHANGES_OVERLAP_SECONDS = 2
+    CHANGES_PER_PAGE = int(os.environ.get('CHANGES_PER_PAGE') or 100)
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION') is not None
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD') or 0.5)
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD') or 0.1)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED') is not None
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'redis'
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT') or 300)
+    EXPLORE_CACHE_TIMEOUT = int(os.environ.get('EXPLORE_CACHE_TIMEOUT') or 60)
+    FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT') or 3600)
+    AVATAR_CACHE_TIMEOUT = int(os.environ.get('AVATAR_CACHE_TIMEOUT') or 86400)
+    IDENTITY_CACHE_TIMEOUT = int(os.environ.get('IDENTITY_CACHE_TIMEOUT') or 60)
+    IDENTITY_LOCAL_TIMEOUT = int(os.environ.get('IDENTITY_LOCAL_TIMEOUT') or 5)
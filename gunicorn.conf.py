@@ -0,0 +1,18 @@
+import os
+import shutil
+from prometheus_client import multiprocess
+
+# Wird von gunicorn automatisch aus dem Arbeitsverzeichnis geladen.
+# Räumt die Prometheus-Metrikdateien beim Start und beim Beenden eines Workers auf.
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
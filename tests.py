@@ -1,17 +1,32 @@
+import json
+import re
 import unittest
+from unittest import mock
 from datetime import datetime, timezone, timedelta
-from app import create_app, db
-from app.models import User, DinnerEvent, DinnerEventRsvp
+import sqlalchemy as sa
+from app import create_app, db, mail, purge
+from app.models import User, DinnerEvent, DinnerEventRsvp, DinnerEventTombstone, Comment, Message, \
+    Notification, ConversationRead, EventReminder, ArchivedDinnerEvent, dinner_event_invites, followers, \
+    archived_dinner_event_invites, archived_dinner_event_rsvps, archived_comments, load_user
+from app.instrumentation import assert_max_queries
+from app.notifications import notify_users
+from app.reminders import send_reminders
+from app.archive import archive_events, with_archive, parse_history_key
+from app.autocomplete import suggest
+from app.search import id_ranges
+from app import assets, autocomplete, feed, search
+from config import Config
 
 # Basis-Setup von miguelgrinberg übernommen und für DinnerEvent-Model erweitert
 
-class TestConfig:
+class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = False
     ELASTICSEARCH_URL = None
     REDIS_URL = "redis://localhost:6379/0"
+    CACHE_TYPE = 'simple'
 
 class UserModelCase(unittest.TestCase):
     
@@ -29,11 +44,31 @@ class UserModelCase(unittest.TestCase):
         cls.app_context.pop()
 
     def setUp(self):
+        # Eigener App-Kontext pro Test, damit `g` (z.B. der eingeloggte User) nicht zwischen Tests geteilt wird
+        self.test_context = self.app.app_context()
+        self.test_context.push()
         db.session.rollback()
         db.session.query(User).delete()
         db.session.query(DinnerEvent).delete() # Erweiterung für DinnerEvent-Model
         db.session.query(DinnerEventRsvp).delete() # Erweiterung für DinnerEvent-Model
+        db.session.query(Comment).delete()
+        db.session.execute(dinner_event_invites.delete())
+        db.session.query(DinnerEventTombstone).delete()
+        db.session.execute(followers.delete())
+        db.session.query(Message).delete()
+        db.session.query(Notification).delete()
+        db.session.query(ConversationRead).delete()
+        db.session.query(EventReminder).delete()
+        for table in (archived_dinner_event_invites, archived_dinner_event_rsvps, archived_comments):
+            db.session.execute(table.delete())
+        db.session.query(ArchivedDinnerEvent).delete()
         db.session.commit()
+        self.app.cache.clear()
+        self.app.identity_cache.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        self.test_context.pop()
 
 # Selbsterstellte Funktionen für die Erstellung von Testdaten
     def create_default_user(self):
@@ -57,6 +92,13 @@ class UserModelCase(unittest.TestCase):
         db.session.commit()
         return event
 
+    def login_client(self, user):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+        return client
+
     def test_create_public_event(self):
         user = self.create_default_user()
         event = self.create_default_event(user, is_public=True)
@@ -127,6 +169,1008 @@ class UserModelCase(unittest.TestCase):
         db.session.commit()
         self.assertNotIn(user, event.pending_opt_ins)
 
+    def test_explore_cache_anonymous(self):
+        user = self.create_default_user()
+        self.create_default_event(user)
+        client = self.app.test_client()
+        self.assertIn(b'Test Event', client.get('/explore').data)
+        # Direkter Insert ohne ORM-Events: die gecachte Seite bleibt bestehen
+        db.session.execute(sa.insert(DinnerEvent).values(
+            title='Silent Event', external_event_url='http://example.com',
+            event_date=datetime.now(timezone.utc) + timedelta(days=2),
+            creator_id=user.id, is_public=True))
+        db.session.commit()
+        self.assertNotIn(b'Silent Event', client.get('/explore').data)
+        # Ein über das ORM erstelltes öffentliches Event invalidiert den Cache
+        self.create_default_event(user)
+        self.assertIn(b'Silent Event', client.get('/explore').data)
+
+    def test_event_detail_fragment_cache(self):
+        creator = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add(guest)
+        event = self.create_default_event(creator, is_public=False)
+        event.invite_user(guest)
+        db.session.commit()
+        client = self.login_client(guest)
+        self.assertIn(b'No comments yet.', client.get(f'/dinner_event/{event.id}').data)
+        # Ohne ORM-Events bleibt das gecachte Fragment bestehen
+        db.session.execute(sa.insert(Comment).values(
+            body='Silent comment', user_id=creator.id, event_id=event.id))
+        db.session.commit()
+        self.assertNotIn(b'Silent comment', client.get(f'/dinner_event/{event.id}').data)
+        # Ein RSVP erhöht die Event-Version und erneuert Gästeliste und Kommentare
+        event.rsvp(guest, 'accepted')
+        db.session.commit()
+        html = client.get(f'/dinner_event/{event.id}').data
+        self.assertIn(b'Silent comment', html)
+        self.assertIn(b'Accepted', html)
+        # Umbenennungen erneuern die Fragmente, in denen der Username steht
+        creator.username = 'renamed_host'
+        guest.username = 'renamed_guest'
+        db.session.commit()
+        html = client.get(f'/dinner_event/{event.id}').data
+        self.assertIn(b'<strong>renamed_host</strong>', html)
+        self.assertIn(b'/user/renamed_guest">renamed_guest</a>', html)
+
+    def test_paginated_comments(self):
+        creator = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        outsider = User(username='outsider', email='outsider@example.com')
+        db.session.add_all([guest, outsider])
+        event = self.create_default_event(creator, is_public=False)
+        event.invite_user(guest)
+        db.session.commit()
+        db.session.execute(sa.insert(Comment), [
+            {'body': f'Comment {i}', 'user_id': guest.id if i % 2 else creator.id, 'event_id': event.id}
+            for i in range(45)])
+        db.session.commit()
+
+        client = self.app.test_client()
+        response = client.get(f'/api/dinner_events/{event.id}/comments', headers=self.api_headers(guest))
+        self.assertEqual([item['body'] for item in response.json['items']][:2], ['Comment 44', 'Comment 43'])
+        bodies = []
+        url = f'/api/dinner_events/{event.id}/comments'
+        while url:
+            data = client.get(url, headers=self.api_headers(guest)).json
+            bodies += [item['body'] for item in data['items']]
+            url = data['_links']['next']
+        self.assertEqual(bodies, [f'Comment {i}' for i in reversed(range(45))])
+        for limit in (0, -1):
+            data = client.get(f'/api/dinner_events/{event.id}/comments?limit={limit}',
+                              headers=self.api_headers(guest)).json
+            self.assertEqual([item['body'] for item in data['items']], ['Comment 44'])
+            self.assertIsNotNone(data['_links']['next'])
+        self.assertEqual(client.get(f'/api/dinner_events/{event.id}/comments',
+                                    headers=self.api_headers(outsider)).status_code, 403)
+
+        client = self.login_client(guest)
+        with self.app.app_context():
+            html = client.get(f'/dinner_event/{event.id}').data
+        self.assertIn(b'Load older comments', html)
+        self.assertIn(b'Comment 44', html)
+        self.assertNotIn(b'Comment 24', html)
+        first_id = db.session.scalar(sa.select(sa.func.min(Comment.id)))
+        with self.app.app_context():
+            data = client.get(f'/dinner_event/{event.id}/comments?before={first_id + 24}').json
+        self.assertEqual(data['items'][0]['body'], 'Comment 23')
+        self.assertIn('delete_url', data['items'][0])
+        self.assertNotIn('delete_url', data['items'][1])
+        with self.app.app_context():
+            data = client.get(f'/dinner_event/{event.id}/comments?limit=0').json
+        self.assertEqual([item['body'] for item in data['items']], ['Comment 44'])
+
+    def test_conversations_api(self):
+        alice = User(username='alice', email='alice@example.com')
+        bob = User(username='bob', email='bob@example.com')
+        carol = User(username='carol', email='carol@example.com')
+        db.session.add_all([alice, bob, carol])
+        db.session.commit()
+        client = self.app.test_client()
+        for i in range(5):
+            response = client.post('/api/messages', headers=self.api_headers(bob),
+                                   json={'recipient_id': alice.id, 'body': f'Bob {i}'})
+            self.assertEqual(response.status_code, 201)
+        client.post('/api/messages', headers=self.api_headers(alice),
+                    json={'recipient_id': bob.id, 'body': 'Reply'})
+        client.post('/api/messages', headers=self.api_headers(carol),
+                    json={'recipient_id': alice.id, 'body': 'Carol'})
+        self.assertEqual(client.post('/api/messages', headers=self.api_headers(carol),
+                                     json={'recipient_id': alice.id, 'body': ''}).status_code, 400)
+
+        conversations = client.get('/api/conversations', headers=self.api_headers(alice)).json['items']
+        self.assertEqual([c['user']['username'] for c in conversations], ['carol', 'bob'])
+        self.assertEqual([c['unread_count'] for c in conversations], [1, 5])
+        self.assertEqual(conversations[1]['last_message']['body'], 'Reply')
+
+        bodies = []
+        url = f'/api/conversations/{bob.id}/messages?limit=4'
+        while url:
+            data = client.get(url, headers=self.api_headers(alice)).json
+            bodies += [item['body'] for item in data['items']]
+            url = data['_links']['next']
+        self.assertEqual(bodies, ['Reply', 'Bob 4', 'Bob 3', 'Bob 2', 'Bob 1', 'Bob 0'])
+        # Seitengrössen unter 1 liefern Einzelseiten, ohne Nachrichten zu überspringen
+        for limit in (0, -1, 1):
+            bodies = []
+            url = f'/api/conversations/{bob.id}/messages?limit={limit}'
+            while url:
+                data = client.get(url, headers=self.api_headers(alice)).json
+                self.assertEqual(data['_meta']['limit'], 1)
+                bodies += [item['body'] for item in data['items']]
+                url = data['_links']['next']
+            self.assertEqual(bodies, ['Reply', 'Bob 4', 'Bob 3', 'Bob 2', 'Bob 1', 'Bob 0'])
+        usernames = []
+        url = '/api/conversations?limit=0'
+        while url:
+            data = client.get(url, headers=self.api_headers(alice)).json
+            usernames += [c['user']['username'] for c in data['items']]
+            url = data['_links']['next']
+        self.assertEqual(usernames, ['carol', 'bob'])
+        self.assertEqual(client.get(f'/api/conversations/{bob.id}/messages?cursor=x',
+                                    headers=self.api_headers(alice)).status_code, 400)
+
+        self.assertEqual(alice.unread_message_count(), 6)
+        client.post(f'/api/conversations/{bob.id}/read', headers=self.api_headers(alice))
+        self.assertEqual(alice.unread_message_count(), 1)
+        conversations = client.get('/api/conversations?limit=1', headers=self.api_headers(alice)).json
+        self.assertEqual(conversations['items'][0]['unread_count'], 1)
+        conversations = client.get(conversations['_links']['next'], headers=self.api_headers(alice)).json
+        self.assertEqual(conversations['items'][0]['unread_count'], 0)
+        self.assertIsNone(conversations['_links']['next'])
+
+    def test_event_feed(self):
+        alice = User(username='alice', email='alice@example.com')
+        bob = User(username='bob', email='bob@example.com')
+        carol = User(username='carol', email='carol@example.com')
+        db.session.add_all([alice, bob, carol])
+        alice.follow(bob)
+        db.session.commit()
+        date = datetime.now(timezone.utc) + timedelta(days=3)
+        events = [DinnerEvent(title=f'Bob {i}', event_date=date, creator=bob, is_public=True,
+                              external_event_url='https://example.com')
+                  for i in range(5)]
+        db.session.add_all(events + [
+            DinnerEvent(title='Bob private', event_date=date, creator=bob, is_public=False,
+                        external_event_url='https://example.com'),
+            DinnerEvent(title='Carol', event_date=date, creator=carol, is_public=True,
+                        external_event_url='https://example.com')])
+        # Ohne Redis-Server wird der Feed nach dem Commit nicht geschrieben, sondern per SQL gelesen
+        db.session.commit()
+
+        client = self.app.test_client()
+        titles = []
+        url = '/api/feed?limit=2'
+        while url:
+            data = client.get(url, headers=self.api_headers(alice)).json
+            titles += [item['title'] for item in data['items']]
+            url = data['_links']['next']
+        self.assertEqual(titles, ['Bob 4', 'Bob 3', 'Bob 2', 'Bob 1', 'Bob 0'])
+        data = client.get('/api/feed?limit=-3', headers=self.api_headers(alice)).json
+        self.assertEqual(data['_meta']['limit'], 1)
+        self.assertEqual(len(data['items']), 1)
+
+        # Fan-out nur in bereits aufgebaute Feeds, grosse Fan-outs per RQ
+        feeds = {f'feed:{alice.id}'}
+        found = []
+        pipe = mock.Mock()
+        pipe.exists.side_effect = lambda key: found.append(key in feeds)
+        pipe.execute.side_effect = lambda: [found.pop(0) for _ in list(found)]
+        redis = mock.Mock()
+        redis.pipeline.return_value = pipe
+        queue = mock.Mock()
+        with mock.patch.object(self.app, 'redis', redis), \
+                mock.patch.object(self.app, 'task_queue', queue):
+            feed.push_events([(99, [alice.id, carol.id])])
+            pipe.zadd.assert_called_once_with(f'feed:{alice.id}', {99: 99})
+            queue.enqueue.assert_not_called()
+            with mock.patch.dict(self.app.config, {'FEED_ASYNC_THRESHOLD': 2}):
+                feed.push_events([(99, [alice.id, carol.id])])
+            queue.enqueue.assert_called_once_with('app.tasks.push_feed_events',
+                                                  [(99, [alice.id, carol.id])])
+            self.assertEqual(pipe.zadd.call_count, 1)
+
+        events[4].is_public = False
+        db.session.commit()
+        data = client.get('/api/feed', headers=self.api_headers(alice)).json
+        self.assertEqual(data['items'][0]['title'], 'Bob 3')
+        self.assertEqual(client.get('/api/feed', headers=self.api_headers(carol)).json['items'], [])
+
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(alice.id)
+        with self.app.app_context():
+            response = client.get('/index')
+        self.assertIn(b'Bob 3', response.data)
+        self.assertNotIn(b'Carol', response.data)
+
+        # Eine Follower-Abfrage für alle neuen Events eines Flushs
+        db.session.refresh(bob)
+        db.session.refresh(carol)
+        db.session.add_all([DinnerEvent(title=f'Batch {i}', event_date=date, creator=creator,
+                                        is_public=True, external_event_url='https://example.com')
+                            for i, creator in enumerate([bob, carol, bob])])
+        with assert_max_queries(4):
+            db.session.flush()
+        self.assertEqual([follower_ids for _, follower_ids in db.session.info['feed_pushes']],
+                         [[alice.id], [alice.id]])
+        db.session.commit()
+
+    def test_bulk_notifications(self):
+        host = self.create_default_user()
+        event = self.create_default_event(host, is_public=False)
+        guests = [User(username=f'guest{i}', email=f'guest{i}@example.com') for i in range(5)]
+        db.session.add_all(guests)
+        for guest in guests:
+            event.invite_user(guest)
+        db.session.commit()
+        guest_ids = [guest.id for guest in guests]
+
+        # Unter der Schwelle: ein Insert in der laufenden Transaktion, Rollback verwirft ihn
+        notify_users(guest_ids[:2], 'test', {'n': 1})
+        db.session.rollback()
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Notification.id))), 0)
+        with assert_max_queries(1):
+            notify_users(guest_ids * 2, 'test', {'n': 1})
+        db.session.commit()
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Notification.id))), 5)
+
+        # Über der Schwelle: RQ nach dem Commit, ohne Redis direkt geschrieben
+        self.app.config['NOTIFICATION_ASYNC_THRESHOLD'] = 3
+        notify_users(guest_ids, 'test', {'n': 2})
+        self.assertEqual(len(db.session.info['notification_jobs']), 1)
+        db.session.commit()
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Notification.id)).where(
+            Notification.payload_json == json.dumps({'n': 2}))), 5)
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(host.id)
+        with self.app.app_context():
+            client.post(f'/dinner_event/{event.id}/delete')
+        cancelled = db.session.scalars(sa.select(Notification).where(
+            Notification.name == 'dinner_event_cancelled')).all()
+        self.assertEqual(sorted(n.user_id for n in cancelled), guest_ids)
+        # Die Absage verweist nicht auf das Event und überlebt daher die Löschkaskade
+        self.assertIn(event.title, cancelled[0].get_data()['message'])
+        self.assertIsNone(cancelled[0].event_id)
+
+    def test_event_reminders(self):
+        host = self.create_default_user()
+        guests = [User(username=f'guest{i}', email=f'guest{i}@example.com') for i in range(3)]
+        db.session.add_all(guests)
+        now = datetime.now()
+        soon, later, past = [DinnerEvent(title=title, event_date=now + delta, creator=host,
+                                         external_event_url='https://example.com')
+                             for title, delta in (('Soon', timedelta(hours=2)),
+                                                  ('Later', timedelta(hours=48)),
+                                                  ('Past', timedelta(hours=-2)))]
+        db.session.add_all([soon, later, past])
+        db.session.flush()
+        for event in (soon, later, past):
+            for guest, status in zip(guests, ('accepted', 'accepted', 'declined')):
+                db.session.add(DinnerEventRsvp(dinner_event_id=event.id, user_id=guest.id,
+                                               status=status))
+        db.session.commit()
+
+        self.app.config['MAIL_SERVER'] = 'localhost'
+        with self.app.app_context(), mail.record_messages() as outbox:
+            with assert_max_queries(7):
+                self.assertEqual(send_reminders(hours=24, batch_size=1), 2)
+            self.assertEqual(send_reminders(hours=24), 0)
+        self.assertEqual(sorted(m.recipients[0] for m in outbox),
+                         ['guest0@example.com', 'guest1@example.com'])
+        self.assertIn('Soon', outbox[0].body)
+        reminders = db.session.scalars(sa.select(Notification).where(
+            Notification.name == 'dinner_event_reminder')).all()
+        self.assertEqual(sorted(n.user_id for n in reminders), [guests[0].id, guests[1].id])
+        self.assertEqual({n.get_data()['event_id'] for n in reminders}, {soon.id})
+
+    def test_archive_events(self):
+        host = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add(guest)
+        now = datetime.now()
+        old, recent = [DinnerEvent(title=title, event_date=date, creator=host, is_public=public,
+                                   external_event_url='https://example.com')
+                       for title, date, public in (('Old dinner', now - timedelta(days=400), False),
+                                                   ('Recent dinner', now - timedelta(days=3), True))]
+        db.session.add_all([old, recent])
+        old.invite_user(guest)
+        db.session.flush()
+        db.session.add_all([DinnerEventRsvp(dinner_event_id=old.id, user_id=guest.id, status='accepted'),
+                            Comment(body='Great evening', user=guest, event=old)])
+        db.session.commit()
+        old_id = old.id
+
+        with self.app.test_request_context():
+            self.assertEqual(archive_events(days=365, batch_size=1), 1)
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(DinnerEvent, old_id))
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count()).select_from(Comment)), 0)
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count()).select_from(
+            dinner_event_invites)), 0)
+        self.assertEqual(db.session.get(ArchivedDinnerEvent, old_id).title, 'Old dinner')
+        self.assertEqual(db.session.execute(sa.select(archived_dinner_event_rsvps)).all(),
+                         [(old_id, guest.id, 'accepted')])
+        self.assertEqual(db.session.scalar(sa.select(archived_comments.c.body)), 'Great evening')
+        # Für die Delta-Synchronisation ist das archivierte Event gelöscht
+        self.assertEqual(sorted(db.session.execute(sa.select(
+            DinnerEventTombstone.event_id, DinnerEventTombstone.user_id)).all()),
+            [(old_id, host.id), (old_id, guest.id)])
+
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(guest.id)
+        with self.app.app_context():
+            page = client.get('/user/guest').get_data(as_text=True)
+            self.assertNotIn('Old dinner', page)
+            page = client.get('/user/guest?history=1').get_data(as_text=True)
+        self.assertLess(page.index('Recent dinner'), page.index('Old dinner'))
+        self.assertEqual(self.app.test_client().get('/explore?history=1').status_code, 200)
+
+        # Der Verlauf aus aktiven und archivierten Events wird seitenweise gelesen
+        with self.app.test_request_context(), \
+                mock.patch.dict(self.app.config, {'HISTORY_PER_PAGE': 1}):
+            query = sa.select(DinnerEvent)
+            archive_query = sa.select(ArchivedDinnerEvent)
+            events, before = with_archive(query, archive_query)
+            self.assertEqual([event.title for event in events], ['Recent dinner'])
+            events, before = with_archive(query, archive_query, parse_history_key(before))
+            self.assertEqual([event.title for event in events], ['Old dinner'])
+            self.assertIsNone(before)
+            self.assertIsNone(parse_history_key('invalid'))
+        with self.app.app_context(), mock.patch.dict(self.app.config, {'HISTORY_PER_PAGE': 1}):
+            page = client.get('/user/guest?history=1').get_data(as_text=True)
+            self.assertNotIn('Old dinner', page)
+            match = re.search(r'href="([^"]*before=[^"]*)"', page)
+            page = client.get(match.group(1).replace('&amp;', '&')).get_data(as_text=True)
+        self.assertIn('Old dinner', page)
+        self.assertNotIn('Recent dinner', page)
+
+    def test_cascade_delete_event(self):
+        self.assertEqual(db.session.execute(sa.text('PRAGMA foreign_keys')).scalar(), 1)
+        host = self.create_default_user()
+        guests = [User(username=f'guest{i}', email=f'guest{i}@example.com') for i in range(3)]
+        db.session.add_all(guests)
+        events = [self.create_default_event(host, is_public=False) for _ in range(2)]
+        for event in events:
+            for guest in guests:
+                event.invite_user(guest)
+                db.session.add(DinnerEventRsvp(event=event, user=guest, status='accepted'))
+                db.session.add_all([Comment(body=f'Comment {i}', user=guest, event=event)
+                                    for i in range(5)])
+            guests[0].add_notification('dinner_event_invite', {'event_id': event.id})
+        db.session.commit()
+        first, second = [event.id for event in events]
+        db.session.expire_all()
+
+        # Ohne Laden der abhängigen Zeilen: SELECTs, Tombstones für Ersteller und Gäste, ein DELETE
+        with self.app.test_request_context(), assert_max_queries(6):
+            self.assertTrue(purge.delete_dinner_event(db.session.get(DinnerEvent, first)))
+        count = lambda table, column, event_id: db.session.scalar(
+            sa.select(sa.func.count()).select_from(table).where(column == event_id))
+        for table, column in ((Comment.__table__, Comment.event_id),
+                              (DinnerEventRsvp.__table__, DinnerEventRsvp.dinner_event_id),
+                              (dinner_event_invites, dinner_event_invites.c.dinner_event_id),
+                              (Notification.__table__, Notification.event_id)):
+            self.assertEqual(count(table, column, first), 0)
+            self.assertGreater(count(table, column, second), 0)
+
+        # Grosse Events werden bis zum Purge-Job verborgen und schreibgeschützt
+        queue = mock.Mock()
+        with self.app.test_request_context(), mock.patch.object(self.app, 'task_queue', queue), \
+                mock.patch.dict(self.app.config, {'EVENT_PURGE_THRESHOLD': 10}):
+            self.assertFalse(purge.delete_dinner_event(db.session.get(DinnerEvent, second)))
+        queue.enqueue.assert_called_once_with('app.tasks.purge_dinner_event', second)
+        self.assertIsNone(db.session.scalar(sa.select(DinnerEvent).where(DinnerEvent.id == second)))
+        headers = self.api_headers(host)
+        with self.app.app_context():
+            self.assertEqual(self.app.test_client().get(
+                f'/api/dinner_events/{second}', headers=headers).status_code, 404)
+            client = self.login_client(guests[0])
+            client.post(f'/dinner_event/{second}/comment', data={'body': 'Noch da?'})
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Comment.id)).where(
+            Comment.body == 'Noch da?')), 0)
+
+        # Der Purge-Job baut sie in Blöcken ab
+        with self.app.test_request_context():
+            purge.purge_dinner_event(second, batch_size=4)
+        self.assertIsNone(db.session.get(DinnerEvent, second,
+                                         execution_options={'include_pending_deletion': True}))
+        self.assertIsNone(db.session.get(DinnerEvent, second))
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Comment.id))), 0)
+        # Private Events: je ein Tombstone für den Ersteller und jeden Gast
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(DinnerEventTombstone.id))), 8)
+
+    def test_delete_user(self):
+        host = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add(guest)
+        guest.follow(host)
+        host.follow(guest)
+        hosted = self.create_default_event(host)
+        hosted.invite_user(guest)
+        hosted.rsvp(guest, 'accepted')
+        db.session.add(Comment(body='Bis bald', user=guest, event=hosted))
+        own = self.create_default_event(guest, is_public=False)
+        own.invite_user(host)
+        db.session.add(Comment(body='Eigener Kommentar', user=host, event=own))
+        db.session.add(Message(author=guest, recipient=host, body='Hallo'))
+        db.session.commit()
+        hosted_id, own_id, guest_id = hosted.id, own.id, guest.id
+        db.session.execute(sa.update(DinnerEvent).values(updated_at=datetime(2020, 1, 1)))
+        db.session.commit()
+        # Geladene Beziehungen dürfen das Löschen nicht stören
+        self.assertEqual(len(guest.comments), 1)
+        self.assertEqual(len(guest.created_dinner_events), 1)
+
+        with self.app.test_request_context():
+            purge.delete_user(guest)
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(User, guest_id))
+        self.assertIsNone(db.session.get(DinnerEvent, own_id))
+        # Der Tombstone für den gelöschten Ersteller verschwindet mit ihm
+        self.assertEqual(db.session.execute(sa.select(DinnerEventTombstone.event_id,
+                                                      DinnerEventTombstone.user_id)).all(), [(own_id, host.id)])
+        hosted = db.session.get(DinnerEvent, hosted_id)
+        self.assertEqual(hosted.invited, [])
+        self.assertEqual(hosted.rsvps, [])
+        self.assertEqual(hosted.comments, [])
+        self.assertGreater(hosted.updated_at, datetime(2020, 1, 1))
+        self.assertEqual(host.followers_count(), 0)
+        self.assertEqual(host.following_count(), 0)
+        message = db.session.scalar(sa.select(Message))
+        self.assertIsNone(message.sender_id)
+
+        headers = self.api_headers(host)
+        response = self.app.test_client().get('/api/conversations', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        item = response.get_json()['items'][0]
+        self.assertIsNone(item['user'])
+        self.assertEqual(item['last_message']['body'], 'Hallo')
+
+    def test_username_autocomplete(self):
+        me = User(username='alice', email='alice@example.com')
+        others = {name: User(username=name, email=f'{name}@example.com')
+                  for name in ('Andy', 'anna', 'andrew', 'bob', 'an_x')}
+        db.session.add(me)
+        db.session.add_all(others.values())
+        me.follow(others['andrew'])
+        db.session.commit()
+        event = self.create_default_event(me, is_public=False)
+        event.invite_user(others['anna'])
+        db.session.commit()
+
+        db.session.refresh(me)
+
+        # Ohne Redis-Index werden die Kandidaten per LIKE gesucht
+        with self.app.test_request_context():
+            with assert_max_queries(3):
+                names = [name for _, name in suggest(me, 'an')]
+            self.assertEqual(names, ['andrew', 'anna', 'an_x', 'Andy'])
+            self.assertEqual([name for _, name in suggest(me, 'an_')], ['an_x'])
+            self.assertEqual(suggest(me, '  '), [])
+
+        client = self.app.test_client()
+        response = client.get('/api/users/autocomplete?q=AND&limit=1', headers=self.api_headers(me))
+        self.assertEqual([item['username'] for item in response.json['items']], ['andrew'])
+        response = client.get('/api/users/autocomplete?q=an&limit=-3', headers=self.api_headers(me))
+        self.assertEqual([item['username'] for item in response.json['items']], ['andrew'])
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(me.id)
+        with self.app.app_context():
+            self.assertEqual(client.get('/users/autocomplete?q=b').json, ['bob'])
+
+        # Mit Redis-Index: Kandidaten per ZRANGEBYLEX, Nachführen nur bei vorhandenem Index
+        index = {autocomplete._member(user.id, user.username)
+                 for user in [me] + list(others.values())}
+        redis = mock.Mock()
+        redis.exists.side_effect = lambda key: bool(index)
+        redis.zrangebylex.side_effect = lambda key, low, high, start, num: [
+            member.encode() for member in sorted(index)
+            if low[1:] <= member.encode() <= high[1:]][start:start + num]
+        with self.app.test_request_context(), mock.patch.object(self.app, 'redis', redis):
+            with assert_max_queries(2):
+                names = [name for _, name in suggest(me, 'An')]
+            self.assertEqual(names, ['andrew', 'anna', 'an_x', 'Andy'])
+            redis.zrangebylex.assert_called_once_with(
+                autocomplete.KEY, b'[an', b'[an\xff', start=0, num=50)
+
+            pipe = redis.pipeline.return_value
+            others['bob'].username = 'bobby'
+            db.session.commit()
+            pipe.zrem.assert_called_once_with(
+                autocomplete.KEY, autocomplete._member(others['bob'].id, 'bob'))
+            pipe.zadd.assert_called_once_with(
+                autocomplete.KEY, {autocomplete._member(others['bob'].id, 'bobby'): 0})
+
+            index.clear()
+            pipe.reset_mock()
+            db.session.add(User(username='anton', email='anton@example.com'))
+            db.session.commit()
+            pipe.zadd.assert_not_called()
+
+    def test_search_reindex_ranges(self):
+        self.assertEqual(id_ranges(1, 10, 4), [(1, 5), (5, 9), (9, 11)])
+        self.assertEqual(id_ranges(7, 7, 1000), [(7, 8)])
+        result = self.app.test_cli_runner().invoke(args=['search', 'reindex'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('ELASTICSEARCH_URL is not configured', result.output)
+
+    def test_search_reindex_alias_swap(self):
+        users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(3)]
+        db.session.add_all(users)
+        db.session.commit()
+        store = {}
+        redis = mock.Mock()
+        redis.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value.encode())
+        redis.get.side_effect = store.get
+        redis.delete.side_effect = lambda key: store.pop(key, None)
+        es = mock.Mock()
+        es.indices.exists_alias.return_value = True
+        es.indices.get_alias.return_value = {'user-old': {'aliases': {'user': {}}}}
+
+        def bulk(operations):
+            # Während des Aufbaus schreibt add_to_index in beide Indizes
+            with self.app.app_context():
+                search.add_to_index('user', users[0])
+            return {'errors': False, 'items': []}
+        es.bulk.side_effect = bulk
+
+        with mock.patch.object(User, '__searchable__', ['username'], create=True), \
+                mock.patch.object(self.app, 'redis', redis), \
+                mock.patch.object(self.app, 'elasticsearch', es):
+            new_index, count = search.reindex(User, workers=2, chunk_size=2)
+            self.assertEqual(count, 3)
+            redis.set.assert_called_once_with('search:building:user', new_index,
+                                              ex=self.app.config['SEARCH_BUILDING_TTL'])
+            self.assertEqual(redis.expire.call_count, 2)
+            self.assertEqual({call.kwargs['index'] for call in es.index.call_args_list},
+                             {'user', new_index})
+            es.indices.update_aliases.assert_called_once_with(actions=[
+                {'remove': {'index': 'user-old', 'alias': 'user'}},
+                {'add': {'index': new_index, 'alias': 'user'}}])
+            es.indices.delete.assert_called_once_with(index='user-old', ignore_unavailable=True)
+            self.assertEqual(store, {})
+
+            # Nach dem Umschwenken nur noch in den Alias
+            es.index.reset_mock()
+            with self.app.app_context():
+                search.add_to_index('user', users[1])
+            es.index.assert_called_once_with(index='user', id=users[1].id,
+                                             document={'username': 'user1'})
+
+    def test_static_assets_and_compression(self):
+        import gzip, os, shutil, tempfile
+        from flask import Flask, url_for
+        static = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static)
+        os.mkdir(os.path.join(static, 'js'))
+        with open(os.path.join(static, 'js', 'site.js'), 'w') as f:
+            f.write('console.log("dbwe");\n' * 200)
+        manifest = assets.build(static)
+        hashed = manifest['js/site.js']
+        self.assertRegex(hashed, r'^dist/js/site\.[0-9a-f]{12}\.js$')
+        self.assertTrue(os.path.exists(os.path.join(static, hashed + '.gz')))
+
+        app = Flask(__name__, static_folder=static, static_url_path='/static')
+        app.config.update(COMPRESS_MIN_SIZE=1024, COMPRESS_LEVEL=6)
+        assets.init_app(app)
+        with app.test_request_context():
+            self.assertEqual(url_for('static', filename='js/site.js'), '/static/' + hashed)
+            self.assertEqual(url_for('static', filename='other.css'), '/static/other.css')
+        client = app.test_client()
+        response = client.get('/static/' + hashed, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), b'console.log("dbwe");\n' * 200)
+        response = client.get('/static/' + hashed)
+        self.assertNotIn('Content-Encoding', response.headers)
+        response.close()
+
+        # Dynamische Antworten: nur gross genug und nur wenn der Client gzip akzeptiert
+        client = self.app.test_client()
+        response = client.get('/auth/register', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'</html>', gzip.decompress(response.data))
+        response = client.get('/auth/register')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_compiled_serializers(self):
+        from flask import url_for
+        from app.serializers import url_template, users_to_dicts
+        creator = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add(guest)
+        guest.follow(creator)
+        event = self.create_default_event(creator)
+        event.invite_user(guest)
+        event.rsvp(guest, 'accepted')
+        db.session.add(Comment(body='Hallo', user=guest, event=event))
+        db.session.commit()
+        with self.app.test_request_context():
+            self.assertEqual(url_template('api.get_user', 'id').format(id=42), url_for('api.get_user', id=42))
+            self.assertEqual(url_template('main.avatar', 'digest', s=128).format(digest='ab' * 16),
+                             url_for('main.avatar', digest='ab' * 16, s=128))
+            db.session.refresh(creator)
+            db.session.refresh(guest)
+            with assert_max_queries(2):
+                creator_data, guest_data = users_to_dicts([creator, guest], include_email=True)
+            self.assertEqual(creator_data['follower_count'], 1)
+            self.assertEqual(guest_data['following_count'], 1)
+            self.assertEqual(guest_data['email'], 'guest@example.com')
+            self.assertEqual(creator_data['_links'], {
+                'self': url_for('api.get_user', id=creator.id),
+                'followers': url_for('api.get_followers', id=creator.id),
+                'following': url_for('api.get_following', id=creator.id),
+                'avatar': creator.avatar(128)})
+            data = event.to_dict()
+        self.assertEqual(data['event_date'], event.event_date.isoformat())
+        self.assertEqual(data['invited'], [guest.id])
+        self.assertEqual(data['pending_opt_ins'], [])
+        self.assertEqual(data['rsvps'], [{'user_id': guest.id, 'status': 'accepted'}])
+        self.assertEqual([(c['body'], c['user_id']) for c in data['comments']], [('Hallo', guest.id)])
+        self.assertEqual(json.loads(self.app.json.dumps(data)), data)
+
+    def test_identicon_avatar(self):
+        user = self.create_default_user()
+        with self.app.test_request_context():
+            url = user.avatar(64)
+        self.assertTrue(url.startswith('/avatar/'))
+        client = self.app.test_client()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertTrue(response.data.startswith(b'\x89PNG'))
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        etag = response.headers['ETag']
+        response = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(client.get('/avatar/not-a-digest').status_code, 404)
+
+    def api_headers(self, user):
+        token = user.get_token()
+        db.session.commit()
+        return {'Authorization': f'Bearer {token}'}
+
+    def test_api_batch_create_and_rsvp(self):
+        creator = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add(guest)
+        db.session.commit()
+        client = self.app.test_client()
+        event = {'title': 'Batch', 'description': '', 'external_event_url': 'http://example.com',
+                 'event_date': '2030-01-01T19:00:00', 'is_public': False}
+        # Ein ungültiges Element verhindert den ganzen Batch
+        response = client.post('/api/dinner_events/batch', headers=self.api_headers(creator),
+                               json=[event, {'title': 'Incomplete'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['results'][0]['index'], 1)
+        # Falsche Typen und zu lange Werte: 400 statt Datenbankfehler
+        invalid = [dict(event, title=123), dict(event, external_event_url=None),
+                   dict(event, description=['x']), dict(event, title='x' * 129),
+                   dict(event, invitees=['guest', 42])]
+        response = client.post('/api/dinner_events/batch', headers=self.api_headers(creator), json=invalid)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['index'] for result in response.json['results']], [0, 1, 2, 3, 4])
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(DinnerEvent.id))), 0)
+        response = client.post('/api/dinner_events/batch', headers=self.api_headers(creator),
+                               json=[dict(event, invitees=['guest', 'nobody'])] + [event] * 2)
+        self.assertEqual(response.status_code, 201)
+        results = response.json['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['unknown_invitees'], ['nobody'])
+        first, second = db.session.get(DinnerEvent, results[0]['id']), db.session.get(DinnerEvent, results[1]['id'])
+        self.assertIn(guest, first.invited)
+
+        response = client.post(f'/api/dinner_events/{second.id}/invites', headers=self.api_headers(creator),
+                               json={'invitees': ['guest', 'nobody']})
+        self.assertEqual([r['status'] for r in response.json['results']], ['invited', 'not_found'])
+        response = client.post('/api/dinner_events/rsvps', headers=self.api_headers(guest),
+                               json=[{'event_id': first.id, 'status': 'declined'},
+                                     {'event_id': second.id, 'status': 'accepted'}])
+        self.assertEqual(response.status_code, 200)
+        response = client.post('/api/dinner_events/rsvps', headers=self.api_headers(guest),
+                               json=[{'event_id': first.id, 'status': 'accepted'}])
+        self.assertEqual(response.status_code, 200)
+        statuses = dict(db.session.execute(sa.select(DinnerEventRsvp.dinner_event_id, DinnerEventRsvp.status)).all())
+        self.assertEqual(statuses, {first.id: 'accepted', second.id: 'accepted'})
+        response = client.post('/api/dinner_events/rsvps', headers=self.api_headers(guest),
+                               json=[{'event_id': results[2]['id'], 'status': 'accepted'}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_export_ndjson(self):
+        creator = self.create_default_user()
+        other = User(username='other', email='other@example.com')
+        db.session.add(other)
+        db.session.commit()
+        public_events = [self.create_default_event(creator) for _ in range(3)]
+        private_event = self.create_default_event(creator, is_public=False)
+        db.session.add(Comment(body='Hello', user=creator, event=public_events[0]))
+        db.session.commit()
+        self.app.config['EXPORT_CHUNK_SIZE'] = 2
+        try:
+            response = self.app.test_client().get('/api/dinner_events/export',
+                                                  headers=self.api_headers(other))
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        finally:
+            self.app.config['EXPORT_CHUNK_SIZE'] = TestConfig.EXPORT_CHUNK_SIZE
+        self.assertEqual([e['id'] for e in lines], [e.id for e in public_events])
+        self.assertNotIn(private_event.id, [e['id'] for e in lines])
+        self.assertEqual(lines[0], public_events[0].to_dict())
+
+    def test_api_changes_since(self):
+        user = self.create_default_user()
+        unchanged, commented, deleted = [self.create_default_event(user) for _ in range(3)]
+        db.session.execute(sa.update(DinnerEvent).values(updated_at=datetime(2020, 1, 1)))
+        db.session.commit()
+        since = datetime(2021, 1, 1, tzinfo=timezone.utc).timestamp()
+        db.session.add(Comment(body='Changed', user=user, event=commented))
+        db.session.delete(deleted)
+        db.session.commit()
+        response = self.app.test_client().get(f'/api/dinner_events/changes?since={since}',
+                                              headers=self.api_headers(user))
+        self.assertEqual([e['id'] for e in response.json['events']], [commented.id])
+        self.assertEqual(response.json['deleted'], [deleted.id])
+        self.assertGreater(response.json['next_since'], since)
+        for invalid in ('1e20', '-1e20', 'nan'):
+            self.assertEqual(self.app.test_client().get(f'/api/dinner_events/changes?since={invalid}',
+                                                        headers=self.api_headers(user)).status_code, 400)
+
+        # Privat geworden, ausgeladen oder fremdes privates Event gelöscht
+        other = User(username='other', email='other@example.com')
+        db.session.add(other)
+        db.session.commit()
+        hidden = self.create_default_event(other)
+        uninvited = self.create_default_event(other, is_public=False)
+        uninvited.invite_user(user)
+        foreign = self.create_default_event(other, is_public=False)
+        db.session.commit()
+        since = datetime.now(timezone.utc).timestamp() - 1
+        hidden.is_public = False
+        uninvited.uninvite_user(user)
+        db.session.delete(foreign)
+        db.session.commit()
+        response = self.app.test_client().get(f'/api/dinner_events/changes?since={since}',
+                                              headers=self.api_headers(user))
+        self.assertEqual(sorted(response.json['deleted']), sorted([hidden.id, uninvited.id]))
+        response = self.app.test_client().get(f'/api/dinner_events/changes?since={since}',
+                                              headers=self.api_headers(other))
+        self.assertEqual(response.json['deleted'], [foreign.id])
+
+        # Seitenweise mit Cursor; next_since erst auf der letzten Seite
+        ids, dropped, url = [], [], '/api/dinner_events/changes?since=1&limit=1'
+        while url:
+            page = self.app.test_client().get(url, headers=self.api_headers(user)).json
+            self.assertLessEqual(len(page['events']), 1)
+            ids += [e['id'] for e in page['events']]
+            dropped += page['deleted']
+            url = page['_links']['next']
+            self.assertEqual(page['next_since'] is None, url is not None)
+        self.assertEqual(sorted(ids), sorted([unchanged.id, commented.id]))
+        # SQLite vergibt die ID gelöschter Events neu, daher als Menge
+        self.assertEqual(set(dropped), {deleted.id, hidden.id, uninvited.id})
+
+    def test_calendar_feed(self):
+        creator = self.create_default_user()
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add(guest)
+        event = self.create_default_event(creator, is_public=False)
+        event.invite_user(guest)
+        token = guest.get_calendar_token()
+        db.session.commit()
+        client = self.app.test_client()
+        response = client.get(f'/calendar/{token}.ics')
+        self.assertEqual(response.mimetype, 'text/calendar')
+        self.assertIn('SUMMARY:Test Event', response.text)
+        self.assertIn('CATEGORIES:Invited', response.text)
+        etag = response.headers['ETag']
+        self.assertEqual(client.get(f'/calendar/{token}.ics', headers={'If-None-Match': etag}).status_code, 304)
+        # Ein gzip-Client schickt das schwache ETag der komprimierten Antwort zurück
+        with mock.patch.dict(self.app.config, {'COMPRESS_MIN_SIZE': 1}):
+            response = client.get(f'/calendar/{token}.ics', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.content_encoding, 'gzip')
+            weak_etag = response.headers['ETag']
+            self.assertTrue(weak_etag.startswith('W/'))
+            self.assertEqual(client.get(f'/calendar/{token}.ics', headers={
+                'Accept-Encoding': 'gzip', 'If-None-Match': weak_etag}).status_code, 304)
+        # Host und Sprache landen im Inhalt, der Username im Kalendernamen
+        response = client.get(f'/calendar/{token}.ics', base_url='http://calendar.example.com')
+        self.assertIn('@calendar.example.com', response.text)
+        with self.app.app_context():
+            response = client.get(f'/calendar/{token}.ics', headers={'Accept-Language': 'es'})
+        self.assertNotEqual(response.headers['ETag'], etag)
+        guest.username = 'guest2'
+        db.session.commit()
+        response = client.get(f'/calendar/{token}.ics', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('guest2', response.text)
+        etag = response.headers['ETag']
+        event.rsvp(guest, 'accepted')
+        db.session.commit()
+        response = client.get(f'/calendar/{token}.ics', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('CATEGORIES:RSVP', response.text)
+        self.assertEqual(client.get('/calendar/invalid.ics').status_code, 404)
+        # Neuer App-Kontext, da `g` sonst noch den anonymen User der vorherigen Requests enthält
+        with self.app.app_context():
+            self.assertIn(token.encode(), self.login_client(guest).get('/calendar').data)
+
+    def test_query_budgets(self):
+        creator = self.create_default_user()
+        users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(5)]
+        db.session.add_all(users)
+        db.session.commit()
+        for i in range(5):
+            event = self.create_default_event(creator, is_public=i % 2 == 0)
+            for user in users:
+                event.invite_user(user)
+            event.rsvp(users[0], 'accepted')
+            db.session.add(Comment(body='Comment', user=users[1], event=event))
+        db.session.commit()
+        headers = self.api_headers(users[0])
+        # Budgets unabhängig von der Anzahl Events/Gäste (kein N+1)
+        budgets = [
+            ('/index', {}, 11),
+            (f'/dinner_event/{event.id}', {}, 9),
+            ('/api/dinner_events', headers, 7),
+            # Follower-Zähler werden für die ganze Seite mit zwei Abfragen geladen
+            ('/api/users', headers, 5),
+        ]
+        for url, request_headers, max_queries in budgets:
+            with self.app.app_context():
+                client = self.login_client(users[0])
+                with assert_max_queries(max_queries):
+                    self.assertEqual(client.get(url, headers=request_headers).status_code, 200)
+
+    def test_server_timing_header(self):
+        class InstrumentedConfig(TestConfig):
+            SQL_INSTRUMENTATION = True
+        app = create_app(InstrumentedConfig)
+        response = app.test_client().get('/avatar/' + '0' * 32)
+        self.assertIn('db;dur=', response.headers['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        class MetricsConfig(TestConfig):
+            METRICS_ENABLED = True
+            REDIS_URL = 'redis://localhost:1/0'
+        app = create_app(MetricsConfig)
+        client = app.test_client()
+        client.get('/avatar/' + '0' * 32)
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'dbwe_http_request_duration_seconds_count{endpoint="main.avatar"', response.data)
+        self.assertIn(b'dbwe_redis_up 0.0', response.data)
+
+    def test_read_replica_routing(self):
+        import os
+        import shutil
+        import tempfile
+        from flask import g
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        class ReplicaConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'primary.db')
+            SQLALCHEMY_REPLICA_URIS = ['sqlite:///' + os.path.join(directory, 'replica.db')]
+        app = create_app(ReplicaConfig)
+        with app.app_context():
+            db.create_all()
+            db.metadata.create_all(app.extensions['db_replicas']['replica_0'])
+            user = User(username='replicauser', email='replica@example.com', about_me='primary')
+            db.session.add(user)
+            db.session.commit()
+            token = user.get_token()
+            db.session.commit()
+            # Replikation simulieren, aber mit abweichendem about_me
+            row = dict(db.session.execute(sa.select(User.__table__)).mappings().one())
+            with app.extensions['db_replicas']['replica_0'].begin() as conn:
+                conn.execute(User.__table__.insert(), dict(row, about_me='replica'))
+            user_id = user.id
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        self.assertEqual(client.get(f'/api/users/{user_id}', headers=headers).json['about_me'], 'replica')
+        response = client.put(f'/api/users/{user_id}', headers=headers, json={'about_me': 'updated'})
+        self.assertEqual(response.json['about_me'], 'updated')
+        # Nach dem Schreiben bleibt der Client auf dem Primary
+        self.assertEqual(client.get(f'/api/users/{user_id}', headers=headers).json['about_me'], 'updated')
+
+        with app.test_request_context('/'):
+            g._db_replica = 'replica_0'
+            user = db.session.get(User, user_id)
+            self.assertEqual(user.about_me, 'replica')
+            user.last_seen = datetime.now(timezone.utc)
+            db.session.flush()
+            self.assertEqual(db.session.scalar(sa.select(User.about_me).where(User.id == user_id)), 'updated')
+            db.session.rollback()
+            db.session.remove()
+
+    def test_cached_user_loader(self):
+        user = User(username='cacheduser', email='cached@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        client = self.login_client(user)
+        with self.app.app_context():
+            client.get('/notifications')
+        key = f'identity:{user.id}'
+        self.assertIsNotNone(self.app.identity_cache.get(key))
+        self.assertNotIn('password_hash', self.app.identity_cache.get(key))
+        with self.app.app_context(), assert_max_queries(1):
+            self.assertEqual(client.get('/notifications').status_code, 200)
+        # Profiländerung invalidiert den Eintrag
+        user.about_me = 'changed'
+        db.session.commit()
+        self.assertIsNone(self.app.identity_cache.get(key))
+        with self.app.app_context():
+            client.get('/notifications')
+        cached = self.app.identity_cache.get(key)
+        self.assertEqual(cached['about_me'], 'changed')
+        # Passwort wird bei Bedarf nachgeladen
+        with self.app.app_context():
+            self.assertTrue(load_user(str(user.id)).check_password('secret'))
+
+    def test_seed_database(self):
+        from app.seed import seed_database, DEFAULT_PASSWORD
+        counts = seed_database(users=30, events=20, follows=5, guests=6, comments=2,
+                               messages=40, notifications=40, seed=7, chunk_size=16)
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(User.id))), 30)
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count()).select_from(dinner_event_invites)),
+                         counts['invites'])
+        self.assertEqual(db.session.scalar(sa.select(sa.func.count(Comment.id))), counts['comments'])
+        user = db.session.scalar(sa.select(User).where(User.username == 'user1'))
+        self.assertTrue(user.check_password(DEFAULT_PASSWORD))
+        # Gleicher Seed, gleiche Verteilung
+        invites = db.session.execute(sa.select(dinner_event_invites.c.user_id)
+                                     .order_by(dinner_event_invites.c.dinner_event_id,
+                                               dinner_event_invites.c.user_id)).scalars().all()
+        self.tearDown()
+        self.setUp()
+        self.assertEqual(seed_database(users=30, events=20, follows=5, guests=6, comments=2,
+                                       messages=40, notifications=40, seed=7), counts)
+        self.assertEqual(db.session.execute(sa.select(dinner_event_invites.c.user_id)
+                                            .order_by(dinner_event_invites.c.dinner_event_id,
+                                                      dinner_event_invites.c.user_id)).scalars().all(),
+                         invites)
+
+        # Auf einer befüllten Datenbank: IDs nach den bestehenden, freie Usernamen
+        self.tearDown()
+        self.setUp()
+        db.session.add(User(username='user2', email='taken@example.com'))
+        db.session.commit()
+        seed_database(users=3, events=2, follows=1, guests=1, comments=1,
+                      messages=2, notifications=2, seed=7)
+        self.assertEqual(db.session.execute(sa.select(User.id, User.username).order_by(User.id)).all(),
+                         [(1, 'user2'), (2, 'user2_1'), (3, 'user3_1'), (4, 'user4_1')])
+        db.session.add(User(username='newcomer', email='newcomer@example.com'))
+        db.session.commit()
+
+    def test_benchmark_suite(self):
+        from app.benchmark import run_benchmarks
+        results = run_benchmarks(users=5, events=4, guests=2, comments=1, iterations=2,
+                                 startup_iterations=1,
+                                 only=['index', 'dinner_event_to_dict', 'process_invites',
+                                       'startup_worker'])
+        self.assertEqual(set(results['results']), {'index', 'dinner_event_to_dict', 'process_invites',
+                                                   'startup_worker'})
+        for name, result in results['results'].items():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            if not name.startswith('startup'):
+                self.assertGreater(result['queries'], 0)
+
+    def test_lazy_clients(self):
+        import app.tasks
+        self.assertIsNone(app.tasks.app)
+        lazy_app = create_app(TestConfig)
+        self.assertNotIn('redis', lazy_app.__dict__)
+        self.assertNotIn('task_queue', lazy_app.__dict__)
+        self.assertIsNone(lazy_app.elasticsearch)
+        self.assertIs(lazy_app.task_queue.connection, lazy_app.redis)
+
 # Testfälle für User-Model von miguelgrinberg übernommen
 
     def test_user_login(self):
@@ -171,6 +1215,34 @@ if __name__ == '__main__':
         "test_decline_opt_in",
         "test_delete_event",
         "test_delete_rsvp",
+        "test_explore_cache_anonymous",
+        "test_event_detail_fragment_cache",
+        "test_paginated_comments",
+        "test_conversations_api",
+        "test_event_feed",
+        "test_bulk_notifications",
+        "test_event_reminders",
+        "test_archive_events",
+        "test_cascade_delete_event",
+        "test_delete_user",
+        "test_username_autocomplete",
+        "test_search_reindex_ranges",
+        "test_search_reindex_alias_swap",
+        "test_static_assets_and_compression",
+        "test_identicon_avatar",
+        "test_api_batch_create_and_rsvp",
+        "test_api_export_ndjson",
+        "test_api_changes_since",
+        "test_calendar_feed",
+        "test_query_budgets",
+        "test_compiled_serializers",
+        "test_server_timing_header",
+        "test_metrics_endpoint",
+        "test_read_replica_routing",
+        "test_cached_user_loader",
+        "test_seed_database",
+        "test_benchmark_suite",
+        "test_lazy_clients",
     ]
 
     suite = unittest.TestSuite()